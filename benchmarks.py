@@ -0,0 +1,1006 @@
+# benchmarks.py
+# pylint: disable-msg=w0614
+
+import os
+import pickle
+import re
+import sqlite3
+import tracemalloc
+from collections import defaultdict, namedtuple
+from random import Random
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from timeit import timeit
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr, escape
+
+from openpyxl import Workbook, load_workbook
+
+from codeplans import *
+from diagnose import RawVariableInfo, compare_waves, get_mdd_data, read_waves
+from dimensions_tools import BlockTransferer
+from settings import CodeplanMap
+
+############################################################################
+#
+#                           SYNTHETIC INPUTS
+#
+############################################################################
+
+def make_axis(elements=5000, nets=500, depth=6, seed=0):
+
+    # builds codeplan axis with nested net() functions,
+    # labels with escaped quotes, commas and brackets,
+    # combine() functions and properties
+
+    random = Random(seed)
+    code = 0
+
+    def element():
+        nonlocal code
+        code += 1
+        label = random.choice(["Brand's best", 'a, b (c)', 'plain label', "''quoted''"])
+        label = label.replace("'", "''")
+        if code % 50 == 0:
+            return f"comb{code} '{label}' combine({{{CODE_PREFIX}{code}, {CODE_PREFIX}{code + 1}}})"
+        if code % 30 == 0:
+            return f"{CODE_PREFIX}{code} '{label}' [IsHidden=True]"
+        return f"{CODE_PREFIX}{code} '{label}'"
+
+    def net(level, size):
+        children = []
+        while size > 0:
+            if level < depth and random.random() < nets / elements:
+                child_size = random.randint(1, max(1, size // 2))
+                children.append(net(level + 1, child_size))
+                size -= child_size
+            else:
+                children.append(element())
+                size -= 1
+        return f"net{code}_{level} 'Net ''{level}''' net({{{', '.join(children)}}})"
+
+    return f"{{{', '.join([net(1, elements), 'base()'])}}}"
+
+def make_mdd(path, types=50, elements=100, variables_per_type=5, design_fields=0, first_type=0):
+
+    # writes synthetic MDD file with shared lists (types), categorical
+    # variables using them and optional design section of given size,
+    # which stands for routing, pages and other parts ignored by MDDFile
+
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<xml>\n')
+        f.write('<mdm:metadata xmlns:mdm="http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04">\n')
+        f.write('<definition>\n')
+        for t in range(first_type, first_type + types):
+            axis = quoteattr('{' + ', '.join(f"{CODE_PREFIX}{e} 'Code {e}'" for e in range(1, elements + 1)) + '}')
+            for v in range(variables_per_type):
+                f.write(f'<variable id="v{t}_{v}" name="head_{t}_{v}" type="3" max="{elements}">'
+                    f'<labels context="LABEL"><text context="QUESTION">loop[{{_{v}}}].q{t}</text></labels>'
+                    f'<categories global-name-space="-1" ref_name="head_{t}"/>'
+                    f'<axis expression={axis}/></variable>\n')
+        for t in range(first_type, first_type + types):
+            f.write(f'<categories id="t{t}" name="head_{t}" global-name-space="-1">')
+            for e in range(1, elements + 1):
+                f.write(f'<category id="t{t}_{e}" name="{CODE_PREFIX}{e}">'
+                    f'<labels context="LABEL"><text context="QUESTION">{escape(f"Brand <{e}>")}</text></labels>'
+                    '</category>')
+            f.write('</categories>\n')
+        f.write('</definition>\n<design><fields name="@fields">\n')
+        for d in range(design_fields):
+            f.write(f'<variable id="d{d}" name="field_{d}" ref="v0_0">'
+                f'<properties><property name="note" value="{"x" * 200}"/></properties></variable>\n')
+        f.write('</fields></design>\n</mdm:metadata>\n</xml>\n')
+
+def make_xl_workbook(path, sheets=60, codes=300, comment_columns=6, blank_rows=True, seed=0):
+
+    # writes codeplan workbook with nets, combines, blank rows,
+    # trailing empty rows and comment columns right of the labels
+
+    random = Random(seed)
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for s in range(sheets):
+        sheet = workbook.create_sheet(f'Q{s}')
+        sheet.append(['Code', 'Label'])
+        level = 0
+        for code in range(1, codes + 1):
+            comments = [f'comment {c}' for c in range(comment_columns)]
+            if code % 40 == 1 and level < 3:
+                level += 1
+                sheet.append(['*' * level, f'Net {code}', *comments])
+            sheet.append([code, f'Label {code}', *comments])
+            if code % 25 == 0:
+                sheet.append([f'{code - 1}, {code}', f'Combine {code}', *comments])
+            if blank_rows and code % 60 == 0:
+                sheet.append([None, None])
+            if code % 40 == 0 and level:
+                sheet.append(['#' * level, None, *comments])
+                level -= 1
+        for _ in range(random.randint(0, 50)):
+            sheet.append([None, None])
+    workbook.save(path)
+
+def make_ddf(path, rows=20000, columns=200, seed=0):
+
+    # writes sqlite ddf with Levels table and L1 table of given size,
+    # first two columns are system variables, others are categorical
+    # and numeric answers with missing values
+
+    random = Random(seed)
+    names = [':P0', 'Respondent.Serial:L'] + [
+        f'q{c}:C1' if c % 2 else f'q{c}:L' for c in range(2, columns)]
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode = OFF')
+    connection.execute('PRAGMA synchronous = OFF')
+    connection.execute('CREATE TABLE Levels (TableName TEXT, ParentName TEXT, DSCTableName TEXT)')
+    connection.execute("INSERT INTO Levels VALUES ('L1', '', 'HDATA')")
+    connection.execute(f'CREATE TABLE L1 ({", ".join(f"[{n}]" for n in names)})')
+    values = [f'{c};' if c % 3 else None for c in range(1, 50)] + list(range(50))
+    row_values = [[random.choice(values) for _ in range(columns - 2)] for _ in range(100)]
+    connection.executemany(
+        f'INSERT INTO L1 VALUES ({", ".join("?" * columns)})',
+        ((r, r, *row_values[r % 100]) for r in range(rows)))
+    connection.commit()
+    connection.close()
+
+def make_wave_mdd(path, variables=2000, loops=50, iterations=20, categories=20, label='Category'):
+
+    # writes mdd with design section as read by diagnose.get_mdd_data:
+    # categorical variables with a shared list, blocks with numeric
+    # variables and loops over the shared list with categorical variables
+
+    def labels(text):
+        return f'<labels context="LABEL"><text context="QUESTION">{escape(text)}</text></labels>'
+
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<xml>\n')
+        f.write('<mdm:metadata xmlns:mdm="http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04">\n')
+        f.write('<definition>\n')
+        for v in range(variables):
+            f.write(f'<variable id="d{v}" name="q{v}" type="3">{labels(f"Question {v}")}'
+                '<categories global-name-space="-1">'
+                + ''.join(f'<category id="d{v}_{c}" name="{CODE_PREFIX}{c}">{labels(f"{label} {c}")}</category>'
+                    for c in range(categories))
+                + '</categories></variable>\n')
+            f.write(f'<variable id="n{v}" name="n{v}" type="1">{labels(f"Number {v}")}</variable>\n')
+        f.write('<categories id="iterations" name="iterations">'
+            + ''.join(f'<category id="i{i}" name="it{i}">{labels(f"Iteration {i}")}</category>' for i in range(iterations))
+            + '</categories>\n')
+        f.write('</definition>\n<design><fields name="@fields">\n')
+        per_loop = variables // (loops + 1)
+        for v in range(per_loop):
+            f.write(f'<variable id="f{v}" name="q{v}" ref="d{v}"/>\n')
+        f.write('<class id="block" name="block"><fields name="@fields">'
+            + ''.join(f'<variable id="fn{v}" name="n{v}" ref="n{v}"/>' for v in range(variables))
+            + '</fields></class>\n')
+        for l in range(loops):
+            f.write(f'<loop id="l{l}" name="loop{l}"><categories ref_name="iterations"/>'
+                '<class name="@class"><fields name="@fields">'
+                + ''.join(f'<variable id="fl{v}" name="q{v}" ref="d{v}"/>'
+                    for v in range(per_loop * (l + 1), per_loop * (l + 2)))
+                + '</fields></class></loop>\n')
+        f.write('</fields></design>\n</mdm:metadata>\n</xml>\n')
+
+############################################################################
+#
+#                          REFERENCE IMPLEMENTATIONS
+#
+############################################################################
+
+def legacy_from_axis(axis, parent=None, level=0):
+
+    # mask based parser, which was used by CodeplanNode.from_axis before
+    # the single pass parser. kept as reference for benchmarks
+
+    node = CodeplanNode()
+    node._axis = axis
+    node._parent = parent
+    node._level = level
+
+    in_label = False
+    quote_pending = False
+    label_mask = []
+    for c in axis:
+        if c == "'":
+            in_label = True
+            quote_pending = not quote_pending
+        elif in_label and not quote_pending:
+            in_label = False
+            quote_pending = False
+        label_mask.append(in_label)
+
+    level_mask = []
+    level = 1
+    for c, in_label in zip(axis, label_mask):
+        if c == ')' and not in_label:
+            level -= 1
+        level_mask.append(level)
+        if c == '(' and not in_label:
+            level += 1
+
+    children_mask = []
+    nested_brackets = 0
+    for c in axis:
+        if c == '{':
+            nested_brackets += 1
+        children_mask.append(bool(nested_brackets))
+        if c == '}':
+            nested_brackets -= 1
+
+    AxisChar = namedtuple('AxisChar', 'idx char in_label in_children level')
+    characters = [
+        AxisChar(x[0], *x[1])
+        for x in enumerate(zip(axis, label_mask, children_mask, level_mask))
+    ]
+
+    node._children = []
+    if any(children_mask):
+        first = min(c.idx for c in characters if c.in_children) + 1
+        last = max(c.idx for c in characters if c.in_children)
+        current_idx = first
+        current_level = characters[first].level
+        for c in characters[first:last]:
+            if not c.in_label and c.level == current_level and c.char == ',':
+                node._children.append(legacy_from_axis(
+                    axis[current_idx:c.idx].strip(), parent=node, level=node.level + 1))
+                current_idx = c.idx + 1
+        node._children.append(legacy_from_axis(
+            axis[current_idx:last].strip(), parent=node, level=node.level + 1))
+
+    body = ''.join(c.char for c in characters if not c.in_children).strip()
+    node._label = ''.join(c.char for c in characters if not c.in_children and c.in_label)[1:-1].replace("''", "'").strip()
+    body_without_label = ''.join(c.char for c in characters if not c.in_children and not c.in_label).strip()
+    start_properties = body_without_label.find('[')
+    if start_properties >= 0:
+        node._properties = body_without_label[start_properties:]
+        body_without_label = body_without_label[:start_properties].strip()
+    else:
+        node._properties = ''
+
+    split_body = body_without_label.split(maxsplit=1)
+
+    if not body:
+        node._name = ''
+        node._function = ''
+    elif len(split_body) == 1 and '(' not in body_without_label:
+        node._name = body_without_label
+        node._function = ''
+    elif len(split_body) == 1 and '(' in body_without_label:
+        node._name = ''
+        node._function = body_without_label
+    elif len(split_body) == 2:
+        node._name = split_body[0].strip()
+        node._function = split_body[1].strip()
+
+    return node
+
+def peak_memory(function):
+    # returns peak of python allocations in bytes while function runs
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def legacy_flat_children(node):
+    # deep first traversal used by CodeplanNode.flat_children before
+    # the iterative traversal, copies the stack on every step
+    flat_children = []
+    stack = [*node.children]
+    while stack:
+        current = stack[0]
+        stack = stack[1:]
+        flat_children.append(current)
+        for child in reversed(current.children):
+            stack.insert(0, child)
+    return flat_children
+
+def legacy_update_verbaco_line(cfile_manager, input_line):
+    # split based rewriter used by CFileManager before the tokenizer
+    sql_parts = input_line.split(' ')
+    assignment = sql_parts[3]
+    variable = assignment.split('=')[0]
+    codes = assignment.split('=')[1][1:-1].split(',')
+    new_variable = cfile_manager.variable_map.get(variable, variable)
+    variable_category_map = cfile_manager.category_map.get(variable)
+    new_codes = [variable_category_map.get(c, c) for c in codes] if variable_category_map else codes
+    new_codes_without_duplicates = dict.fromkeys(new_codes)
+    sql_parts[3] = f"{new_variable}={{{','.join(new_codes_without_duplicates)}}}"
+    return ' '.join(sql_parts)
+
+def legacy_classify_xl_code(code):
+    # string checks used by XLCodeplanRow.row_type before classify_xl_code
+    if code.isdigit():
+        return XLCodeplanRowTypes.Regular, []
+    elif code and code in '*******':
+        return XLCodeplanRowTypes.NetStart, []
+    elif code and code in '#######':
+        return XLCodeplanRowTypes.NetEnd, []
+    elif '.' in code and code.replace('.', '', 1).isdigit():
+        return XLCodeplanRowTypes.Combine, code.split('.')
+    elif ',' in code and len(code.split(',')) == len(
+            [c.strip() for c in code.split(',') if c.strip().isdigit()]):
+        return XLCodeplanRowTypes.Combine, [c.strip() for c in code.split(',') if c.strip().isdigit()]
+    return XLCodeplanRowTypes.Invalid, []
+
+def legacy_xl_file(path, code_column=1):
+
+    # loader used by XLFile before reading values only, creates
+    # cells of all columns and a row for every row of every sheet
+
+    xl_file = XLFile.__new__(XLFile)
+    xl_file.path = path
+    xl_file.code_column = code_column
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    codeplans = []
+    for sheet in workbook:
+        rows = []
+        for index, row in enumerate(sheet, start=1):
+            xl_row = XLCodeplanRow(code=row[code_column - 1].value, label=row[code_column].value, index=index)
+            xl_row._row_type, xl_row._combine_codes = legacy_classify_xl_code(xl_row.code)
+            rows.append(xl_row)
+        codeplans.append(XLCodeplan(name=sheet.title, rows=rows, xl_file=xl_file))
+    xl_file.codeplans = IndexedList(codeplans, key='name')
+    xl_file.category_map = []
+    workbook.close()
+    return xl_file
+
+class LegacyMDDFileMerger:
+
+    # merger of 2 mdd files used before name indexes, looks up
+    # names in lists rebuilt for every slave type and variable
+
+    def __init__(self, master_mdd_file, slave_mdd_file):
+        self.master = master_mdd_file
+        self.slave = slave_mdd_file
+        self.new_types = [t for t in self.slave.types
+            if t.name not in [mt.name for mt in self.master.types]
+        ]
+        self.new_variables = [v for v in self.slave.variables
+            if v.name not in [mv.name for mv in self.master.variables]
+        ]
+        for v in self.new_variables:
+            if v.type_name in [t.name for t in self.master.types]:
+                v.axis = self.master[v.type_name].axis
+
+    def merge(self):
+        self.master.types.extend(self.new_types)
+        self.master.variables.extend(self.new_variables)
+        return self.master
+
+def legacy_codeplan_report(merger):
+    # label comparison of CodeplanMerger.report before diff_elements,
+    # looks up both elements per code and concatenates strings
+    mdd_codes = {e.code for e in merger.mdd_codeplan.elements}
+    xl_codes = {e.code for e in merger.xl_codeplan.elements}
+    report = ''
+    for e in sorted(mdd_codes & xl_codes, key=sort_element):
+        mdd_element = merger.mdd_codeplan[e]
+        xl_element = merger.xl_codeplan[e]
+        if mdd_element.label != xl_element.label:
+            report += f'Label differences for {e}: "{mdd_element.label} (MDD)" -> "{xl_element.label}" (XL)\n'
+    return report
+
+class LegacyXLCodeplan(XLCodeplan):
+
+    # elements as built before they were sorted once,
+    # list is sorted again on every access
+
+    @property
+    def elements(self):
+        if self._elements is None:
+            elements_with_label_list = defaultdict(list)
+            for row in self.rows:
+                if row.row_type == XLCodeplanRowTypes.Regular:
+                    elements_with_label_list[row.code].append(row.label)
+                elif row.row_type == XLCodeplanRowTypes.Combine:
+                    for c in row.combine_codes:
+                        elements_with_label_list[c].append('')
+            self._elements = CodeplanElements()
+            for code, labels in elements_with_label_list.items():
+                self._elements.append(CodeplanElement(
+                    code=f'{CODE_PREFIX}{code}', label=max(labels), double=len(labels) > 1))
+        self._elements.sort()
+        return self._elements
+
+def legacy_variable_map(mdd_file):
+    # variable map as computed by MDDFile.variable_map on every access
+    # before it was cached
+    variables_per_field = defaultdict(list)
+    for v in mdd_file.variables:
+        variables_per_field[v.field_name].append(v)
+    types_per_field = defaultdict(set)
+    for v in mdd_file.variables:
+        types_per_field[v.field_name].add(v.type_name)
+    return {
+        f'{v.label}{HELPER_FIELD}': v.compliant_name
+            for k, variables in variables_per_field.items()
+            for v in variables
+            if len(types_per_field[k]) > 1
+    }
+
+def legacy_parse_variable_label(label):
+    # split based field_name, iterations and compliant_name
+    # of MDDVariable before parse_variable_label
+    field_name = '.'.join(part.split('[')[0] for part in label.split('.'))
+    iterations = [part.split('[')[1][1:-2] for part in label.split('.') if len(part.split('[')) > 1]
+    prefix = '_'.join(field_name.split('.'))
+    suffix = '_'.join(iterations) + '_o_c'
+    return field_name, iterations, f'{prefix}_{suffix}'
+
+def legacy_compare_waves(old_wave_variables, new_wave_variables):
+
+    # variable by variable comparison of create_excel_comparison
+    # before compare_waves, returns the same tuples
+    master_variables = []
+    for name, variable in new_wave_variables.items():
+        if name not in old_wave_variables:
+            master_variables.append((name, variable.data_type, True, False, False, False, False, False))
+    for name, variable in old_wave_variables.items():
+        if name not in new_wave_variables:
+            master_variables.append((name, variable.data_type, False, True, False, False, False, False))
+    for new_variable in new_wave_variables.values():
+        old_variable = old_wave_variables.get(new_variable.name)
+        if old_variable:
+            v_label = old_variable.label != new_variable.label
+            for new_name, new_label in new_variable.categories.items():
+                old_label = old_variable.categories.get(new_name)
+                if old_label and new_label != old_label:
+                    c_label = True
+                    break
+            else:
+                c_label = False
+            c_new = bool([c for c in new_variable.categories if c not in old_variable.categories])
+            c_dropped = bool([c for c in old_variable.categories if c not in new_variable.categories])
+            if v_label or c_label or c_new or c_dropped:
+                master_variables.append((new_variable.name, new_variable.data_type,
+                    False, False, c_new, c_dropped, v_label, c_label))
+    return master_variables
+
+def dict_backed(obj):
+
+    # returns factory for plain objects with __dict__, which store
+    # the same attributes as the slotted object (as before __slots__).
+    # lists (children of nodes) are new plain lists for every object
+
+    attributes = {name: getattr(obj, name) for name in type(obj).__slots__}
+
+    def __init__(self):
+        for name, value in attributes.items():
+            setattr(self, name, list(value) if isinstance(value, list) else value)
+
+    return type(f'Dict{type(obj).__name__}', (), {'__init__': __init__})
+
+def make_cfile(path, respondents=2000, variables=10):
+    # writes verbaco cfile with one statement per respondent and variable
+    with open(path, mode='w', encoding='utf-8') as f:
+        for v in range(variables):
+            for r in range(1, respondents + 1):
+                f.write(f'UPDATE vdata SET q{v}_o_c={{CB_{r % 7},CB_{v}}} WHERE serial = {r}\n')
+
+class SQLiteVdata:
+
+    # sqlite stand-in for vdata table of the mrOleDB provider,
+    # categorical values {a,b} are stored as text
+
+    CATEGORICAL = re.compile(r"\{[^{}]*\}")
+
+    def __init__(self, path, respondents=2000, variables=10):
+        self.connection = sqlite3.connect(path)
+        columns = ', '.join(f'q{v}_o_c TEXT' for v in range(variables))
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS vdata (serial INTEGER PRIMARY KEY, {columns})')
+        self.connection.executemany('INSERT OR IGNORE INTO vdata (serial) VALUES (?)',
+            [(r,) for r in range(1, respondents + 1)])
+        self.connection.commit()
+
+    def cursor(self):
+        # works as its own cursor, closing it keeps the connection open
+        return self
+
+    def execute(self, sql_line):
+        return self.connection.execute(self.CATEGORICAL.sub(lambda m: f"'{m.group()}'", sql_line))
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        pass
+
+def copy_model(obj):
+    # independent copy of MDDFile or XLFile for repeated merges
+    return pickle.loads(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+def node_signature(node):
+    # comparable representation of a complete tree
+    return (node.name, node.label, node.function, node.properties, node.level,
+        node._axis, tuple(node_signature(c) for c in node.children))
+
+############################################################################
+#
+#                               BENCHMARKS
+#
+############################################################################
+
+def bench_axis_parser(elements=5000, repeat=3):
+
+    axis = make_axis(elements=elements)
+    assert node_signature(CodeplanNode.from_axis(axis)) == node_signature(legacy_from_axis(axis))
+
+    legacy = timeit(lambda: legacy_from_axis(axis), number=repeat) / repeat
+    current = timeit(lambda: CodeplanNode.from_axis(axis), number=repeat) / repeat
+    print(f'axis parser ({len(axis):,} characters, {elements:,} elements)')
+    print(f'    legacy:  {legacy * 1000:10.1f} ms')
+    print(f'    current: {current * 1000:10.1f} ms ({legacy / current:.1f}x)')
+
+def bench_mdd_stream_memory(sizes=(5, 50), types=200, elements=50):
+
+    # peak memory of the streaming reader while MDD files grow.
+    # variables and types are consumed without keeping them,
+    # so only the memory used by the parser itself is measured.
+    # files grow by variables and design fields with the same types,
+    # axes of variables are kept until their type is read, so the
+    # remaining memory depends on the number of types only
+
+    print('mdd reader peak memory')
+    peaks = []
+    with TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f'{size}.mdd')
+            make_mdd(path, types=types, elements=elements,
+                variables_per_type=size, design_fields=size * 2000)
+            mdd_size = os.path.getsize(path)
+            mdd_file = MDDFile.__new__(MDDFile)
+            mdd_file.path = path
+
+            def consume():
+                for _ in mdd_file._iter_mdd_from_stream():
+                    pass
+
+            tree = peak_memory(lambda: ElementTree.parse(path))
+            stream = peak_memory(consume)
+            peaks.append(stream)
+            print(f'    {mdd_size / 2**20:8.1f} MB mdd: ElementTree.parse {tree / 2**20:8.1f} MB, '
+                f'stream {stream / 2**20:6.1f} MB')
+    assert peaks[-1] < peaks[0] * 1.5, 'peak memory of streaming reader grows with mdd size'
+
+
+def bench_indexed_lookup(types=500, elements=100):
+
+    # looks up every type and every element by name as
+    # CodeplanMerger.report and the master update do
+
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'lookup.mdd')
+        make_mdd(path, types=types, elements=elements, variables_per_type=1)
+        mdd_file = MDDFile(path)
+
+    def linear():
+        for name in [t.name for t in mdd_file.types]:
+            mdd_codeplan = [t for t in mdd_file.types if t.name == name][0]
+            for code in [e.code for e in mdd_codeplan.elements]:
+                [e for e in mdd_codeplan.elements if e.code == code][0]
+
+    def indexed():
+        for name in [t.name for t in mdd_file.types]:
+            mdd_codeplan = mdd_file[name]
+            for code in [e.code for e in mdd_codeplan.elements]:
+                mdd_codeplan[code]
+
+    legacy = timeit(linear, number=1)
+    current = timeit(indexed, number=1)
+    print(f'type and element lookup ({types:,} types, {types * elements:,} elements)')
+    print(f'    linear scan: {legacy * 1000:10.1f} ms')
+    print(f'    indexed:     {current * 1000:10.1f} ms ({legacy / current:.1f}x)')
+
+
+def bench_tree_traversal(elements=20000):
+
+    tree = CodeplanNode.from_axis(make_axis(elements=elements, nets=elements // 100))
+    nodes = len(tree.flat_children)
+    assert legacy_flat_children(tree) == tree.flat_children
+
+    def legacy():
+        flat_children = legacy_flat_children(tree)
+        [n for n in flat_children if n.function == 'net()']
+
+    def current():
+        tree._invalidate()
+        tree.find_all(function='net()')
+
+    legacy_time = timeit(legacy, number=1)
+    current_time = timeit(current, number=1)
+    print(f'tree traversal and net lookup ({nodes:,} nodes)')
+    print(f'    legacy:  {legacy_time * 1000:10.1f} ms')
+    print(f'    current: {current_time * 1000:10.1f} ms ({legacy_time / current_time:.1f}x)')
+
+
+def bench_object_size(count=50000):
+
+    # bytes per object, attribute values are shared between objects,
+    # so only the objects and their own containers are measured.
+    # nodes are leaves, which create their children list on first access.
+    # every object is built from scratch, copies would share containers
+
+    def row():
+        row = XLCodeplanRow('12', 'label', 1)
+        row.combine_codes
+        return row
+
+    factories = [
+        lambda: CodeplanNode('CB_1', 'label', level=1),
+        lambda: CodeplanElement('CB_1', 'label'),
+        lambda: MDDVariable('head_1', 'loop[{_1}].q1', 'head', '{CB_1}'),
+        row,
+    ]
+    print('bytes per object')
+    for factory in factories:
+        sample = factory()
+        dict_class = dict_backed(sample)
+        slotted = peak_memory(lambda: [factory() for _ in range(count)]) / count
+        plain = peak_memory(lambda: [dict_class() for _ in range(count)]) / count
+        print(f'    {type(sample).__name__:16} dict: {plain:6.0f}, slots: {slotted:6.0f}')
+
+
+def bench_cfile_coalescing(respondents=5000, variables=10):
+
+    with TemporaryDirectory() as directory:
+        cfile = os.path.join(directory, 'cfile.txt')
+        coalesced = os.path.join(directory, 'coalesced.txt')
+        make_cfile(cfile, respondents, variables)
+        coalesce_cfile(cfile, coalesced)
+
+        print(f'cfile execution on sqlite stand-in ({respondents:,} respondents, {variables} variables)')
+        results = {}
+        for name, path in (('single', cfile), ('coalesced', coalesced)):
+            vdata = SQLiteVdata(os.path.join(directory, f'{name}.sqlite'), respondents, variables)
+            executor = CFileExecutor(vdata, path, verbose=False)
+            seconds = timeit(executor.execute, number=1)
+            results[name] = vdata.connection.execute('SELECT * FROM vdata ORDER BY serial').fetchall()
+            vdata.connection.close()
+            print(f'    {name:10} {executor.rows_executed:8,} statements {seconds * 1000:10.1f} ms')
+        assert results['single'] == results['coalesced']
+
+
+def make_cfile_manager(directory, respondents, variables):
+    cfile = os.path.join(directory, 'cfile.txt')
+    make_cfile(cfile, respondents, variables)
+    variable_map = os.path.join(directory, 'variable_map.txt')
+    category_map = os.path.join(directory, 'category_map.txt')
+    with open(variable_map, mode='w', encoding='utf-8') as f:
+        f.writelines(f'q{v}_o_c,q{v}_new_o_c\n' for v in range(0, variables, 2))
+    with open(category_map, mode='w', encoding='utf-8') as f:
+        f.writelines(f'q{v}_o_c,CB_{c},CB_99\n' for v in range(variables) for c in range(3))
+    return CFileManager(cfile, variable_map, category_map)
+
+def bench_cfile_line_rewrite(respondents=10000, variables=10):
+
+    with TemporaryDirectory() as directory:
+        manager = make_cfile_manager(directory, respondents, variables)
+        with open(manager.cfile_path, mode='r', encoding='utf-8') as f:
+            lines = f.readlines()
+    manager.invalid_lines = []
+    assert [legacy_update_verbaco_line(manager, line) for line in lines] == \
+        [manager._update_line(line, n) for n, line in enumerate(lines)]
+
+    legacy = timeit(lambda: [legacy_update_verbaco_line(manager, line) for line in lines], number=1)
+    current = timeit(lambda: [manager._update_line(line, n) for n, line in enumerate(lines)], number=1)
+    print(f'cfile line rewrite ({len(lines):,} lines)')
+    print(f'    split based: {len(lines) / legacy:12,.0f} lines/s')
+    print(f'    tokenizer:   {len(lines) / current:12,.0f} lines/s')
+
+def bench_xl_loader(sheets=60, codes=300):
+
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'codeplans.xlsx')
+        make_xl_workbook(path, sheets=sheets, codes=codes)
+        legacy = legacy_xl_file(path)
+        current = XLFile(path)
+        assert [(cp.name, cp.axis, cp.errors) for cp in legacy.codeplans] == \
+            [(cp.name, cp.axis, cp.errors) for cp in current.codeplans]
+
+        adapter_sheets = [f'Q{s}' for s in range(0, sheets, 6)]
+        print(f'excel loader ({sheets} sheets, {codes} codes per sheet)')
+        for name, load in (
+                ('cells, all sheets:', lambda: legacy_xl_file(path)),
+                ('values, all sheets:', lambda: XLFile(path)),
+                (f'values, {len(adapter_sheets)} sheets:', lambda: XLFile(path, sheets=adapter_sheets))):
+            print(f'    {name:22}{timeit(load, number=1):8.2f}s')
+
+def bench_codeplan_cache(types=200, elements=100, sheets=60):
+
+    with TemporaryDirectory() as directory:
+        mdd_path = os.path.join(directory, 'codeplan.mdd')
+        xl_path = os.path.join(directory, 'codeplans.xlsx')
+        make_mdd(mdd_path, types=types, elements=elements)
+        make_xl_workbook(xl_path, sheets=sheets)
+        cache = CodeplanCache(os.path.join(directory, 'cache'))
+
+        def load():
+            mdd_file = cache.load(MDDFile, mdd_path)
+            xl_file = cache.load(XLFile, xl_path)
+            return mdd_file, xl_file
+
+        cold = timeit(load, number=1)
+        warm = timeit(load, number=1)
+        assert (cache.hits, cache.misses) == (2, 2)
+        (mdd_file, xl_file), parsed = load(), (MDDFile(mdd_path), XLFile(xl_path))
+        assert [node_signature(cp.tree) for cp in mdd_file] == [node_signature(cp.tree) for cp in parsed[0]]
+        assert [node_signature(cp.tree) for cp in xl_file] == [node_signature(cp.tree) for cp in parsed[1]]
+        cache_size = sum(e.stat().st_size for e in os.scandir(cache.directory))
+
+        print(f'codeplan cache ({types} mdd types, {sheets} excel sheets, {cache_size / 2**20:.1f} MB cached)')
+        print(f'    cold: {cold:8.2f}s')
+        print(f'    warm: {warm:8.2f}s')
+
+def bench_xl_merge(codeplans=45, codes=1000):
+
+    with TemporaryDirectory() as directory:
+        mdd_path = os.path.join(directory, 'codeplan.mdd')
+        xl_path = os.path.join(directory, 'codeplans.xlsx')
+        make_mdd(mdd_path, types=codeplans, elements=codes)
+        make_xl_workbook(xl_path, sheets=codeplans, codes=codes, blank_rows=False)
+        adapter = [CodeplanMap(f'head_{c}', f'Q{c}', f'cp_{c}', 'CB_99') for c in range(codeplans)]
+        merger = MDDXLFileMerger(MDDFile(mdd_path), XLFile(xl_path), adapter)
+        seconds = timeit(merger.merge_all, number=1)
+
+        print(f'codeplan merge ({codeplans} codeplans, {codes} codes each)')
+        print(f'    merge_all: {seconds:8.2f}s')
+
+def bench_wave_merge(waves=12, types=200, new_types_per_wave=20, elements=20):
+
+    with TemporaryDirectory() as directory:
+        wave_files = []
+        for w in range(waves):
+            path = os.path.join(directory, f'wave{w}.mdd')
+            make_mdd(path, types=types, elements=elements + w, first_type=w * new_types_per_wave)
+            wave_files.append(MDDFile(path))
+
+        def pairwise(master, *slaves):
+            for slave in slaves:
+                master = LegacyMDDFileMerger(master, slave).merge()
+            return master
+
+        def single_pass(master, *slaves):
+            return MDDFileMerger(master, *slaves).merge()
+
+        def signature(mdd_file):
+            return [(t.name, t.axis) for t in mdd_file.types], [(v.name, v.type_name, v.axis) for v in mdd_file.variables]
+
+        results = {}
+        print(f'wave merge ({waves} waves)')
+        for name, merge in (('pairwise lists:', pairwise), ('single pass:', single_pass)):
+            copies = [copy_model(f) for f in wave_files]
+            start = perf_counter()
+            results[name] = merge(*copies)
+            print(f'    {name:16}{perf_counter() - start:8.3f}s')
+        assert len({repr(signature(r)) for r in results.values()}) == 1
+
+def bench_mdd_writer(types=200, elements=100):
+
+    with TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.mdd')
+        target = os.path.join(directory, 'target.mdd')
+        make_mdd(source, types=types, elements=elements)
+        mdd_file = MDDFile(source)
+        seconds = timeit(lambda: mdd_file.save_as(target), number=1)
+        saved = MDDFile(target)
+        assert [(t.name, t.axis, [(e.code, e.label) for e in t.elements]) for t in saved.types] == \
+            [(t.name, t.axis, [(e.code, e.label) for e in t.elements]) for t in mdd_file.types]
+        print(f'mdd xml writer ({types} types, {types * elements:,} elements, {len(mdd_file.variables)} variables)')
+        print(f'    save_as: {seconds * 1000:8.1f}ms ({os.path.getsize(target) / 2**20:.1f} MB)')
+
+def bench_codeplan_report(codes=5000):
+
+    with TemporaryDirectory() as directory:
+        mdd_path = os.path.join(directory, 'codeplan.mdd')
+        xl_path = os.path.join(directory, 'codeplans.xlsx')
+        make_mdd(mdd_path, types=1, elements=codes)
+        make_xl_workbook(xl_path, sheets=1, codes=codes, blank_rows=False)
+        merger = MDDXLFileMerger(MDDFile(mdd_path), XLFile(xl_path), [CodeplanMap('head_0', 'Q0', 'cp_0', 'CB_99')])
+        m = merger.codeplan_mergers[0]
+
+        assert m.report.endswith(legacy_codeplan_report(m))
+        print(f'codeplan report ({codes:,} elements)')
+        print(f'    lookups per code: {timeit(lambda: legacy_codeplan_report(m), number=1) * 1000:8.1f}ms')
+        print(f'    diff_elements:    {timeit(lambda: diff_elements(m.mdd_codeplan.elements, m.xl_codeplan.elements), number=1) * 1000:8.1f}ms')
+        print(f'    report:           {timeit(lambda: m.report, number=1) * 1000:8.1f}ms')
+
+def bench_xl_elements(codeplans=45, codes=1000):
+
+    with TemporaryDirectory() as directory:
+        mdd_path = os.path.join(directory, 'codeplan.mdd')
+        xl_path = os.path.join(directory, 'codeplans.xlsx')
+        make_mdd(mdd_path, types=codeplans, elements=codes)
+        make_xl_workbook(xl_path, sheets=codeplans, codes=codes, blank_rows=False)
+        adapter = [CodeplanMap(f'head_{c}', f'Q{c}', f'cp_{c}', 'CB_99') for c in range(codeplans)]
+        mdd_file = MDDFile(mdd_path)
+        xl_file = XLFile(xl_path)
+
+        print(f'excel elements in report and merge ({codeplans} codeplans, {codes} codes each)')
+        results = {}
+        for name, cls in (('sorted per access:', LegacyXLCodeplan), ('sorted once:', XLCodeplan)):
+            merged_mdd, merged_xl = copy_model(mdd_file), copy_model(xl_file)
+            for cp in merged_xl.codeplans:
+                cp.__class__ = cls
+
+            def report_and_merge():
+                merger = MDDXLFileMerger(merged_mdd, merged_xl, adapter)
+                lookups = [cp[e.code] for cp in merged_xl.codeplans for e in cp.elements]
+                return merger.report, len(lookups), merger.merge_all()
+
+            seconds = timeit(report_and_merge, number=1)
+            results[name] = [(t.name, t.axis, [(e.code, e.label) for e in t.elements]) for t in merged_mdd.types]
+            print(f'    {name:19}{seconds:8.2f}s')
+        assert len({repr(r) for r in results.values()}) == 1
+
+def bench_variable_map(types=100, variables_per_type=20):
+
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'codeplan.mdd')
+        make_mdd(path, types=types, elements=10, variables_per_type=variables_per_type)
+        mdd_file = MDDFile(path)
+
+    def split_variables(variable_map):
+        # original and new variables as split by update of master mdd
+        original_variables = [v for v in mdd_file.variables if v.label + HELPER_FIELD not in variable_map()]
+        new_variables = [v for v in mdd_file.variables if v.label + HELPER_FIELD in variable_map()]
+        return original_variables, new_variables
+
+    assert split_variables(lambda: legacy_variable_map(mdd_file)) == split_variables(lambda: mdd_file.variable_map)
+    print(f'variable map ({len(mdd_file.variables):,} variables, one access per variable)')
+    print(f'    rebuilt per access: {timeit(lambda: split_variables(lambda: legacy_variable_map(mdd_file)), number=1):8.3f}s')
+    print(f'    cached:             {timeit(lambda: split_variables(lambda: mdd_file.variable_map), number=1):8.3f}s')
+
+def bench_variable_labels(loops=200, iterations=1000):
+
+    labels = [f'loop{l}[{{_{i}}}].q{l}[{{slice{i % 7}}}].coding' for l in range(loops) for i in range(iterations)]
+    assert [legacy_parse_variable_label(l) for l in labels[:100]] == [parse_variable_label(l) for l in labels[:100]]
+
+    print(f'variable labels ({len(labels):,} labels of {loops} loops)')
+    print(f'    splits: {timeit(lambda: [legacy_parse_variable_label(l) for l in labels], number=1):8.2f}s')
+    print(f'    regex:  {timeit(lambda: [parse_variable_label(l) for l in labels], number=1):8.2f}s')
+    legacy = [legacy_parse_variable_label(l)[0] for l in labels]
+    current = [parse_variable_label(l)[0] for l in labels]
+    print(f'    distinct field name objects: {len({id(f) for f in legacy}):,} -> {len({id(f) for f in current}):,}')
+
+def bench_parallel_cfile_rewrite(respondents=50000, variables=10):
+
+    with TemporaryDirectory() as directory:
+        manager = make_cfile_manager(directory, respondents, variables)
+        cfile = manager.cfile_path
+
+        print(f'cfile rewrite ({os.path.getsize(cfile) / 2**20:.1f} MB)')
+        for processes in sorted({1, 2, os.cpu_count()}):
+            output = os.path.join(directory, f'output_{processes}.txt')
+            seconds = timeit(lambda: manager.save_cfile(output, processes=processes, chunk_size=2**20), number=1)
+            print(f'    {processes:3} processes {seconds * 1000:10.1f} ms')
+
+def bench_block_transferer(rows=20000, columns=200):
+
+    # rename edits the schema only, copy time depends on size of data.
+    # production size ddf (1,000,000 rows, 2,000 columns) needs ~6 GB of disk
+    # per copy, it is only run with BENCH_LARGE_DDF=1
+    with TemporaryDirectory() as directory:
+        clean = os.path.join(directory, 'clean.ddf')
+        make_ddf(clean, rows, columns)
+        print(f'block transfer of ddf ({rows:,} rows, {columns:,} columns, '
+            f'{os.path.getsize(clean) / 2**20:,.0f} MB, sqlite {sqlite3.sqlite_version})')
+        for name, in_place in (('copy', False), ('rename', True)):
+            path = os.path.join(directory, f'{name}.ddf')
+            copyfile(clean, path)
+            transferer = BlockTransferer('test.mdd', path, 'Block')
+            seconds = timeit(lambda: transferer.update_ddf(['Respondent.Serial'], in_place=in_place), number=1)
+            print(f'    {name:8} {seconds:8.2f}s')
+            os.remove(path)
+
+def bench_ddf_cfile(respondents=20000, variables=10):
+
+    # executes cfile on sqlite vdata stand-in one statement per line
+    # and on ddf L1 table with DDFData
+    with TemporaryDirectory() as directory:
+        cfile = os.path.join(directory, 'cfile.txt')
+        make_cfile(cfile, respondents, variables)
+        vdata = SQLiteVdata(os.path.join(directory, 'vdata.sqlite'), respondents, variables)
+        executor = CFileExecutor(vdata, cfile, batch_size=10000, verbose=False)
+        print(f'cfile on sqlite ({respondents * variables:,} statements)')
+        seconds = timeit(executor.execute, number=1)
+        print(f'    statement per line: {executor.rows_executed / seconds:12,.0f} statements/s')
+        vdata.connection.close()
+
+        path = os.path.join(directory, 'data.ddf')
+        connection = sqlite3.connect(path)
+        columns = ', '.join(f'[q{v}_o_c:C1] TEXT' for v in range(variables))
+        connection.execute(f'CREATE TABLE L1 ([:P0] INTEGER, [serial:L] INTEGER PRIMARY KEY, {columns})')
+        connection.executemany('INSERT INTO L1 ([:P0], [serial:L]) VALUES (?, ?)',
+            [(r, r) for r in range(1, respondents + 1)])
+        connection.commit()
+        connection.close()
+        ddf = DDFData(path, {f'{CODE_PREFIX}{c}': c + 1 for c in range(max(7, variables))})
+        seconds = timeit(lambda: ddf.execute_cfile(cfile), number=1)
+        print(f'    ddf executemany:    {ddf.rows_executed / seconds:12,.0f} statements/s')
+        assert ddf.rows_updated == respondents * variables
+        ddf.close()
+
+def make_waves(variables=30000, categories=20, changed=0.02, seed=0):
+
+    # two waves of RawVariableInfo, most variables unchanged,
+    # some with new labels, new or dropped categories
+    random = Random(seed)
+    old_wave, new_wave = {}, {}
+    for v in range(variables):
+        name = f'q{v}'
+        old_categories = {f'{CODE_PREFIX}{c}': f'Category {c}' for c in range(categories)}
+        new_categories = dict(old_categories)
+        label = f'Question {v}'
+        if random.random() < changed:
+            change = random.randrange(3)
+            if change == 0:
+                new_categories[f'{CODE_PREFIX}1'] = 'new label'
+            elif change == 1:
+                new_categories[f'{CODE_PREFIX}{categories}'] = 'new category'
+            else:
+                del new_categories[f'{CODE_PREFIX}0']
+        if v % 100 != 1:
+            old_wave[name] = RawVariableInfo(name, label, 'mtCategorical', old_categories)
+        if v % 100 != 2:
+            new_wave[name] = RawVariableInfo(name, label, 'mtCategorical', new_categories)
+    return old_wave, new_wave
+
+def bench_wave_comparison(variables=30000, categories=20):
+
+    old_wave, new_wave = make_waves(variables, categories)
+    assert legacy_compare_waves(old_wave, new_wave) == compare_waves(old_wave, new_wave)
+    print(f'wave comparison ({variables:,} variables, {categories} categories)')
+    print(f'    per variable: {timeit(lambda: legacy_compare_waves(old_wave, new_wave), number=1):8.3f}s')
+    print(f'    fingerprints: {timeit(lambda: compare_waves(old_wave, new_wave), number=1):8.3f}s')
+
+def bench_get_mdd_data(variables=2000, loops=50, iterations=20, categories=20):
+
+    # COM path (MDM.Document) needs windows with dimensions, so only
+    # the xml reader is measured: one wave, both waves one after
+    # another and both waves in separate processes
+    with TemporaryDirectory() as directory:
+        old_mdd = os.path.join(directory, 'old.mdd')
+        new_mdd = os.path.join(directory, 'new.mdd')
+        make_wave_mdd(old_mdd, variables, loops, iterations, categories)
+        make_wave_mdd(new_mdd, variables, loops, iterations, categories, label='Changed')
+        wave = get_mdd_data(old_mdd, parser='xml')
+        print(f'mdd data of waves ({len(wave):,} variables, {os.path.getsize(old_mdd) / 2**20:.1f} MB per wave)')
+        seconds = timeit(lambda: get_mdd_data(old_mdd, parser='xml'), number=1)
+        print(f'    one wave:            {seconds:8.2f}s')
+        for processes in (1, 2):
+            seconds = timeit(lambda: read_waves(old_mdd, new_mdd, parser='xml', processes=processes), number=1)
+            print(f'    both, {processes} processes: {seconds:8.2f}s')
+        old_wave, new_wave = read_waves(old_mdd, new_mdd, parser='xml', processes=1)
+        print(f'    {len(compare_waves(old_wave, new_wave)):,} changed variables')
+
+
+if __name__ == '__main__':
+    bench_axis_parser()
+    bench_mdd_stream_memory()
+    bench_indexed_lookup()
+    bench_tree_traversal()
+    bench_object_size()
+    bench_cfile_coalescing()
+    bench_cfile_line_rewrite()
+    bench_xl_loader()
+    bench_codeplan_cache()
+    bench_xl_merge()
+    bench_wave_merge()
+    bench_mdd_writer()
+    bench_codeplan_report()
+    bench_xl_elements()
+    bench_variable_map()
+    bench_variable_labels()
+    bench_parallel_cfile_rewrite()
+    bench_block_transferer()
+    if os.environ.get('BENCH_LARGE_DDF') == '1':
+        bench_block_transferer(1000000, 2000)
+    bench_ddf_cfile()
+    bench_wave_comparison()
+    bench_get_mdd_data()
@@ -1,10 +1,25 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import zlib
+from sys import intern
+from io import StringIO
 from enum import IntEnum
-from win32com import client
-from openpyxl import load_workbook
-from collections import defaultdict, namedtuple
+from openpyxl import Workbook, load_workbook
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from shutil import copyfile
-from adodbapi import connect
+from time import perf_counter
+from uuid import NAMESPACE_OID, uuid5
+from weakref import WeakValueDictionary
 from xml.etree import ElementTree
+from xml.sax.saxutils import XMLGenerator
+
+# win32com and adodbapi are only available on windows with dimensions
+# installed, so they are imported by functions, which use COM or mrOleDB
 
 ############################################################################
 #
@@ -14,6 +29,10 @@ from xml.etree import ElementTree
 
 CODE_PREFIX = 'CB_'
 HELPER_FIELD =  '.Coding'
+MDM_NAMESPACE = 'http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04'
+# part of CodeplanCache keys, has to be increased whenever parsers
+# or pickled models (MDDFile, XLFile and their codeplans) change
+PARSER_VERSION = 4
 
 class CodeplanNodeTypes(IntEnum):
     Root = 0
@@ -129,8 +148,13 @@ class openConstants(IntEnum):
 ############################################################################
 
 
+NodeIndex = namedtuple('NodeIndex', 'by_name by_function')
+
 class CodeplanNode:
 
+    __slots__ = ('_name', '_label', '_function', '_properties', '_parent', '_level',
+        '_axis', '_children', '_flat_children', '_index')
+
     def __init__(self, name='', label='', function='', properties='', parent=None, level=0):
         self._name = name
         self._label = label
@@ -140,105 +164,14 @@ class CodeplanNode:
         self._level = level       
 
         self._axis = None
-        self._children = []
+        # list of children is created on first access, leaves don't need it
+        self._children = None
         self._flat_children = None
+        self._index = None
 
     @classmethod
     def from_axis(cls, axis, parent=None, level=0):
-
-        node = CodeplanNode()
-        node._axis = axis
-        node._parent = parent
-        node._level = level
-
-        # sets label mask
-        in_label = False
-        quote_pending = False
-        label_mask = []
-        for c in axis:
-            if c == "'": # label starts or continues
-                in_label = True
-                quote_pending = not quote_pending
-            elif in_label and not quote_pending: #label ends
-                in_label = False
-                quote_pending = False
-            label_mask.append(in_label)
-
-        # sets level mask
-        level_mask = []
-        level = 1
-        for c, in_label in zip(axis, label_mask):
-            if c == ')' and not in_label:
-                level -= 1
-            level_mask.append(level)
-            if c == '(' and not in_label:
-                level += 1
-
-        # sets children mask
-        children_mask = []
-        nested_brackets = 0
-        for c in axis:
-            if c == '{':
-                nested_brackets += 1
-            children_mask.append(bool(nested_brackets))
-            if c == '}':
-                nested_brackets -= 1
-    
-        # sets characters
-        AxisChar = namedtuple('AxisChar', 'idx char in_label in_children level')
-        characters = [
-            AxisChar(x[0], *x[1])
-            for x in enumerate(zip(axis, label_mask, children_mask, level_mask))
-        ]
-
-        # sets children if they were found in children mask
-        node._children = []
-        if any(children_mask):
-            first = min(c.idx for c in characters if c.in_children) + 1
-            last = max(c.idx for c in characters if c.in_children)
-            current_idx = first
-            current_level = characters[first].level
-            for c in characters[first:last]:
-                if not c.in_label and c.level == current_level and c.char == ',' :
-                        node._children.append(CodeplanNode.from_axis(
-                            axis[current_idx:c.idx].strip(),
-                            parent = node,
-                            level = node.level + 1
-                            ))
-                        current_idx = c.idx + 1
-            node._children.append(CodeplanNode.from_axis(
-                axis[current_idx:last].strip(),
-                parent = node,
-                level = node.level + 1
-                ))
-
-        # sets body, name, label, function and properties
-        body = ''.join(c.char for c in characters if not c.in_children).strip()
-        node._label = ''.join(c.char for c in characters if not c.in_children and c.in_label)[1:-1].replace("''", "'").strip()
-        body_without_label = ''.join(c.char for c in characters if not c.in_children and not c.in_label).strip()
-        start_properties = body_without_label.find('[')
-        if start_properties >= 0:
-            node._properties = body_without_label[start_properties:]
-            body_without_label = body_without_label[:start_properties].strip()
-        else:
-            node._properties = ''
-        
-        split_body = body_without_label.split(maxsplit=1)
-
-        if not body: # if there is no body
-            node._name = ''
-            node._function = ''
-        elif len(split_body) == 1 and '(' not in body_without_label: # single code
-            node._name = body_without_label
-            node._function = ''
-        elif len(split_body) == 1 and '(' in body_without_label: # single function
-            node._name = ''
-            node._function = body_without_label
-        elif len(split_body) == 2: # function
-            node._name = split_body[0].strip()
-            node._function = split_body[1].strip()
-
-        return node
+        return _AxisParser(axis).parse(parent, level)
 
     @classmethod
     def from_excel(cls, xl_rows):
@@ -329,7 +262,6 @@ class CodeplanNode:
             tom_node.children.insert(0, CodeplanNode.from_axis('base()'))
         if tom_node.children[-1].function != 'total()':
             tom_node.children.append(CodeplanNode.from_axis(f"sum '{total_label}' total()"))
-        tom_node._axis = None
         return tom_node.axis
 
     @property
@@ -338,22 +270,61 @@ class CodeplanNode:
 
     @property
     def children(self):
+        if self._children is None:
+            self._children = CodeplanNodeList(owner=self)
         return self._children
 
+    def iter_children(self):
+        # deep first traversal of all descendants (preorder)
+        stack = self._children[::-1] if self._children else []
+        while stack:
+            current = stack.pop()
+            yield current
+            if current._children:
+                stack.extend(current._children[::-1])
+
     @property
     def flat_children(self):
-        if self._flat_children == None:
-            # deep first traversal
-            self._flat_children = []
-            stack = [*self.children]
-            while stack:
-                current = stack[0]
-                stack = stack[1:]
-                self._flat_children.append(current)
-                for child in reversed(current.children):
-                    stack.insert(0, child)
+        if self._flat_children is None:
+            self._flat_children = list(self.iter_children())
         return self._flat_children
 
+    @property
+    def index(self):
+
+        # index of all descendants by name and by function,
+        # nodes are listed in deep first order
+        if self._index is None:
+            by_name = defaultdict(list)
+            by_function = defaultdict(list)
+            for node in self.flat_children:
+                by_name[node.name].append(node)
+                by_function[node.function].append(node)
+            self._index = NodeIndex(dict(by_name), dict(by_function))
+        return self._index
+
+    def find(self, name):
+        nodes = self.index.by_name.get(name)
+        return nodes[0] if nodes else None
+
+    def find_all(self, *, name=None, function=None):
+        if name is not None:
+            nodes = self.index.by_name.get(name, [])
+            return [n for n in nodes if n.function == function] if function is not None else list(nodes)
+        if function is not None:
+            return list(self.index.by_function.get(function, []))
+        return list(self.flat_children)
+
+    def _invalidate(self):
+        # resets cached values of the node and its ancestors
+        # after the tree below them was changed
+        node = self
+        while node is not None:
+            node._axis = None
+            node._flat_children = None
+            node._index = None
+            node = node._parent
+
     @property
     def indented_children(self):
         return [f'{"    "*(node.level - 1)}{node.name} - {node.label}' for node in self.flat_children]
@@ -399,8 +370,110 @@ class CodeplanNode:
     def __repr__(self):
         return f'CodeplanNode({self.name} - {self.label})'
 
+class _AxisParser:
+
+    # single pass recursive descent parser for axis expressions
+    # tokenizer splits axis in labels, properties, brackets, commas and text
+    # nodes are parsed from tokens, children are parsed recursively
+    # when opening curly bracket is found
+
+    TOKENS = re.compile(r"""
+        (?P<label>'(?:[^']|'')*'?)
+        |(?P<properties>\[[^\]]*\]?)
+        |(?P<open_children>\{)
+        |(?P<close_children>\})
+        |(?P<open_arguments>\()
+        |(?P<close_arguments>\))
+        |(?P<comma>,)
+        |(?P<text>[^'\[{}(),]+)
+    """, re.VERBOSE)
+
+    def __init__(self, axis):
+        self.axis = axis
+        self.tokens = [(m.lastgroup, m.start(), m.end()) for m in self.TOKENS.finditer(axis)]
+        self.position = 0
+
+    def parse(self, parent=None, level=0):
+        root = self._parse_node(0, parent, level, in_children=False)
+        root._axis = self.axis
+        return root
+
+    def _current_start(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return len(self.axis)
+
+    def _parse_node(self, start, parent, level, *, in_children):
+
+        node = CodeplanNode(parent=parent, level=level)
+        label_parts = []
+        body_parts = []
+        arguments_level = 0
+
+        while self.position < len(self.tokens):
+            kind, token_start, token_end = self.tokens[self.position]
+            # commas and closing curly bracket end node
+            # if it's not inside function arguments
+            if in_children and not arguments_level and kind in ('comma', 'close_children'):
+                break
+            self.position += 1
+            if kind == 'open_children':
+                node._children = CodeplanNodeList((node._children or []) + self._parse_children(node), node)
+            elif kind == 'label' and not arguments_level:
+                label_parts.append(self.axis[token_start:token_end])
+            else:
+                if kind == 'open_arguments':
+                    arguments_level += 1
+                elif kind == 'close_arguments' and arguments_level:
+                    arguments_level -= 1
+                body_parts.append(self.axis[token_start:token_end])
+
+        node._axis = self.axis[start:self._current_start()].strip()
+
+        # sets name, label, function and properties
+        label = ''.join(label_parts)
+        node._label = label[1:-1].replace("''", "'").strip()
+        body_without_label = ''.join(body_parts).strip()
+        start_properties = body_without_label.find('[')
+        if start_properties >= 0:
+            node._properties = body_without_label[start_properties:]
+            body_without_label = body_without_label[:start_properties].strip()
+        else:
+            node._properties = ''
+
+        split_body = body_without_label.split(maxsplit=1)
+
+        if len(split_body) == 1 and '(' not in body_without_label: # single code
+            node._name = body_without_label
+        elif len(split_body) == 1 and '(' in body_without_label: # single function
+            node._function = body_without_label
+        elif len(split_body) == 2: # function
+            node._name = split_body[0].strip()
+            node._function = split_body[1].strip()
+
+        return node
+
+    def _parse_children(self, parent):
+
+        # parses comma separated list of nodes until closing curly bracket
+        children = []
+        start = self._current_start()
+        while True:
+            children.append(self._parse_node(start, parent, parent.level + 1, in_children=True))
+            if self.position >= len(self.tokens):
+                break
+            kind, _, token_end = self.tokens[self.position]
+            self.position += 1
+            if kind == 'close_children':
+                break
+            start = token_end
+
+        return children
+
 class CodeplanElement:
 
+    __slots__ = ('code', 'label', 'double')
+
     def __init__(self, code, label, double=False):
         self.code = code
         self.label = label
@@ -419,16 +492,22 @@ class CodeplanElement:
 #
 ############################################################################
 
+MDDField = namedtuple('MDDField', 'name variables types')
+
 class MDDFile:
 
     def __init__(self, mdd_path, *, parser='xml'):
 
         self.path = mdd_path
         self.parser = parser
+        self._types = IndexedList(key='name')
+        self.variables = []
 
         # reads meta data from mdd
         if parser == 'xml':
             self.types, self.variables = self._read_mdd_from_xml() 
+        elif parser == 'stream':
+            self.types, self.variables = self._read_mdd_from_stream()
         elif parser == 'com':
            self.types, self.variables = self._read_mdd_from_com() 
  
@@ -438,38 +517,37 @@ class MDDFile:
         # parser, which uses MDM.Document COM Object
         # to access types and variables
 
+        from win32com import client
+
         # opens mdd
         mdd = client.Dispatch('MDM.Document')
         mdd.Open(self.path, mode=openConstants.oREAD)
 
+        # fills variables and axis expression per type in one pass over fields
+        variables = []
+        axis_per_type = {}
+        for f in mdd.Fields:
+            if f.ObjectTypeValue == ObjectTypesConstants.mtVariable:
+                variable = MDDVariable(
+                    name=f.Name,
+                    label=f.Label,
+                    type_name=f.Elements.Reference.Name,
+                    axis=f.AxisExpression
+                )
+                variables.append(variable)
+                axis_per_type.setdefault(variable.type_name, variable.axis)
+
         # fills types
         types = [
-            MDDCodeplan(
+            self._create_mdd_codeplan(
                 name=t.Name,
                 elements=[
                     CodeplanElement(code=e.Name, label=e.label)
                     for e in t.Elements
                 ],
-                axis={f.AxisExpression
-                    for f in mdd.Fields
-                    if f.ObjectTypeValue == ObjectTypesConstants.mtVariable
-                        and f.Elements.Reference.Name == t.Name
-                }.pop(),
-                mdd_file=self
+                axis_per_type=axis_per_type
             ) for t in mdd.Types]
 
-        # fills variables
-        variables = [
-            MDDVariable(
-                name=f.Name,
-                label=f.Label,
-                type_name=f.Elements.Reference.Name,
-                axis=f.AxisExpression
-            )
-            for f in mdd.Fields
-            if f.ObjectTypeValue == ObjectTypesConstants.mtVariable
-        ]
-
         # closes mdd
         mdd.Close()
 
@@ -481,8 +559,9 @@ class MDDFile:
         # parser, which uses XML from MDD file
         # to access types and variables
 
-        types = []
         variables = []
+        axis_per_type = {}
+        type_nodes = []
         
         # root node for variables and types is xml\mdm:metadata\definition
         tree = ElementTree.parse(self.path)
@@ -491,86 +570,290 @@ class MDDFile:
         # root node contains elements of 2 types:
         # 'variable' for variables
         # 'categories' for types
+        # types are read after all variables, so axis expressions
+        # are known regardless of the order of nodes
         for node in root:
-            # parsing logic for variables
             if node.tag == 'variable':
-                name = node.get('name')
-                var_type = int(node.get('type'))
-                # labels element may contain multiple labels 
-                # for different label types, contexts and languages (LCL)
-                # parser just uses 1st label it encounters
-                label = node.find('labels')[0].text
-                ref_name = node.find('categories').get('ref_name')
-                axis = node.find('axis').get('expression')
-                if var_type == DataTypeConstants.mtCategorical and ref_name:
-                    variables.append(MDDVariable(name, label, ref_name, axis))
-            # parsing logic for types
+                variable = self._read_variable_node(node)
+                if variable:
+                    variables.append(variable)
+                    axis_per_type.setdefault(variable.type_name, variable.axis)
             elif node.tag == 'categories':
-                name = node.get('name')
-                elements = [
-                    CodeplanElement(
-                        code=element.get('name'),
-                        label=element.find('labels')[0].text
-                    )
-                    for element in node
-                    if element.tag == 'category'
-                ]
-                # sets axis expression for type based on the 1st variable
-                # which belongs to this type
-                # assumes variables collection is completely populated
-                axis = {v.axis for v in variables if v.type_name == name}.pop()
-                types.append(MDDCodeplan(name, elements, axis, self))
+                type_nodes.append(node)
 
-        return types, variables
+        types = [self._read_categories_node(node, axis_per_type) for node in type_nodes]
 
-    @property
-    def variable_map(self):
+        return types, variables
 
-        # populates field list from variable list in 3 stages:
-        # - saves list of variables per field
-        # - saves list of types per field
-        # - merges both results in fields list
+    def _read_mdd_from_stream(self):
 
-        variables_per_field = defaultdict(list)
-        for v in self.variables:
-            variables_per_field[v.field_name].append(v)
+        types = []
+        variables = []
+        for item in self._iter_mdd_from_stream():
+            if isinstance(item, MDDVariable):
+                variables.append(item)
+            else:
+                types.append(item)
+        return types, variables
 
-        types_per_field = defaultdict(set)
-        for v in self.variables:
-            types_per_field[v.field_name].add(v.type_name)
-
-        Field = namedtuple('Field', 'name variables types')
-        fields = [
-            Field(
-                name=k,
-                variables=v,
-                types=types_per_field[k]
+    def _iter_mdd_from_stream(self):
+
+        # parser, which reads XML from MDD file incrementally
+        # and yields variables and types as soon as their node is complete.
+        # axis of a type is set by the 1st variable, which uses it:
+        # types read before their variables are only weakly referenced
+        # until their variable is read, axes of variables read before
+        # their types are kept until the type is read. types, which have
+        # no variable when definition is complete, get an error.
+        # completed nodes are removed from the tree, so memory usage
+        # doesn't depend on the size of the MDD file
+
+        axis_per_type = {}
+        types_without_axis = WeakValueDictionary()
+        read_type_names = set()
+
+        # path contains all open nodes: xml, mdm:metadata, definition, variable, ...
+        path = []
+        for event, node in ElementTree.iterparse(self.path, events=('start', 'end')):
+            if event == 'start':
+                path.append(node)
+                continue
+            path.pop()
+            in_definition = len(path) > 2 and path[2].tag == 'definition'
+
+            if in_definition and len(path) == 3:
+                if node.tag == 'variable':
+                    variable = self._read_variable_node(node)
+                    if variable:
+                        if variable.type_name in read_type_names:
+                            mdd_codeplan = types_without_axis.pop(variable.type_name, None)
+                            if mdd_codeplan is not None:
+                                mdd_codeplan.axis = variable.axis
+                        else:
+                            axis_per_type.setdefault(variable.type_name, variable.axis)
+                        yield variable
+                elif node.tag == 'categories':
+                    name = node.get('name')
+                    read_type_names.add(name)
+                    mdd_codeplan = MDDCodeplan(name, self._read_category_elements(node), axis_per_type.pop(name, None), self)
+                    if mdd_codeplan.axis is None:
+                        types_without_axis[name] = mdd_codeplan
+                    yield mdd_codeplan
+            elif node.tag == 'definition' and len(path) == 2:
+                for mdd_codeplan in list(types_without_axis.values()):
+                    self._add_missing_axis_error(mdd_codeplan)
+
+            # nodes inside variables and types are kept until their parent is read,
+            # all other nodes are dropped right after they are completed
+            if len(path) > 1 and not (in_definition and len(path) > 3):
+                path[-1].remove(node)
+
+    def _read_variable_node(self, node):
+
+        # returns categorical variable, which uses shared list
+        # or None for all other variables
+        if int(node.get('type')) != DataTypeConstants.mtCategorical:
+            return None
+        categories = node.find('categories')
+        ref_name = categories.get('ref_name') if categories is not None else None
+        if not ref_name:
+            return None
+        # labels element may contain multiple labels 
+        # for different label types, contexts and languages (LCL)
+        # parser just uses 1st label it encounters
+        label = node.find('labels')[0].text
+        axis = node.find('axis').get('expression')
+        return MDDVariable(node.get('name'), label, ref_name, axis)
+
+    def _read_categories_node(self, node, axis_per_type):
+        return self._create_mdd_codeplan(node.get('name'), self._read_category_elements(node), axis_per_type)
+
+    def _read_category_elements(self, node):
+        return [
+            CodeplanElement(
+                code=element.get('name'),
+                label=element.find('labels')[0].text
             )
-            for k, v in variables_per_field.items()
+            for element in node
+            if element.tag == 'category'
         ]
 
+    def _create_mdd_codeplan(self, name, elements, axis_per_type):
+
+        # sets axis expression for type based on the 1st variable
+        # which belongs to this type.
+        # types without variables get an error instead of an axis
+        axis = axis_per_type.get(name)
+        mdd_codeplan = MDDCodeplan(name, elements, axis, self)
+        if axis is None:
+            self._add_missing_axis_error(mdd_codeplan)
+        return mdd_codeplan
+
+    @staticmethod
+    def _add_missing_axis_error(mdd_codeplan):
+        mdd_codeplan.errors.append(f'No variable uses type "{mdd_codeplan.name}", axis expression is unknown')
+
+    @property
+    def types(self):
+        return self._types
+
+    @types.setter
+    def types(self, value):
+        self._types = IndexedList(value, key='name')
+
+    @property
+    def variables(self):
+        return self._variables
+
+    @variables.setter
+    def variables(self, value):
+        self._variables = MDDVariableList(value, self)
+        self._invalidate_fields()
+
+    def _invalidate_fields(self):
+        self._fields = None
+        self._variable_map = None
+
+    @property
+    def fields(self):
+
+        # fields with their variables and types, variables of all
+        # iterations of a loop belong to the same field.
+        # computed once, until variables are changed
+
+        if self._fields is None:
+            variables_per_field = defaultdict(list)
+            types_per_field = defaultdict(set)
+            for v in self.variables:
+                variables_per_field[v.field_name].append(v)
+                types_per_field[v.field_name].add(v.type_name)
+            self._fields = IndexedList((
+                MDDField(
+                    name=k,
+                    variables=v,
+                    types=types_per_field[k]
+                )
+                for k, v in variables_per_field.items()
+            ), key='name')
+        return self._fields
+
+    def field(self, name):
+        return self.fields.get(name)
+
+    @property
+    def variable_map(self):
+
         # checks if there are variables, which belong to the same field
         # but use different types.
-        # creates variable map, for renaming such variables in cfile
-
-        return {
-            f'{v.label}{HELPER_FIELD}': v.compliant_name
-                for f in fields
-                for v in f.variables
-                if len(f.types) > 1
-        }
+        # creates variable map, for renaming such variables in cfile.
+        # computed once, until variables are changed
+
+        if self._variable_map is None:
+            self._variable_map = {
+                f'{v.label}{HELPER_FIELD}': v.compliant_name
+                    for f in self.fields
+                    for v in f.variables
+                    if len(f.types) > 1
+            }
+        return self._variable_map
 
     def save_variable_map(self, path):
         with open(path, mode='w', encoding='utf-8') as f:
             for vm in self.variable_map.items():
                 f.write(','.join(vm) + '\n')
 
-    def save_as(self, path):
+    def save_as(self, path, *, writer='xml'):
+
+        # writer 'xml' writes mdd xml directly, 'com' uses MDM.Document
 
         self.path = path
+        if writer == 'xml':
+            self._write_mdd_to_xml(path)
+        elif writer == 'com':
+            self._write_mdd_to_com(path)
+        else:
+            raise ValueError(f'Unknown writer "{writer}"')
+
+    def _write_mdd_to_xml(self, path):
+
+        # streams definition with categorical variables, which use shared
+        # lists, and the lists, design with references to both and
+        # category map with values assigned in order of first appearance
+        # as by CategoryMap.AutoAssignValues. ids are derived from names,
+        # so saving the same file twice gives identical output
+
+        def node_id(*names):
+            return str(uuid5(NAMESPACE_OID, '/'.join(names)))
+
+        def labels(text):
+            out.startElement('labels', {'context': 'LABEL'})
+            out.startElement('text', {'context': 'QUESTION', 'xml:lang': 'en-US'})
+            out.characters(text or '')
+            out.endElement('text')
+            out.endElement('labels')
+
+        with open(path, mode='w', encoding='utf-8') as f:
+            out = XMLGenerator(f, encoding='utf-8', short_empty_elements=True)
+            out.startDocument()
+            out.startElement('xml', {})
+            out.startElement('mdm:metadata', {'xmlns:mdm': MDM_NAMESPACE})
+            out.startElement('definition', {})
+
+            for v in self.variables:
+                out.startElement('variable', {
+                    'id': node_id('variable', v.name), 'name': v.name,
+                    'type': str(int(DataTypeConstants.mtCategorical))})
+                labels(v.label)
+                out.startElement('categories', {'global-name-space': '-1', 'ref_name': v.type_name})
+                out.endElement('categories')
+                axis = self[v.type_name].axis
+                if axis is not None:
+                    out.startElement('axis', {'expression': axis})
+                    out.endElement('axis')
+                out.endElement('variable')
+
+            category_values = {}
+            for t in self.types:
+                out.startElement('categories', {
+                    'id': node_id('type', t.name), 'name': t.name, 'global-name-space': '-1'})
+                for e in t.elements:
+                    out.startElement('category', {'id': node_id('type', t.name, e.code), 'name': e.code})
+                    labels(e.label)
+                    out.endElement('category')
+                    category_values.setdefault(e.code.upper(), (e.code, len(category_values) + 1))
+                out.endElement('categories')
+
+            out.endElement('definition')
+            out.startElement('design', {})
+            out.startElement('fields', {'name': '@fields'})
+            for v in self.variables:
+                out.startElement('variable', {
+                    'id': node_id('field', v.name), 'name': v.name, 'ref': node_id('variable', v.name)})
+                out.endElement('variable')
+            out.endElement('fields')
+            out.startElement('types', {'name': '@types'})
+            for t in self.types:
+                out.startElement('categories', {
+                    'id': node_id('types', t.name), 'name': t.name, 'ref': node_id('type', t.name)})
+                out.endElement('categories')
+            out.endElement('types')
+            out.endElement('design')
+
+            out.startElement('categorymap', {})
+            for name, value in category_values.values():
+                out.startElement('categoryid', {'name': name, 'value': str(value)})
+                out.endElement('categoryid')
+            out.endElement('categorymap')
+
+            out.endElement('mdm:metadata')
+            out.endElement('xml')
+            out.endDocument()
+
+    def _write_mdd_to_com(self, path):
         
         # saves types and elements lists in mdd file
         
+        from win32com import client
         mdd = client.Dispatch('MDM.Document')
         mdd.IncludeSystemVariables = False
         for t in self.types:
@@ -594,12 +877,15 @@ class MDDFile:
 
     def __getitem__(self, value):
         if isinstance(value, str):
-            return [t for t in self.types if t.name == value][0]
+            mdd_codeplan = self.types.get(value)
+            if mdd_codeplan is None:
+                raise IndexError(f'Type "{value}" not found in {self}')
+            return mdd_codeplan
         else:
             return self.types[value]        
 
     def __contains__(self, value):
-        return bool([t for t in self.types if t.name == value])
+        return self.types.contains_key(value)
 
 
     def __repr__(self):
@@ -616,6 +902,14 @@ class MDDCodeplan:
         self._tree = None
         self._is_valid = None
 
+    @property
+    def elements(self):
+        return self._elements
+
+    @elements.setter
+    def elements(self, value):
+        self._elements = CodeplanElements(value)
+
     @property
     def errors(self):
         if self._errors is None:
@@ -625,7 +919,7 @@ class MDDCodeplan:
     @property
     def tree(self):
         if self._tree is None:
-            self._tree = CodeplanNode.from_axis(self.axis)
+            self._tree = CodeplanNode() if self.axis is None else CodeplanNode.from_axis(self.axis)
         return self._tree
     
     @tree.setter
@@ -640,15 +934,15 @@ class MDDCodeplan:
 
     @property
     def net_elements(self):
-        return [n for n in self.tree.flat_children if n.function == 'net()']
+        return self.tree.find_all(function='net()')
 
     @property
     def variables(self):
         return [v for v in self.mdd_file.variables if v.type_name == self.name]
 
     def print_tree(self):
-        for node in self.tree.flat_children:
-            print(f'{"    " * (node.level - 1)}{node.code} - {node.label}')
+        for line in self.tree.indented_children:
+            print(line)
 
     def print_summary(self):
         error_string = '\n'.join(self.errors) if self.errors else '(not found)'
@@ -659,7 +953,10 @@ class MDDCodeplan:
 
     def __getitem__(self, i):
         if isinstance(i, str):
-            return [e for e in self.elements if e.code == i][0]
+            element = self.elements.get(i)
+            if element is None:
+                raise IndexError(f'Element "{i}" not found in {self.name}')
+            return element
         else:
             return self.elements[i]
 
@@ -668,6 +965,9 @@ class MDDCodeplan:
 
 class MDDVariable:
 
+    __slots__ = ('name', 'label', 'type_name', 'axis',
+        '_field_name', '_iterations', '_compliant_name')
+
     def __init__(self, name, label, type_name, axis):
         self.name = name
         self.label = label
@@ -682,31 +982,47 @@ class MDDVariable:
     def field_name(self):
         '''f4l[{axa}].f4 -> f4l.f4'''
         if self._field_name is None:
-            self._field_name = '.'.join(part.split(
-                '[')[0] for part in self.label.split('.'))
+            self._parse_label()
         return self._field_name
 
     @property
     def iterations(self):
         '''q7loop[{_12}].q7[_5].slice -> [_12, _5]'''
         if self._iterations is None:
-            self._iterations = [part.split(
-                '[')[1][1:-2] for part in self.label.split('.') if len(part.split('[')) > 1]
+            self._parse_label()
         return self._iterations
 
     @property
     def compliant_name(self):
         '''f4l[{axa}].f4 -> f4l_f4_axa_o_c'''
         if self._compliant_name is None:
-            prefix = '_'.join(self.field_name.split('.'))
-            suffix = '_'.join(self.iterations) + '_o_c'
-            self._compliant_name = f'{prefix}_{suffix}'
+            self._parse_label()
         return self._compliant_name
 
+    def _parse_label(self):
+        self._field_name, self._iterations, self._compliant_name = parse_variable_label(self.label)
+
     def __repr__(self):
         return f"MDDVariable(name='{self.name}'), label='{self.label}', type_name='{self.type_name}'"
 
 
+# index of loop iteration in variable label: [{axa}] or [_5]
+VARIABLE_ITERATION = re.compile(r'\[\{?([^{}\[\]]*)\}?\]')
+
+def parse_variable_label(label):
+
+    # returns field name, iterations and compliant name of label in one scan:
+    # q7loop[{_12}].q7[_5].slice -> q7loop.q7.slice, [_12, _5], q7loop_q7_slice__12__5_o_c
+    # field names and iterations are interned, as they repeat
+    # for all variables of a loop
+
+    parts = VARIABLE_ITERATION.split(label)
+    field_name = intern(''.join(parts[0::2]))
+    iterations = [intern(i) for i in parts[1::2]]
+    compliant_name = f"{field_name.replace('.', '_')}_{'_'.join(iterations)}_o_c"
+    return field_name, iterations, compliant_name
+
+
 ############################################################################
 #
 #                               EXCEL CODEPLAN
@@ -715,35 +1031,61 @@ class MDDVariable:
 
 class XLFile:
 
-    def __init__(self, path, *, code_column=1):
-        
+    def __init__(self, path, *, code_column=1, sheets=None):
+
+        # reads code and label columns of all sheets or only
+        # of sheets named in sheets, e.g. xl_names of an adapter.
+        # names in sheets, which aren't in the workbook, are ignored
+
         self.path = path
         self.code_column = code_column
         workbook = load_workbook(self.path, read_only=True, data_only=True)
-        self.codeplans = [
+        if sheets is not None:
+            sheets = set(sheets)
+        self.codeplans = IndexedList((
             XLCodeplan(
                 name=sheet.title,
-                rows = [
-                    XLCodeplanRow(
-                        code=row[self.code_column - 1].value,
-                        label=row[self.code_column].value,
-                        index=index
-                    )
-                    for index, row in enumerate(sheet, start=1)],
+                rows=self._read_rows(sheet),
                 xl_file = self)
             for sheet in workbook
-        ]
+            if sheets is None or sheet.title in sheets
+        ), key='name')
         self.category_map = []
         workbook.close()
 
+    def _read_rows(self, sheet):
+
+        # reads cell values only and classifies all codes of the sheet
+        # before rows are created. rows before the first and after
+        # the last valid row aren't created at all
+
+        values = list(sheet.iter_rows(
+            min_col=self.code_column, max_col=self.code_column + 1, values_only=True))
+        codes = [str(code).strip() if code is not None else '' for code, *_ in values]
+        classified_codes = classify_xl_codes(codes)
+        valid_positions = [i for i, (row_type, _) in enumerate(classified_codes) if row_type]
+        if not valid_positions:
+            return []
+        rows = []
+        for i in range(valid_positions[0], valid_positions[-1] + 1):
+            label = values[i][1] if len(values[i]) > 1 else None
+            row_type, combine_codes = classified_codes[i]
+            rows.append(XLCodeplanRow(
+                code=codes[i], label=label, index=i + 1,
+                row_type=row_type, combine_codes=combine_codes))
+        return rows
+
     def __getitem__(self, value):
         if isinstance(value, str):
-            return [t for t in self.codeplans if t.name == value][0]
+            xl_codeplan = self.codeplans.get(value)
+            if xl_codeplan is None:
+                raise IndexError(f'Codeplan "{value}" not found in {self}')
+            return xl_codeplan
         else:
             return self.codeplans[value]        
 
     def __contains__(self, value):
-        return bool([t for t in self.codeplans if t.name == value])
+        return self.codeplans.contains_key(value)
 
     def __repr__(self):
         return f'XLFile(path="{self.path}")'
@@ -761,19 +1103,10 @@ class XLCodeplan:
         self._is_valid = None
 
     def _trim_rows(self, rows):
-        first_valid_row = last_valid_row = 0
-        for row in rows:
-            if row.is_valid:
-                first_valid_row = row.index
-                break
-        if not first_valid_row:
+        valid_positions = [i for i, row in enumerate(rows) if row.is_valid]
+        if not valid_positions:
             return []
-        for row in reversed(rows):
-            if row.is_valid:
-                last_valid_row = row.index
-                break
-        return rows[first_valid_row - 1:last_valid_row]
-
+        return rows[valid_positions[0]:valid_positions[-1] + 1]
 
     @property
     def elements(self):
@@ -785,16 +1118,15 @@ class XLCodeplan:
                 elif row.row_type == XLCodeplanRowTypes.Combine:
                     for c in row.combine_codes:
                         elements_with_label_list[c].append('')
-            self._elements = []
-            for code, labels in elements_with_label_list.items():
-                self._elements.append(
-                    CodeplanElement(
-                        code=f'{CODE_PREFIX}{code}',
-                        label=max(labels),
-                        double=True if len(labels) > 1 else False
-                    )
+            # elements are sorted by code once, when they are built
+            self._elements = CodeplanElements(sorted((
+                CodeplanElement(
+                    code=f'{CODE_PREFIX}{code}',
+                    label=max(labels),
+                    double=True if len(labels) > 1 else False
                 )
-        self._elements.sort()
+                for code, labels in elements_with_label_list.items()),
+                key=lambda e: sort_element(e.code)))
         return self._elements
 
     @property
@@ -865,22 +1197,18 @@ class XLCodeplan:
 
     @property
     def double_elements(self):
-        seen = set()
-        duplicates = set()
-        for node in self.tree.flat_children:
-            if node.code not in seen:
-                seen.add(node.code)
-            else:
-                duplicates.add(node.code)
-        return sorted(duplicates, key=lambda x: int(x[len(CODE_PREFIX):]))
+        duplicates = [
+            name for name, nodes in self.tree.index.by_name.items()
+            if name.startswith(CODE_PREFIX) and len(nodes) > 1]
+        return sorted(duplicates, key=sort_element)
 
     @property
     def net_elements(self):
-        return [n for n in self.tree.flat_children if n.node_type == CodeplanNodeTypes.Net]
+        return self.tree.find_all(function='net()')
 
     @property
     def combine_elements(self):
-        return [n for n in self.tree.flat_children if n.node_type == CodeplanNodeTypes.Combine]
+        return self.tree.find_all(function='combine()')
 
     def print_summary(self):
         error_string = '\n'.join(self.errors) if self.errors else '(not found)'
@@ -894,7 +1222,10 @@ class XLCodeplan:
 
     def __getitem__(self, i):
         if isinstance(i, str):
-            return [e for e in self.elements if e.code == i][0]
+            element = self.elements.get(i)
+            if element is None:
+                raise IndexError(f'Element "{i}" not found in {self.name}')
+            return element
         else:
             return self.elements[i]
 
@@ -903,47 +1234,29 @@ class XLCodeplan:
 
 class XLCodeplanRow:
 
-    def __init__(self, code, label, index):
+    __slots__ = ('code', 'label', 'index', '_row_type', '_combine_codes', '_is_valid')
+
+    def __init__(self, code, label, index, *, row_type=None, combine_codes=None):
         self.code = str(code).strip() if code is not None else ''
         self.label = str(label).strip() if label is not None else ''
         self.index = index
 
-        self._row_type = None
-        self._combine_codes = None
+        # row_type and combine_codes are classified lazily,
+        # unless they are passed by a loader, see classify_xl_codes
+        self._row_type = row_type
+        self._combine_codes = combine_codes
         self._is_valid = None
 
     @property
     def row_type(self):
         if self._row_type is None:
-            # regular/numeric rows
-            if self.code.isdigit():
-                self._row_type = XLCodeplanRowTypes.Regular
-            # start (*) and end tags (#) for net()
-            elif self.code and self.code in '*******':
-                self._row_type = XLCodeplanRowTypes.NetStart
-            elif self.code and self.code in '#######':
-                self._row_type = XLCodeplanRowTypes.NetEnd
-            # floats (23.35) for combine()
-            elif '.' in self.code and self.code.replace('.', '', 1).isdigit():
-                self._row_type = XLCodeplanRowTypes.Combine
-            # "142, 43, 5" pattern for combine()
-            elif ',' in self.code and len(self.code.split(',')) == len(
-                    [c.strip() for c in self.code.split(',') if c.strip().isdigit()]):
-                self._row_type = XLCodeplanRowTypes.Combine
-            else:
-                self._row_type = XLCodeplanRowTypes.Invalid
+            self._row_type, self._combine_codes = classify_xl_code(self.code)
         return self._row_type
 
     @property
     def combine_codes(self):
         if self._combine_codes is None:
-            if self.row_type != XLCodeplanRowTypes.Combine:
-                self._combine_codes = []
-            elif '.' in self.code and self.code.replace('.', '', 1).isdigit():
-                self._combine_codes = self.code.split('.')
-            elif ',' in self.code:
-                self._combine_codes = [
-                    c.strip() for c in self.code.split(',') if c.strip().isdigit()]
+            self._row_type, self._combine_codes = classify_xl_code(self.code)
         return self._combine_codes
 
     @property
@@ -955,6 +1268,39 @@ class XLCodeplanRow:
     def __repr__(self):
         return f"XLCodeplanRow(code='{self.code}', label='{self.label}', index={self.index})"
 
+# start (*) and end tags (#) for net(), up to 7 levels
+XL_NET_START = re.compile(r'\*{1,7}')
+XL_NET_END = re.compile(r'#{1,7}')
+# floats (23.35) and "142, 43, 5" patterns for combine()
+XL_FLOAT_COMBINE = re.compile(r'(?=.*\d)\d*\.\d*')
+XL_LIST_COMBINE = re.compile(r'\s*\d+\s*(?:,\s*\d+\s*)+')
+
+def classify_xl_code(code):
+
+    # returns row type and combine codes of stripped code
+
+    # regular/numeric rows
+    if code.isdigit():
+        return XLCodeplanRowTypes.Regular, []
+    if XL_NET_START.fullmatch(code):
+        return XLCodeplanRowTypes.NetStart, []
+    if XL_NET_END.fullmatch(code):
+        return XLCodeplanRowTypes.NetEnd, []
+    if XL_FLOAT_COMBINE.fullmatch(code):
+        return XLCodeplanRowTypes.Combine, code.split('.')
+    if XL_LIST_COMBINE.fullmatch(code):
+        return XLCodeplanRowTypes.Combine, [c.strip() for c in code.split(',')]
+    return XLCodeplanRowTypes.Invalid, []
+
+def classify_xl_codes(codes):
+
+    # classifies codes of a whole sheet, each distinct code once
+    classified_codes = {}
+    for code in codes:
+        if code not in classified_codes:
+            classified_codes[code] = classify_xl_code(code)
+    return [classified_codes[code] for code in codes]
+
 
 ############################################################################
 #
@@ -976,10 +1322,12 @@ class MDDXLFileMerger:
 
         if verbose:
             print('Initializing MDDXLFileMerger...')
-            mdd_codeplans_missing_in_map = {t.name for t in self.mdd_file.types if t.name not in {m.mdd_name for m in self.mdd_xl_map}}
+            mdd_names = {m.mdd_name for m in self.mdd_xl_map}
+            mdd_codeplans_missing_in_map = {t.name for t in self.mdd_file.types if t.name not in mdd_names}
             print('MDD types missing in the map:')
             print(','.join(mdd_codeplans_missing_in_map))
-            xl_codeplans_missing_in_map = {cp.name for cp in self.xl_file.codeplans if cp.name not in {m.xl_name for m in self.mdd_xl_map}}
+            xl_names = {m.xl_name for m in self.mdd_xl_map}
+            xl_codeplans_missing_in_map = {cp.name for cp in self.xl_file.codeplans if cp.name not in xl_names}
             print('XL types missing in the map:')
             print(','.join(xl_codeplans_missing_in_map))
 
@@ -992,12 +1340,25 @@ class MDDXLFileMerger:
                     CodeplanMerger(mdd_codeplan, xl_codeplan, self)
                 )
         self.category_map = []
+        self.errors = []
 
     def merge_all(self):
-        adjusted_types = []
+
+        # codeplans, which can't be merged, don't stop the others,
+        # they are listed in errors and raised after all others are merged
+
+        self.errors = []
         for m in self.codeplan_mergers:
-            adjusted_types.append(m.merge())
+            try:
+                m.merge()
+            except Exception as e:
+                self.errors.append(
+                    f'Codeplan "{m.mdd_codeplan.name}" not merged with "{m.xl_codeplan.name}": {e}\n{m.report}')
+                continue
             self.category_map.extend(m.category_map)
+
+        if self.errors:
+            raise ValueError(f'{len(self.errors)} codeplan(s) not merged:\n' + '\n'.join(self.errors))
         return self.mdd_file
 
     def save_category_map(self, path):
@@ -1005,6 +1366,35 @@ class MDDXLFileMerger:
             for cm in self.category_map:
                 f.write(','.join(cm) + '\n')
 
+    @property
+    def report(self):
+        reports = ((m, m.report) for m in self.codeplan_mergers)
+        return ''.join(
+            f'{m.mdd_codeplan.name} / {m.xl_codeplan.name}:\n{report}'
+            for m, report in reports if report)
+
+    def report_json(self):
+        return json.dumps([r for m in self.codeplan_mergers for r in m.report_records], indent=2, ensure_ascii=False)
+
+    def save_report_json(self, path):
+        with open(path, mode='w', encoding='utf-8') as f:
+            f.write(self.report_json())
+
+    def save_report_xl(self, path):
+
+        # one row per error and diff record of all codeplans
+
+        columns = ['mdd_name', 'xl_name', 'kind', 'code', 'mdd_label', 'xl_label', 'error']
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Report')
+        sheet.append(columns)
+        for m in self.codeplan_mergers:
+            for r in m.report_records:
+                sheet.append([r[c] for c in columns])
+        workbook.save(path)
+
+MergeReportEntry = namedtuple('MergeReportEntry', 'kind name wave')
+
 class MDDFileMerger:
 
     # merging rules are as follows:
@@ -1014,29 +1404,52 @@ class MDDFileMerger:
     # - appends new varaibles from slave mdd
     # - uses axis expression from master for newly added variables
     #   if they use list, which existed in master
+    # slaves are merged in given order as if they were merged one
+    # by one, so types and variables of earlier slaves win
 
-    def __init__(self, master_mdd_file, slave_mdd_file):
+    def __init__(self, master_mdd_file, *slave_mdd_files):
 
-        # expects 2 MDDFile types parameters
+        # expects MDDFile types parameters, at least 1 slave
+        if not slave_mdd_files:
+            raise ValueError('MDDFileMerger needs at least 1 slave mdd file')
         self.master = master_mdd_file
-        self.slave = slave_mdd_file
-
-        
-        # types which missing in master
-        self.new_types = [t for t in self.slave.types
-            if t.name not in [mt.name for mt in self.master.types]
-        ]
-
-        # variables which missing in master
-        self.new_variables = [v for v in self.slave.variables
-            if v.name not in [mv.name for mv in self.master.variables]
-        ]
-
-        # adjusts axis expressions in new variables
-        for v in self.new_variables:
-            if v.type_name in [t.name for t in self.master.types]:
-                v.axis = self.master[v.type_name].axis
+        self.slaves = slave_mdd_files
+
+        # names are indexed once, types and variables of slaves are
+        # added to the index, when they are found to be new
+        types = {t.name: (t, 0) for t in self.master.types}
+        variable_names = {v.name for v in self.master.variables}
+
+        # entries of report as MergeReportEntry, kind is type, variable
+        # or axis, wave is the number of the slave starting with 1
+        self.entries = []
+        self.new_types = []
+        self.new_variables = []
+
+        for wave, slave in enumerate(self.slaves, start=1):
+
+            # types which missing in master
+            for t in slave.types:
+                if t.name not in types:
+                    types[t.name] = (t, wave)
+                    self.new_types.append(t)
+                    self.entries.append(MergeReportEntry('type', t.name, wave))
+
+            # variables which missing in master, their axis expressions
+            # are adjusted if list existed in master or earlier slaves
+            for v in slave.variables:
+                if v.name not in variable_names:
+                    variable_names.add(v.name)
+                    self.new_variables.append(v)
+                    self.entries.append(MergeReportEntry('variable', v.name, wave))
+                    master_type, type_wave = types.get(v.type_name, (None, wave))
+                    if type_wave < wave:
+                        v.axis = master_type.axis
+                        self.entries.append(MergeReportEntry('axis', v.name, wave))
 
+    @property
+    def slave(self):
+        return self.slaves[0]
 
     @property
     def report(self):
@@ -1059,11 +1472,42 @@ class MDDFileMerger:
 
     def merge(self):
 
-        # adjusts and returns master
+        # adjusts and returns master, appended types belong to master
         self.master.types.extend(self.new_types)
         self.master.variables.extend(self.new_variables)
+        for t in self.new_types:
+            t.mdd_file = self.master
         return self.master
 
+DiffRecord = namedtuple('DiffRecord', 'kind code mdd_label xl_label')
+
+def diff_elements(mdd_elements, xl_elements):
+
+    # compares CodeplanElements by code in one pass over code-keyed
+    # labels and returns DiffRecords sorted by code with kind
+    # - missing: xl element missing in mdd
+    # - extra: mdd element missing in xl
+    # - relabelled: element with different labels
+    # - doubled: xl element used more than once in excel codeplan
+
+    mdd_labels = mdd_elements.labels()
+    xl_labels = xl_elements.labels()
+
+    records = []
+    for code in sorted(mdd_labels.keys() | xl_labels.keys(), key=sort_element):
+        mdd_label = mdd_labels.get(code)
+        xl_label = xl_labels.get(code)
+        if code not in mdd_labels:
+            records.append(DiffRecord('missing', code, None, xl_label))
+        elif code not in xl_labels:
+            records.append(DiffRecord('extra', code, mdd_label, None))
+        elif mdd_label != xl_label:
+            records.append(DiffRecord('relabelled', code, mdd_label, xl_label))
+    records.extend(
+        DiffRecord('doubled', e.code, mdd_labels.get(e.code), e.label)
+        for e in sorted(xl_elements, key=lambda e: sort_element(e.code)) if e.double)
+    return records
+
 class CodeplanMerger:
 
     # merging rules are as follows:
@@ -1082,12 +1526,10 @@ class CodeplanMerger:
         self.file_merger = file_merger
         self.other_element = xl_codeplan.other_element
 
-        # comparing mdd and xl elements
-        self.xl_elements = {e.code for e in xl_codeplan.elements}
-        self.mdd_elements = {e.code for e in mdd_codeplan.elements}
-        self.missing_in_mdd = sorted(self.xl_elements - self.mdd_elements, key=sort_element)
-        self.missing_in_xl = sorted(self.mdd_elements - self.xl_elements, key=sort_element)
-        self.exist_in_both = sorted(self.mdd_elements & self.xl_elements, key=sort_element)
+        # comparing mdd and xl elements, see diff_elements
+        self.diff = diff_elements(mdd_codeplan.elements, xl_codeplan.elements)
+        self.missing_in_mdd = [r.code for r in self.diff if r.kind == 'missing']
+        self.missing_in_xl = [r.code for r in self.diff if r.kind == 'extra']
 
         # check if there are conditions which prohibit merging
         if self.mdd_codeplan.errors or xl_codeplan.errors:
@@ -1100,34 +1542,44 @@ class CodeplanMerger:
     @property
     def report(self):
 
-        report = ''
+        report = []
     
         # check for errors in mdd codeplan and xl codeplan
         mdd_errors = '\n'.join(self.mdd_codeplan.errors)
         xl_errors = '\n'.join(self.xl_codeplan.errors)
         if mdd_errors:
-            report += f'Errors in MDD Codeplan "{self.mdd_codeplan.name}": {mdd_errors}\n'
+            report.append(f'Errors in MDD Codeplan "{self.mdd_codeplan.name}": {mdd_errors}\n')
         if xl_errors:
-            report += f'Errors in XL Codeplan "{self.xl_codeplan.name}": {xl_errors}\n'
+            report.append(f'Errors in XL Codeplan "{self.xl_codeplan.name}": {xl_errors}\n')
 
         # check for errors in mdd codeplan and xl codeplan
         if self.missing_in_mdd:
-            report += f'XL elements missing in MDD: {",".join(self.missing_in_mdd)}\n'
+            report.append(f'XL elements missing in MDD: {",".join(self.missing_in_mdd)}\n')
         if self.missing_in_xl:
             if self.other_element:
-                report += f'MDD elements missing in Excel: {",".join(self.missing_in_xl)}\n'
+                report.append(f'MDD elements missing in Excel: {",".join(self.missing_in_xl)}\n')
             else:
-                report += f'"Other element" not set in excel codeplan {self.xl_codeplan.name}\n'
+                report.append(f'"Other element" not set in excel codeplan {self.xl_codeplan.name}\n')
 
         # checks for differences in labels
-        for e in self.exist_in_both:
-            mdd_element = self.mdd_codeplan[e]
-            xl_element = self.xl_codeplan[e]
-            if mdd_element.label != xl_element.label:
-                report += f'Label differences for {e}: "{mdd_element.label} (MDD)" -> "{xl_element.label}" (XL)\n'
+        for r in self.diff:
+            if r.kind == 'relabelled':
+                report.append(f'Label differences for {r.code}: "{r.mdd_label} (MDD)" -> "{r.xl_label}" (XL)\n')
 
         # returns report
-        return report
+        return ''.join(report)
+
+    @property
+    def report_records(self):
+
+        # errors and diff as dicts for json and excel reports
+        return [
+            *({'mdd_name': self.mdd_codeplan.name, 'xl_name': self.xl_codeplan.name,
+                'kind': 'error', 'code': None, 'mdd_label': None, 'xl_label': None, 'error': e}
+                for e in [*self.mdd_codeplan.errors, *self.xl_codeplan.errors]),
+            *({'mdd_name': self.mdd_codeplan.name, 'xl_name': self.xl_codeplan.name,
+                **r._asdict(), 'error': None}
+                for r in self.diff)]
 
     @property
     def category_map(self):
@@ -1178,48 +1630,571 @@ class CFileManager:
                 self.category_map[variable][old_code] = new_code
 
         self.cfile_source = cfile_source
-
-    def save_cfile(self, new_path):
-
-        updater = self._update_verbaco_line if self.cfile_source == CFileSources.Verbaco else self._update_ascribe_line
-        with open(self.cfile_path, mode='r', encoding='utf-8') as input_file, \
+        self._separator = '=' if cfile_source == CFileSources.Verbaco else ' = '
+        # rewritten assignments per (variable, codes), the same
+        # assignments are repeated for many respondents
+        self._assignments = {}
+
+    def save_cfile(self, new_path, *, coalesce=False, processes=1, chunk_size=2**24, strict=True):
+
+        # coalesce merges statements with identical criteria,
+        # see coalesce_statements.
+        # processes other than 1 rewrites chunks of chunk_size bytes
+        # in parallel, None uses all cores.
+        # statements, which can't be parsed, are written unchanged
+        # and listed in errors. strict raises ValueError for them
+        # after the complete file was written
+
+        self.invalid_lines = []
+        if processes != 1:
+            if coalesce:
+                raise ValueError('coalesce needs all statements and is not supported with processes')
+            self._save_cfile_in_parallel(new_path, processes or os.cpu_count(), chunk_size)
+        else:
+            with open(self.cfile_path, mode='r', encoding='utf-8') as input_file, \
+            open(new_path, mode='w', encoding='utf-8') as output_file:
+                output_lines = (
+                    self._update_line(input_line, line_number)
+                    for line_number, input_line in enumerate(input_file, start=1))
+                if coalesce:
+                    output_lines = coalesce_statements(output_lines)
+                for output_line in output_lines:
+                    output_file.write(output_line)
+
+        self.errors = [f'Invalid statement in line {n}: {line}' for n, line in self.invalid_lines]
+        if strict and self.errors:
+            raise ValueError(f'{len(self.errors)} invalid statement(s) in {self.cfile_path}:\n' + '\n'.join(self.errors))
+
+    def _save_cfile_in_parallel(self, new_path, processes, chunk_size):
+
+        # workers rewrite chunks, which end on line boundaries.
+        # results are written in order of chunks, at most 2 chunks
+        # per process are in progress or waiting to be written.
+        # line numbers of invalid lines are relative to their chunk
+        # and shifted by the lines of all previous chunks
+
+        lines_written = 0
+
+        def write(future):
+            nonlocal lines_written
+            output, invalid_lines, line_count = future.result()
+            output_file.write(output)
+            self.invalid_lines.extend((lines_written + n, line) for n, line in invalid_lines)
+            lines_written += line_count
+
+        with ProcessPoolExecutor(processes, initializer=_init_cfile_worker, initargs=(self,)) as pool, \
         open(new_path, mode='w', encoding='utf-8') as output_file:
-            for input_line in input_file:
-                output_line = updater(input_line)
-                output_file.write(output_line)
-
-    def _update_verbaco_line(self, input_line):
-        sql_parts = input_line.split(' ')
-        assignment = sql_parts[3]
-        variable = assignment.split('=')[0]
-        codes = assignment.split('=')[1][1:-1].split(',')
+            pending = deque()
+            for chunk in self._chunks(chunk_size):
+                pending.append(pool.submit(_rewrite_cfile_chunk, chunk))
+                if len(pending) >= 2 * processes:
+                    write(pending.popleft())
+            while pending:
+                write(pending.popleft())
+
+    def _chunks(self, chunk_size):
+
+        # yields (start, end) byte ranges of cfile,
+        # each range is extended to the end of its last line
+        size = os.path.getsize(self.cfile_path)
+        with open(self.cfile_path, mode='rb') as f:
+            start = 0
+            while start < size:
+                f.seek(min(start + chunk_size, size))
+                f.readline()
+                end = f.tell()
+                yield start, end
+                start = end
+
+    def _rewrite_chunk(self, start, end):
+
+        # returns rewritten chunk, invalid lines as (line number, line)
+        # relative to the chunk and number of lines in the chunk
+        with open(self.cfile_path, mode='rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        # same newline handling as in text mode
+        input_lines = StringIO(data.decode('utf-8'), newline=None)
+        self.invalid_lines = []
+        output_lines = [
+            self._update_line(input_line, line_number)
+            for line_number, input_line in enumerate(input_lines, start=1)]
+        return ''.join(output_lines), self.invalid_lines, len(output_lines)
+
+    def _update_line(self, input_line, line_number):
+
+        # rewrites variables and codes of all assignments,
+        # everything else in the line is kept as it is.
+        # lines, which can't be parsed, are kept and recorded as invalid.
+        # statements with a single assignment are rewritten from one match
+
+        match = CFILE_UPDATE_STATEMENT.match(input_line)
+        if match is None:
+            if input_line.strip():
+                self.invalid_lines.append((line_number, input_line.strip()))
+            return input_line
+
+        if match.group('more'):
+            output_parts = []
+            position = 0
+            for a in parse_update_statement(input_line).assignments:
+                output_parts.append(input_line[position:a.start])
+                output_parts.append(self._update_assignment(a.variable, a.codes))
+                position = a.end
+            output_parts.append(input_line[position:])
+            return ''.join(output_parts)
+
+        key = match.group('variable', 'codes')
+        new_assignment = self._assignments.get(key)
+        if new_assignment is None:
+            variable, codes = key
+            new_assignment = self._assignments[key] = self._update_assignment(variable, split_codes(codes))
+        return input_line[:match.start('variable')] + new_assignment + input_line[match.end('codes') + 1:]
+
+    def _update_assignment(self, variable, codes):
         new_variable = self.variable_map.get(variable, variable)
         variable_category_map = self.category_map.get(variable)
         new_codes = [variable_category_map.get(c, c) for c in codes] if variable_category_map else codes
         new_codes_without_duplicates = dict.fromkeys(new_codes)
-        new_assignment = f"{new_variable}={{{','.join(new_codes_without_duplicates)}}}"
-        sql_parts[3] = new_assignment
-        return ' '.join(sql_parts)
-
-    def _update_ascribe_line(self, input_line):
-        assignments_string, criteria = input_line[17:].split(' WHERE ')
-        assignments = assignments_string.strip().split(', ')
-        new_assignments = []
-        for a in assignments:
-            variable = a.split('=')[0].strip()
-            codes = a.split('=')[1].strip()[1:-1].split(',')
-            new_variable = self.variable_map.get(variable, variable)
-            variable_category_map = self.category_map.get(variable)
-            new_codes = [variable_category_map.get(c, c) for c in codes] if variable_category_map else codes
-            new_codes_without_duplicates = dict.fromkeys(new_codes)
-            new_assignment = f"{new_variable} = {{{','.join(new_codes_without_duplicates)}}}"
-            new_assignments.append(new_assignment)
-        return f"UPDATE vdata SET {', '.join(new_assignments)} WHERE {criteria}"
+        return f"{new_variable}{self._separator}{{{','.join(new_codes_without_duplicates)}}}"
+
+class CFileExecutor:
+
+    # executes cfile statements on a DB-API connection (mrOleDB, sqlite3)
+    # and commits after every batch of statements.
+    # after each commit, file offset and line number of the last committed
+    # statement are saved in checkpoint file, so a rerun after a failure
+    # continues with the 1st statement, which wasn't committed.
+    # checkpoint file is removed after the complete cfile was executed
+
+    def __init__(self, connection, cfile_path, *, batch_size=1000, checkpoint_path=None, verbose=True):
+        self.connection = connection
+        self.cfile_path = cfile_path
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path or f'{cfile_path}.checkpoint'
+        self.verbose = verbose
+        self.rows_executed = 0
+        self.committed_line_number = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_executed / self.seconds if self.seconds else 0.0
+
+    @property
+    def checkpoint(self):
+
+        # returns (offset, line_number) of the last commit
+        # or (0, 0) if there is no checkpoint
+        if not os.path.exists(self.checkpoint_path):
+            return 0, 0
+        with open(self.checkpoint_path, mode='r', encoding='utf-8') as f:
+            offset, line_number, file_size = (int(x) for x in f.read().split(','))
+        if file_size != os.path.getsize(self.cfile_path):
+            raise ValueError(f'{self.cfile_path} was changed after checkpoint {self.checkpoint_path} was saved')
+        return offset, line_number
+
+    def _save_checkpoint(self, offset, line_number):
+        with open(self.checkpoint_path, mode='w', encoding='utf-8') as f:
+            f.write(f'{offset},{line_number},{os.path.getsize(self.cfile_path)}')
+
+    def _commit(self, offset, line_number, start):
+        self.connection.commit()
+        self._save_checkpoint(offset, line_number)
+        self.committed_line_number = line_number
+        self.seconds = perf_counter() - start
+        if self.verbose:
+            print(f'{line_number} rows executed ({self.rows_per_second:.0f} rows/s)')
+
+    def execute(self):
+
+        offset, line_number = self.checkpoint
+        self.committed_line_number = line_number
+        if line_number and self.verbose:
+            print(f'Resuming {self.cfile_path} after row {line_number}')
+
+        cursor = self.connection.cursor()
+        self.rows_executed = 0
+        start = perf_counter()
+        pending = 0
+
+        # reads bytes to know the offset of every line
+        with open(self.cfile_path, mode='rb') as sql_file:
+            sql_file.seek(offset)
+            for raw_line in sql_file:
+                sql_line = raw_line.decode('utf-8').strip()
+                if sql_line:
+                    try:
+                        cursor.execute(sql_line)
+                    except Exception as e:
+                        self.connection.rollback()
+                        raise ValueError(f'Row {line_number + 1} of {self.cfile_path} failed: {e}. '
+                            f'Rows up to {self.committed_line_number} are committed') from e
+                    pending += 1
+                    self.rows_executed += 1
+                offset += len(raw_line)
+                line_number += 1
+                if pending >= self.batch_size:
+                    self._commit(offset, line_number, start)
+                    pending = 0
+
+        self._commit(offset, line_number, start)
+        cursor.close()
+        os.remove(self.checkpoint_path)
+
+_worker_cfile_manager = None
+
+def _init_cfile_worker(cfile_manager):
+    global _worker_cfile_manager
+    _worker_cfile_manager = cfile_manager
+
+def _rewrite_cfile_chunk(chunk):
+    return _worker_cfile_manager._rewrite_chunk(*chunk)
+
+CFileStatement = namedtuple('CFileStatement', 'assignments criteria')
+CFileAssignment = namedtuple('CFileAssignment', 'variable codes start end')
+
+# tokens of "UPDATE vdata SET a={1,2}, b = {3} WHERE criteria" statements,
+# variable names may contain brackets: f4l[{axa}].f4.Coding
+CFILE_UPDATE_STATEMENT = re.compile(
+    r'\s*UPDATE\s+vdata\s+SET\s+(?P<variable>[^\s=,]+)\s*=\s*\{(?P<codes>[^{}]*)\}'
+    r'(?P<more>(?:\s*,\s*[^\s=,]+\s*=\s*\{[^{}]*\})*)\s*WHERE\s+(?=\S)', re.IGNORECASE)
+CFILE_STATEMENT_START = re.compile(r'\s*UPDATE\s+vdata\s+SET\s+', re.IGNORECASE)
+CFILE_ASSIGNMENT = re.compile(
+    r'(?P<variable>[^\s=,]+)\s*=\s*\{(?P<codes>[^{}]*)\}\s*(?:(?P<comma>,)\s*|WHERE\s+)', re.IGNORECASE)
+CFILE_CRITERIA = re.compile(r'(?P<criteria>\S.*?)\s*$', re.DOTALL)
+
+def split_codes(codes):
+    return [c.strip() for c in codes.split(',')] if codes.strip() else []
+
+def parse_update_statement(sql_line):
+
+    # parses statement in one scan and returns CFileStatement
+    # with assignments (variable, list of codes, start and end position
+    # in line) or None, if line isn't a valid statement.
+    # criteria is everything after the 1st WHERE following the assignments,
+    # it may contain spaces, commas and further WHEREs
+
+    match = CFILE_STATEMENT_START.match(sql_line)
+    if match is None:
+        return None
+    position = match.end()
+    assignments = []
+    while True:
+        match = CFILE_ASSIGNMENT.match(sql_line, position)
+        if match is None:
+            return None
+        codes = match.group('codes')
+        assignments.append(CFileAssignment(
+            variable=match.group('variable'),
+            codes=split_codes(codes),
+            start=match.start(),
+            end=match.start('codes') + len(codes) + 1))
+        position = match.end()
+        if not match.group('comma'):
+            break
+    match = CFILE_CRITERIA.match(sql_line, position)
+    if match is None:
+        return None
+    return CFileStatement(assignments, match.group('criteria'))
+
+def _criteria_identity(criteria):
+
+    # criteria, which select one case by a key variable (Respondent.Serial = 1),
+    # are identified by key variable and value, criteria with the same key
+    # variable and different values select different cases.
+    # all other criteria are identified by their text and may select any case
+    match = CFILE_KEY_CRITERIA.match(criteria)
+    if match is None:
+        return None, criteria
+    value = match.group('number')
+    return match.group('variable').upper(), value if value is not None else match.group('text')
+
+def coalesce_statements(sql_lines):
+
+    # merges assignments of statements with identical criteria
+    # into one multi column statement at the position of the 1st statement.
+    # if a variable is assigned several times for the same criteria,
+    # the last assignment wins.
+    # statements are only moved in front of statements, which can't
+    # update the same cells: if a variable of the statement was written
+    # after its group with possibly overlapping criteria, the statement
+    # starts a new group at the end.
+    # lines, which can't be parsed, are kept unchanged at their position,
+    # statements after them start new groups
+
+    output = []
+    open_groups = {}
+    # output position of the last write per variable and key variable
+    last_writes = defaultdict(dict)
+
+    for sql_line in sql_lines:
+        statement = parse_update_statement(sql_line)
+        if statement is None:
+            if sql_line.strip():
+                output.append(sql_line.rstrip('\n') + '\n')
+                open_groups.clear()
+            continue
+
+        identity = _criteria_identity(statement.criteria)
+        key_variable = identity[0]
+        group = open_groups.get(identity)
+        if group is not None:
+            position = group[0]
+            for a in statement.assignments:
+                if any(p > position for k, p in last_writes[a.variable].items()
+                        if key_variable is None or k != key_variable):
+                    group = None
+                    break
+        if group is None:
+            group = open_groups[identity] = (len(output), {})
+            output.append((statement.criteria, group[1]))
+
+        position, assignments = group
+        for a in statement.assignments:
+            assignments[a.variable] = a.codes
+            writes = last_writes[a.variable]
+            writes[key_variable] = max(writes.get(key_variable, -1), position)
+
+    for item in output:
+        if isinstance(item, str):
+            yield item
+            continue
+        criteria, assignments = item
+        assignments_string = ', '.join(f"{variable} = {{{','.join(codes)}}}" for variable, codes in assignments.items())
+        yield f'UPDATE vdata SET {assignments_string} WHERE {criteria}\n'
+
+def coalesce_cfile(cfile_path, new_path):
+    with open(cfile_path, mode='r', encoding='utf-8') as input_file, \
+    open(new_path, mode='w', encoding='utf-8') as output_file:
+        output_file.writelines(coalesce_statements(input_file))
 
 def update_cfile(cfile_path, variable_map, category_map, new_path):
     cfile_manager = CFileManager(cfile_path, variable_map, category_map)
     cfile_manager.save_cfile(new_path)
 
+# criteria of cfile statements, which select one case by a key variable:
+# Respondent.Serial = 12 or Respondent.ID = 'a''b'
+CFILE_KEY_CRITERIA = re.compile(r"(?P<variable>[^\s=]+)\s*=\s*(?:(?P<number>-?\d+)|'(?P<text>(?:[^']|'')*)')\s*$")
+
+def read_category_map(mdd_path):
+
+    # values of categories by upper case name from
+    # categorymap of mdd xml, as they are stored in ddf
+    category_values = {}
+    for _, element in ElementTree.iterparse(mdd_path):
+        if element.tag == 'categoryid':
+            category_values[element.get('name').upper()] = int(element.get('value'))
+    return category_values
+
+def encode_categorical(codes, category_values):
+    # categorical value as stored in ddf: category values, each
+    # followed by ';'. {CB_1,CB_7} -> '1;7;', {} -> ''
+    return ''.join(f'{category_values[c.upper()]};' for c in codes)
+
+def decode_categorical(value, category_names):
+    # inverse of encode_categorical, None (not asked) stays None
+    if value is None:
+        return None
+    return [category_names[int(v)] for v in value.split(';') if v]
+
+class DDFData:
+
+    # native access to case data (L1 table) of ddf sqlite file without mrOleDB.
+    # cfile statements "UPDATE vdata SET q1={CB_1,CB_7} WHERE Respondent.Serial = 12"
+    # are mapped onto L1 columns (q1:C1) and run as prepared statements,
+    # consecutive statements with the same columns in executemany batches.
+    # the whole cfile is executed in one transaction
+
+    def __init__(self, ddf_path, category_values, *, batch_size=10000):
+        self.ddf_path = ddf_path
+        self.category_values = category_values
+        self.category_names = {v: k for k, v in category_values.items()}
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(ddf_path)
+
+        # column names of L1 by upper case variable name: q1:C1 -> Q1
+        self.columns = {
+            row[1].split(':')[0].upper(): row[1]
+            for row in self.connection.execute('pragma table_info(L1)')
+        }
+        self.rows_executed = 0
+        self.rows_updated = 0
+        self._statements = {}
+        self._values = {}
+
+    def column(self, variable):
+        try:
+            return self.columns[variable.upper()]
+        except KeyError:
+            raise ValueError(f'Variable "{variable}" is not a column of L1 table in {self.ddf_path}') from None
+
+    def read(self, variable, key='Respondent.Serial'):
+        # codes of variable by value of key variable
+        rows = self.connection.execute(f'SELECT [{self.column(key)}], [{self.column(variable)}] FROM L1')
+        return {k: decode_categorical(v, self.category_names) for k, v in rows}
+
+    def _prepare(self, sql_line):
+
+        # returns update statement with placeholders and its parameters.
+        # single assignments take the fast path of CFILE_UPDATE_STATEMENT.
+        # statements and encoded codes are cached, as they repeat for many cases
+        match = CFILE_UPDATE_STATEMENT.match(sql_line)
+        if match is not None and not match.group('more'):
+            assignments = ((match.group('variable'), match.group('codes')),)
+            criteria = CFILE_KEY_CRITERIA.match(sql_line, match.end())
+        else:
+            statement = parse_update_statement(sql_line)
+            if statement is not None:
+                assignments = tuple((a.variable, ','.join(a.codes)) for a in statement.assignments)
+            criteria = statement and CFILE_KEY_CRITERIA.match(statement.criteria)
+        if criteria is None:
+            raise ValueError('only "UPDATE vdata SET variable={codes} WHERE variable = value" is supported')
+
+        key = criteria.group('number')
+        key = int(key) if key is not None else criteria.group('text').replace("''", "'")
+        statement_key = (*(variable for variable, _ in assignments), criteria.group('variable'))
+        sql = self._statements.get(statement_key)
+        if sql is None:
+            columns = ', '.join(f'[{self.column(variable)}] = ?' for variable, _ in assignments)
+            sql = f'UPDATE L1 SET {columns} WHERE [{self.column(statement_key[-1])}] = ?'
+            self._statements[statement_key] = sql
+        return sql, (*(self._encode(codes) for _, codes in assignments), key)
+
+    def _encode(self, codes):
+        value = self._values.get(codes)
+        if value is None:
+            try:
+                value = encode_categorical(split_codes(codes), self.category_values)
+            except KeyError as e:
+                raise ValueError(f'Category {e} is not in category map') from None
+            self._values[codes] = value
+        return value
+
+    def _execute_batch(self, cursor, sql, parameters):
+        cursor.executemany(sql, parameters)
+        self.rows_updated += cursor.rowcount
+
+    def execute_cfile(self, cfile_path):
+
+        cursor = self.connection.cursor()
+        self.rows_executed = 0
+        self.rows_updated = 0
+        batch_sql, batch = None, []
+        try:
+            with open(cfile_path, mode='r', encoding='utf-8') as sql_file:
+                for line_number, sql_line in enumerate(sql_file, start=1):
+                    if not sql_line.strip():
+                        continue
+                    try:
+                        sql, parameters = self._prepare(sql_line)
+                    except ValueError as e:
+                        raise ValueError(f'Row {line_number} of {cfile_path} failed: {e}') from e
+                    if sql != batch_sql or len(batch) >= self.batch_size:
+                        if batch:
+                            self._execute_batch(cursor, batch_sql, batch)
+                        batch_sql, batch = sql, []
+                    batch.append(parameters)
+                    self.rows_executed += 1
+            if batch:
+                self._execute_batch(cursor, batch_sql, batch)
+        except Exception:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        cursor.close()
+
+    def close(self):
+        self.connection.close()
+
+############################################################################
+#
+#                                 CACHE
+#
+############################################################################
+
+class CodeplanCache:
+
+    # on-disk cache of parsed models like MDDFile and XLFile
+    # including trees of their codeplans. entries are zlib compressed
+    # pickles keyed by sha256 of file content, model, options and
+    # PARSER_VERSION. loading an entry touches it, entries with oldest
+    # modification times are evicted, when directory exceeds max_size
+
+    def __init__(self, directory, *, max_size=2**28):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, model, path, **options):
+
+        # returns model(path, **options) from cache or parses and stores it
+
+        cache_path = os.path.join(self.directory, f'{self._key(model, path, options)}.pickle.z')
+        try:
+            with open(cache_path, mode='rb') as f:
+                data = f.read()
+            obj = pickle.loads(zlib.decompress(data))
+        except FileNotFoundError:
+            pass
+        except (zlib.error, pickle.UnpicklingError, EOFError, AttributeError):
+            # broken or stale entries are parsed again
+            os.remove(cache_path)
+        else:
+            os.utime(cache_path)
+            obj.path = path
+            self.hits += 1
+            return obj
+
+        self.misses += 1
+        obj = model(path, **options)
+        # builds trees, so they are cached as well
+        for codeplan in obj:
+            codeplan.tree
+        self._store(cache_path, obj)
+        return obj
+
+    def _key(self, model, path, options):
+        h = hashlib.sha256()
+        with open(path, mode='rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                h.update(block)
+        h.update(f'{model.__module__}.{model.__qualname__}:{PARSER_VERSION}:{sorted(options.items())}'.encode('utf-8'))
+        return h.hexdigest()
+
+    def _store(self, cache_path, obj):
+        temp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temp_path, mode='wb') as f:
+            f.write(zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)))
+        os.replace(temp_path, cache_path)
+        self.evict()
+
+    def evict(self):
+
+        # removes least recently used entries until directory fits max_size
+
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pickle.z'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(e[1] for e in entries)
+        for _, entry_size, entry_path in sorted(entries):
+            if size <= self.max_size:
+                break
+            os.remove(entry_path)
+            size -= entry_size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pickle.z'):
+                os.remove(entry.path)
+
+    def __repr__(self):
+        return f"CodeplanCache(directory='{self.directory}', hits={self.hits}, misses={self.misses})"
+
 ############################################################################
 #
 #                               UTILITIES
@@ -1229,12 +2204,182 @@ def update_cfile(cfile_path, variable_map, category_map, new_path):
 def sort_element(code):
     return int(code[len(CODE_PREFIX):])
 
+class IndexedList(list):
+
+    # list of objects with lookup by key attribute (name, code) in O(1).
+    # index is built on the 1st lookup, extended by append/extend
+    # and dropped by all other changes. if several objects share
+    # the same key, lookup returns the 1st one as a linear scan would.
+    # subclasses can react to changes by overriding _changed()
+
+    __slots__ = ('_key', '_index')
+
+    def __init__(self, iterable=(), key='name'):
+        super().__init__(iterable)
+        self._key = key
+        self._index = None
+
+    def __reduce__(self):
+        return (self.__class__, (list(self), self._key))
+
+    @property
+    def index_map(self):
+        if self._index is None:
+            self._index = {}
+            for item in self:
+                self._index.setdefault(getattr(item, self._key), item)
+        return self._index
+
+    def get(self, key, default=None):
+        return self.index_map.get(key, default)
+
+    def contains_key(self, key):
+        return key in self.index_map
+
+    def _changed(self):
+        pass
+
+    def _invalidate(self):
+        self._index = None
+        self._changed()
+
+    def _add_to_index(self, items):
+        if self._index is not None:
+            for item in items:
+                self._index.setdefault(getattr(item, self._key), item)
+        self._changed()
+
+    def _reordered(self, unique_keys):
+        # order matters only for duplicate keys
+        if unique_keys:
+            self._changed()
+        else:
+            self._invalidate()
+
+    def _has_unique_keys(self):
+        return self._index is not None and len(self._index) == len(self)
+
+    def append(self, item):
+        super().append(item)
+        self._add_to_index((item,))
+
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self._add_to_index(items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, i, item):
+        super().insert(i, item)
+        self._invalidate()
+
+    def remove(self, item):
+        super().remove(item)
+        self._invalidate()
+
+    def pop(self, i=-1):
+        item = super().pop(i)
+        self._invalidate()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+    def sort(self, *args, **kwargs):
+        unique_keys = self._has_unique_keys()
+        super().sort(*args, **kwargs)
+        self._reordered(unique_keys)
+
+    def reverse(self):
+        unique_keys = self._has_unique_keys()
+        super().reverse()
+        self._reordered(unique_keys)
+
+    def __setitem__(self, i, item):
+        super().__setitem__(i, item)
+        self._invalidate()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._invalidate()
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._invalidate()
+        return self
+
+class MDDVariableList(IndexedList):
+
+    # variables of MDDFile, which resets fields and variable map
+    # of the file, when variables are changed
+
+    __slots__ = ('_owner',)
+
+    def __init__(self, iterable=(), owner=None):
+        super().__init__(iterable, key='name')
+        self._owner = owner
+
+    def __reduce__(self):
+        return (self.__class__, (list(self), self._owner))
+
+    def _changed(self):
+        if self._owner is not None:
+            self._owner._invalidate_fields()
+
+class CodeplanElements(IndexedList):
+
+    # elements of MDDCodeplan and XLCodeplan in codeplan order
+    # with lookup by code
+
+    __slots__ = ()
+
+    def __init__(self, iterable=()):
+        super().__init__(iterable, key='code')
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+    @property
+    def codes(self):
+        return [e.code for e in self]
+
+    def labels(self):
+        # label per code, 1st element wins for repeated codes
+        labels = {}
+        for e in self:
+            labels.setdefault(e.code, e.label)
+        return labels
+
+class CodeplanNodeList(IndexedList):
+
+    # children of CodeplanNode, which resets cached axis,
+    # flat children and node index of the parent node
+    # and all its ancestors, when children are changed
+
+    __slots__ = ('_owner',)
+
+    def __init__(self, iterable=(), owner=None):
+        super().__init__(iterable, key='name')
+        self._owner = owner
+
+    def __reduce__(self):
+        return (self.__class__, (list(self), self._owner))
+
+    def _changed(self):
+        if self._owner is not None:
+            self._owner._invalidate()
+
 def copy_mdd_ddf(input_path, output_path):
     
     # path should include complete directory path and file name without extention
     # e.g. 'C:\Folder\file' for file.mdd in C:\Folder folder
 
     from os.path import basename
+    from win32com import client
 
     copyfile(f'{input_path}.mdd', f'{output_path}.mdd')
     copyfile(f'{input_path}.ddf', f'{output_path}.ddf')
@@ -1246,95 +2391,232 @@ def copy_mdd_ddf(input_path, output_path):
     mdd.Close()
         
 
-def update_master_with_mdd_codeplan_with_adapter(master_path, codeplan_path, adapter, total_label='Sigma'):
-
-    master_mdd = client.Dispatch('MDM.Document')
-    master_mdd.Open(master_path)
-    codeplan_file = MDDFile(codeplan_path)
-
-    # checks if all mdd types exist in adapter
-    for cp in codeplan_file:
-        if cp.name not in [m.mdd_name for m in adapter]:
-            print(f"WARNING: {cp.name} doesn't exist in adapter")
-
-    # update types
-    for m in adapter:
-        if m.mdd_name and m.master_name and m.mdd_name in codeplan_file:
-            print(f'Working on Codeplan {m.master_name}')
+MasterState = namedtuple('MasterState', 'types fields')
+PlanElement = namedtuple('PlanElement', 'code label')
+PlanLabel = namedtuple('PlanLabel', 'code old_label new_label')
+PlanField = namedtuple('PlanField', 'parent name type_name axis')
+
+def master_field_names(codeplan_file):
+
+    # names of fields, which update of master creates if they don't exist:
+    # .Coding helper fields and fields from variable map
+    variable_map = codeplan_file.variable_map
+    helper_fields = [f'{v.field_name}{HELPER_FIELD}' for v in codeplan_file.variables
+        if f'{v.label}{HELPER_FIELD}' not in variable_map]
+    return [*dict.fromkeys(helper_fields), *variable_map.values()]
+
+def read_master_state(master_mdd, codeplan_file, adapter):
+
+    # reads types of adapter with element names and labels and fields,
+    # which exist in master, in one pass over master_mdd (MDM.Document).
+    # names are upper case as MDM lookups ignore case
+
+    master_names = {m.master_name.upper() for m in adapter if m.master_name}
+    types = {
+        t.Name.upper(): {e.Name.upper(): e.Label for e in t.Elements}
+        for t in master_mdd.Types if t.Name.upper() in master_names}
+    fields = {name.upper() for name in master_field_names(codeplan_file)
+        if master_mdd.Fields.Expanded.Exist(name)}
+    return MasterState(types, fields)
+
+class MasterUpdatePlan:
+
+    # changes, which bring master in line with mdd codeplan:
+    # - types_to_create, elements_to_add and labels_to_change
+    #   per master type name
+    # - helper_fields_to_create and fields_to_create
+    # - axis_per_type, tom axis expression per master type name
+    # plan is computed from MasterState without accessing master mdd,
+    # see apply_master_update_plan
+
+    def __init__(self, master_state, codeplan_file, adapter, total_label='Sigma'):
+
+        self.types_to_create = {}
+        self.elements_to_add = {}
+        self.labels_to_change = {}
+        self.helper_fields_to_create = []
+        self.fields_to_create = []
+        self.axis_per_type = {}
+        self.warnings = []
+
+        # types and fields are copied, as planned changes are recorded in them
+        master_types = {name: dict(elements) for name, elements in master_state.types.items()}
+        master_fields = set(master_state.fields)
+
+        # checks if all mdd types exist in adapter
+        adapter_mdd_names = {m.mdd_name for m in adapter}
+        for cp in codeplan_file:
+            if cp.name not in adapter_mdd_names:
+                self.warnings.append(f"{cp.name} doesn't exist in adapter")
+
+        # update types
+        mapped = [m for m in adapter if m.mdd_name and m.master_name and m.mdd_name in codeplan_file]
+        for m in mapped:
             codeplan_mdd = codeplan_file[m.mdd_name]
+            master_elements = master_types.get(m.master_name.upper())
+
             # creates type if it doesn't exist in the master
-            if not master_mdd.Types.Exist(m.master_name):
-                create_type(master_mdd, m.master_name, codeplan_mdd)
-            master_elements = {e.Name.upper() for e in master_mdd.Types[m.master_name].Elements}
-            mdd_elements = {e.code for e in codeplan_mdd.elements}
-            
+            if master_elements is None:
+                self.types_to_create[m.master_name] = [PlanElement(e.code, e.label) for e in codeplan_mdd.elements]
+                master_types[m.master_name.upper()] = {e.code.upper(): e.label for e in codeplan_mdd.elements}
+                continue
+
             # adds new elements
-            missing_in_master = sorted(mdd_elements - master_elements, key=sort_element)
-            for e in missing_in_master:
-                print(f'Adding element {e}')
-                new_element = master_mdd.CreateElement(e, codeplan_mdd[e].label)
-                new_element.Type = ElementTypeConstants.mtCategory
-                master_mdd.Types[m.master_name].Add(new_element)
+            mdd_elements = {e.code for e in codeplan_mdd.elements}
+            missing_in_master = sorted(mdd_elements - master_elements.keys(), key=sort_element)
+            if missing_in_master:
+                self.elements_to_add.setdefault(m.master_name, []).extend(
+                    PlanElement(e, codeplan_mdd[e].label) for e in missing_in_master)
+                master_elements.update((e, codeplan_mdd[e].label) for e in missing_in_master)
 
             # updates labels
-            exist_in_both = sorted(mdd_elements & master_elements, key=sort_element)
+            exist_in_both = sorted(mdd_elements & master_elements.keys(), key=sort_element)
             for e in exist_in_both:
-                codeplan_element = codeplan_mdd[e]
-                master_element = master_mdd.Types[m.master_name].Elements[e]
-                if codeplan_element.label != master_element.Label:
-                    print(f'Overwriting label for {e}: "{master_element.Label}" -> "{codeplan_element.label}"')
-                    master_element.Label = codeplan_element.label
-
-    # update fields
-    #original_variables=werden mit .Coding angelegt
-    #new_variables=müssen neu angelegt werden
-    original_variables = [v for v in codeplan_file.variables if v.label + HELPER_FIELD not in codeplan_file.variable_map]
-    new_variables =      [v for v in codeplan_file.variables if v.label + HELPER_FIELD in codeplan_file.variable_map]
-
-    # creates .Coding variable if doesn't exist
-    for v in original_variables:
-        if not master_mdd.Fields.Expanded.Exist(v.field_name + HELPER_FIELD):
-            master_types = [m.master_name for m in adapter if m.mdd_name == v.type_name]
-            if not master_types:
-                raise ValueError(f'{m.mdd_name} is missing in ADAPTER')
-            else:
-                master_type = master_types[0]
-            create_variable(
-                mdd = master_mdd,
-                parent_collection = master_mdd.Fields[v.field_name].HelperFields,
-                var_name = HELPER_FIELD[1:],
-                type_name = master_type,
-                axis = v.axis
-            )
+                label = codeplan_mdd[e].label
+                if label != master_elements[e]:
+                    self.labels_to_change.setdefault(m.master_name, []).append(
+                        PlanLabel(e, master_elements[e], label))
+                    master_elements[e] = label
+
+        # update fields
+        # original variables get .Coding helper field,
+        # variables in variable map are created as new fields
+        master_type_names = {}
+        for m in adapter:
+            master_type_names.setdefault(m.mdd_name, m.master_name)
+        variable_map = codeplan_file.variable_map
+
+        def master_type_name(v):
+            if not master_type_names.get(v.type_name):
+                raise ValueError(f'{v.type_name} is missing in ADAPTER')
+            return master_type_names[v.type_name]
+
+        for v in codeplan_file.variables:
+            if f'{v.label}{HELPER_FIELD}' not in variable_map:
+                name = f'{v.field_name}{HELPER_FIELD}'
+                if name.upper() not in master_fields:
+                    self.helper_fields_to_create.append(
+                        PlanField(v.field_name, HELPER_FIELD[1:], master_type_name(v), v.axis))
+                    master_fields.add(name.upper())
+        for v in codeplan_file.variables:
+            name = variable_map.get(f'{v.label}{HELPER_FIELD}')
+            if name is not None and name.upper() not in master_fields:
+                self.fields_to_create.append(PlanField('', name, master_type_name(v), v.axis))
+                master_fields.add(name.upper())
+
+        # axis expressions, later entries of adapter win
+        for m in mapped:
+            self.axis_per_type[m.master_name] = codeplan_file[m.mdd_name].tree.get_tom_axis(total_label)
+
+    def to_json(self, *, indent=2):
+
+        def records(items):
+            return [item._asdict() for item in items]
+
+        return json.dumps({
+            'types_to_create': {k: records(v) for k, v in self.types_to_create.items()},
+            'elements_to_add': {k: records(v) for k, v in self.elements_to_add.items()},
+            'labels_to_change': {k: records(v) for k, v in self.labels_to_change.items()},
+            'helper_fields_to_create': records(self.helper_fields_to_create),
+            'fields_to_create': records(self.fields_to_create),
+            'axis_per_type': self.axis_per_type,
+            'warnings': self.warnings,
+        }, indent=indent, ensure_ascii=False)
+
+    def save_json(self, path):
+        with open(path, mode='w', encoding='utf-8') as f:
+            f.write(self.to_json())
 
-    # checks and creates normal variables if they don't exist
-    for v in new_variables:
-        new_variable_name = codeplan_file.variable_map[v.label + HELPER_FIELD]
-        if not master_mdd.Fields.Expanded.Exist(new_variable_name):
-             master_type = [m.master_name for m in adapter if m.mdd_name == v.type_name][0]
-             create_variable(
-                mdd = master_mdd,
-                parent_collection = master_mdd.Fields,
-                var_name = new_variable_name,
-                type_name = master_type,
-                axis = v.axis
-            )
+    def __repr__(self):
+        return (f'MasterUpdatePlan(types_to_create={len(self.types_to_create)}, '
+            f'elements_to_add={sum(map(len, self.elements_to_add.values()))}, '
+            f'labels_to_change={sum(map(len, self.labels_to_change.values()))}, '
+            f'fields_to_create={len(self.helper_fields_to_create) + len(self.fields_to_create)})')
+
+def apply_master_update_plan(master_mdd, plan):
+
+    # applies MasterUpdatePlan to master_mdd (MDM.Document),
+    # each type is looked up once, fields are traversed once
+
+    for warning in plan.warnings:
+        print(f'WARNING: {warning}')
+
+    # types and elements
+    for name, elements in plan.types_to_create.items():
+        print(f'Creating type {name}')
+        create_type(master_mdd, name, elements)
+    for name, elements in plan.elements_to_add.items():
+        master_type = master_mdd.Types[name]
+        for e in elements:
+            print(f'Adding element {e.code}')
+            new_element = master_mdd.CreateElement(e.code, e.label)
+            new_element.Type = ElementTypeConstants.mtCategory
+            master_type.Add(new_element)
+    for name, labels in plan.labels_to_change.items():
+        master_elements = master_mdd.Types[name].Elements
+        for e in labels:
+            print(f'Overwriting label for {e.code}: "{e.old_label}" -> "{e.new_label}"')
+            master_elements[e.code].Label = e.new_label
+
+    # fields
+    for f in plan.helper_fields_to_create:
+        create_variable(
+            mdd = master_mdd,
+            parent_collection = master_mdd.Fields[f.parent].HelperFields,
+            var_name = f.name,
+            type_name = f.type_name,
+            axis = f.axis
+        )
+    for f in plan.fields_to_create:
+        create_variable(
+            mdd = master_mdd,
+            parent_collection = master_mdd.Fields,
+            var_name = f.name,
+            type_name = f.type_name,
+            axis = f.axis
+        )
+
+    # axis expressions of variables, which use one of the types,
+    # if a variable matches several types, the last one in plan wins
+    type_positions = {name: i for i, name in enumerate(plan.axis_per_type)}
+    if type_positions:
+        for f in master_mdd.Fields.Expanded:
+            if f.ObjectTypeValue != ObjectTypesConstants.mtVariable:
+                continue
+            elements = f.Elements
+            type_names = [elements.ReferenceName]
+            if elements.IsReference:
+                type_names.append(elements.Reference.Name)
+            if elements.Count > 0:
+                type_names.append(elements[0].ReferenceName)
+            matches = [name for name in type_names if name in type_positions]
+            if matches:
+                f.AxisExpression = plan.axis_per_type[max(matches, key=type_positions.get)]
+
+def update_master_with_mdd_codeplan_with_adapter(master_path, codeplan_path, adapter, total_label='Sigma', *, cache=None, plan_path=None):
+
+    # plans all changes from a state of master read in one pass,
+    # plan is saved as json in plan_path, if given, before it's applied
+
+    from win32com import client
+
+    master_mdd = client.Dispatch('MDM.Document')
+    master_mdd.Open(master_path)
+    codeplan_file = cache.load(MDDFile, codeplan_path) if cache else MDDFile(codeplan_path)
 
-    # # updates axis expressions
-    for m in adapter:
-        if m.mdd_name and m.master_name and m.mdd_name in codeplan_file:
-            codeplan_axis = codeplan_file[m.mdd_name].tree.get_tom_axis(total_label)
-            for f in master_mdd.Fields.Expanded:
-                if f.ObjectTypeValue == ObjectTypesConstants.mtVariable and (f.Elements.ReferenceName == m.master_name or (f.Elements.IsReference and f.Elements.Reference.Name == m.master_name) or (f.Elements.Count > 0 and f.Elements[0].ReferenceName == m.master_name)):
-                    f.AxisExpression = codeplan_axis
+    master_state = read_master_state(master_mdd, codeplan_file, adapter)
+    plan = MasterUpdatePlan(master_state, codeplan_file, adapter, total_label)
+    if plan_path:
+        plan.save_json(plan_path)
+    apply_master_update_plan(master_mdd, plan)
 
     master_mdd.CategoryMap.AutoAssignValues()
     master_mdd.Save()
     master_mdd.Close()
 
-def create_type(mdd, name, mdd_codeplan):
+def create_type(mdd, name, elements):
     mdd_type = mdd.CreateElements(name)
-    for e in mdd_codeplan.elements:
+    for e in elements:
         element = mdd.CreateElement(e.code, e.label)
         element.Type = ElementTypeConstants.mtCategory
         mdd_type.Add(element)
@@ -1348,16 +2630,32 @@ def create_variable(mdd, parent_collection, var_name, type_name, axis):
     new_variable.AxisExpression = axis
     parent_collection.Add(new_variable)
 
-def execute_opens(connection, cfile_path):
-    
-    ddf = connect(connection).cursor()
-    ddf.execute('exec xp_syncdb')
-    with open(cfile_path, mode='r', encoding='utf-8') as sql_file:
-        line_number = 0
-        for sql_line in sql_file:
-            ddf.execute(sql_line)
-            line_number += 1
-            if line_number % 100 == 0:
-                print(f'{line_number} rows executed')
-    ddf.connection.commit()
-    ddf.close()
+def execute_opens(connection, cfile_path, *, batch_size=1000, checkpoint_path=None):
+
+    # executes cfile via mrOleDB provider,
+    # see CFileExecutor for batches and checkpoints
+
+    from adodbapi import connect
+
+    ddf = connect(connection)
+    try:
+        cursor = ddf.cursor()
+        try:
+            cursor.execute('exec xp_syncdb')
+        finally:
+            cursor.close()
+        executor = CFileExecutor(ddf, cfile_path, batch_size=batch_size, checkpoint_path=checkpoint_path)
+        executor.execute()
+    finally:
+        ddf.close()
+
+def execute_opens_on_ddf(mdd_path, ddf_path, cfile_path, *, batch_size=10000):
+
+    # executes cfile directly on ddf sqlite file,
+    # see DDFData for supported statements
+
+    ddf = DDFData(ddf_path, read_category_map(mdd_path), batch_size=batch_size)
+    try:
+        ddf.execute_cfile(cfile_path)
+    finally:
+        ddf.close()
@@ -0,0 +1,46 @@
+import os
+
+from openpyxl import Workbook
+
+from codeplans import CodeplanElement, MDDCodeplan, MDDFile, MDDVariable
+
+# builders shared by the test modules, imported explicitly
+# so that the modules still run without pytest
+
+def build_mdd_file(types, variables, path='codeplan.mdd'):
+
+    # MDDFile without a file on disk,
+    # types as (name, [(code, label)], axis),
+    # variables as (name, label, type name, axis)
+    mdd_file = MDDFile.__new__(MDDFile)
+    mdd_file.path = path
+    mdd_file.types = [
+        MDDCodeplan(name, [CodeplanElement(code, label) for code, label in elements], axis, mdd_file)
+        for name, elements, axis in types]
+    mdd_file.variables = [MDDVariable(*variable) for variable in variables]
+    return mdd_file
+
+def write_text(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, mode='w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+def write_lines(directory, name, lines):
+    return write_text(directory, name, ''.join(f'{line}\n' for line in lines))
+
+def write_cfile(directory, lines):
+    return write_lines(directory, 'cfile.txt', lines)
+
+def write_workbook(directory, sheets, name='codeplans.xlsx'):
+
+    # sheets as {sheet name: rows}
+    path = os.path.join(directory, name)
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for sheet_name, rows in sheets.items():
+        sheet = workbook.create_sheet(sheet_name)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+    return path
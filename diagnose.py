@@ -1,10 +1,14 @@
-from win32com import client
+import os
 from enum import IntEnum
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from xml.etree import ElementTree
 
-
-RawVariableInfo = namedtuple('VariableInfo', 'name label data_type categories')
-MasterVariableInfo = namedtuple('VariableInfo', 'name data_type v_new v_dropped c_new c_dropped v_label c_label')
+# type names match the module attributes, so records can be pickled
+# by worker processes of read_waves
+RawVariableInfo = namedtuple('RawVariableInfo', 'name label data_type categories')
+MasterVariableInfo = namedtuple('MasterVariableInfo', 'name data_type v_new v_dropped c_new c_dropped v_label c_label')
 
 class DataTypeConstants(IntEnum):
     mtNone = 0
@@ -21,7 +25,33 @@ class openConstants(IntEnum):
      oREADWRITE = 2
      oNOSAVE    = 3
 
-def get_mdd_data(mdd_path):
+def get_mdd_data(mdd_path, *, parser='com'):
+
+    # parser 'com' uses MDM.Document, 'xml' reads mdd file directly
+    # without dimensions. xml parser raises ValueError for numeric loops
+    # and fields other than variables, classes, loops and grids,
+    # and uses the 1st label instead of FullLabel
+
+    if parser == 'xml':
+        return _read_mdd_data_from_xml(mdd_path)
+    elif parser == 'com':
+        return _read_mdd_data_from_com(mdd_path)
+    raise ValueError(f'Unknown parser "{parser}"')
+
+def read_waves(old_mdd, new_mdd, *, parser='com', processes=None):
+
+    # reads variables of both waves concurrently in separate processes,
+    # processes=1 reads them one after another.
+    # None uses 2 processes, if there are at least 2 cores
+    processes = processes or min(2, os.cpu_count() or 1)
+    if processes == 1:
+        return get_mdd_data(old_mdd, parser=parser), get_mdd_data(new_mdd, parser=parser)
+    with ProcessPoolExecutor(processes) as pool:
+        return tuple(pool.map(partial(get_mdd_data, parser=parser), (old_mdd, new_mdd)))
+
+def _read_mdd_data_from_com(mdd_path):
+
+    from win32com import client
 
     mdd = client.Dispatch('MDM.Document')
     mdd.Open(mdd_path, mode=openConstants.oREAD)
@@ -39,76 +69,169 @@ def get_mdd_data(mdd_path):
     mdd.Close()
     return variables
 
-def create_excel_comparison(old_mdd, new_mdd, xl_output):
-    old_wave_variables = get_mdd_data(old_mdd)
-    new_wave_variables = get_mdd_data(new_mdd)
+def _read_mdd_data_from_xml(mdd_path):
+
+    # builds variables as listed by mdd.Variables from design fields,
+    # which refer to variables in definition section:
+    # fields of classes (blocks) get the class name as prefix: block.q1,
+    # fields of loops and grids are repeated for every iteration: loop[{a}].q1,
+    # helper fields get their parent as prefix: q1.Coding.
+    # other fields and numeric loops raise ValueError
+
+    metadata = ElementTree.parse(mdd_path).getroot()[0]
+    definition = metadata.find('definition')
+    nodes = {node.get('id'): node for node in definition}
+    shared_lists = {node.get('name'): node for node in definition if node.tag == 'categories'}
+
+    def label(node):
+        # 1st label, see MDDFile._read_variable_node
+        labels = node.find('labels')
+        return (labels[0].text if labels is not None and len(labels) else None) or ''
+
+    def categories(node):
+        # categories with shared lists and sublists expanded in place
+        if node is None:
+            return
+        ref_name = node.get('ref_name')
+        if ref_name:
+            node = shared_lists.get(ref_name, ())
+        for child in node:
+            if child.tag == 'category':
+                yield child.get('name'), label(child)
+            elif child.tag == 'categories':
+                yield from categories(child)
+
+    def child(node, tag):
+        # design node or the definition node it refers to
+        found = node.find(tag)
+        if found is None and node.get('ref') in nodes:
+            found = nodes[node.get('ref')].find(tag)
+        return found
 
-    # filling master variables
-    master_variables = []
+    variables = {}
+
+    def read_variable(field, name):
+        node = nodes.get(field.get('ref'), field)
+        variables[name] = RawVariableInfo(
+            name,
+            label(node),
+            DataTypeConstants(int(node.get('type', DataTypeConstants.mtNone))).name,
+            dict(categories(node.find('categories'))))
+        helper_fields = field.find('helperfields')
+        if helper_fields is not None:
+            read_fields(helper_fields, f'{name}.')
+
+    def read_fields(fields, prefix):
+        for field in fields if fields is not None else ():
+            name = f'{prefix}{field.get("name")}'
+            if field.tag == 'variable':
+                read_variable(field, name)
+            elif field.tag == 'class':
+                read_fields(child(field, 'fields'), f'{name}.')
+            elif field.tag in ('loop', 'grid'):
+                iterations = child(field, 'categories')
+                if iterations is None:
+                    raise ValueError(f'Loop "{name}" without categories (numeric loop) '
+                        'is not supported by xml parser, use parser="com"')
+                loop_class = child(field, 'class')
+                loop_fields = loop_class.find('fields') if loop_class is not None else None
+                for iteration, _ in categories(iterations):
+                    read_fields(loop_fields, f'{name}[{{{iteration}}}].')
+            else:
+                raise ValueError(f'Field "{name}" of type "{field.tag}" '
+                    'is not supported by xml parser, use parser="com"')
+
+    read_fields(metadata.find('design').find('fields'), '')
+    return variables
+
+def variable_fingerprint(variable):
+    # label and categories with labels, equal for unchanged variables.
+    # compared as is, categories are equal regardless of their order
+    return variable.label, variable.categories
+
+def compare_variables(old_variable, new_variable):
+
+    # detailed comparison of variable in both waves,
+    # returns MasterVariableInfo or None, if nothing changed
+
+    # 1. check variable labels
+    v_label = old_variable.label != new_variable.label
+
+    # 2. check labels of categories, which exist in both waves
+    # (categories with empty old label are not compared)
+    for new_name, new_label in new_variable.categories.items():
+        old_label = old_variable.categories.get(new_name)
+        if old_label and new_label != old_label:
+            c_label = True
+            break
+    else:
+        c_label = False
+
+    # 3. new and dropped categories
+    c_new = bool(new_variable.categories.keys() - old_variable.categories.keys())
+    c_dropped = bool(old_variable.categories.keys() - new_variable.categories.keys())
+
+    if v_label or c_label or c_new or c_dropped:
+        return MasterVariableInfo(
+            name=new_variable.name,
+            data_type=new_variable.data_type,
+            v_new=False,
+            v_dropped=False,
+            c_new=c_new,
+            c_dropped=c_dropped,
+            v_label=v_label,
+            c_label=c_label)
+    return None
+
+def compare_waves(old_wave_variables, new_wave_variables):
+
+    # returns MasterVariableInfo of new, dropped and changed variables (in this order).
+    # variables in both waves are compared by fingerprint first,
+    # only variables with different fingerprints are compared in detail
 
     # 1. new variables
-    for name, variable in new_wave_variables.items():
-        if name not in old_wave_variables:
-            master_variables.append(
-                MasterVariableInfo(
-                    name, variable.data_type,
-                    v_new=True,
-                    v_dropped=False,
-                    c_new=False,
-                    c_dropped=False,
-                    v_label=False,
-                    c_label=False)
-            )
+    master_variables = [
+        MasterVariableInfo(
+            name, variable.data_type,
+            v_new=True,
+            v_dropped=False,
+            c_new=False,
+            c_dropped=False,
+            v_label=False,
+            c_label=False)
+        for name, variable in new_wave_variables.items()
+        if name not in old_wave_variables
+    ]
 
     # 2. dropped variables
-    for name, variable in old_wave_variables.items():
-        if name not in new_wave_variables:
-            master_variables.append(
-                MasterVariableInfo(
-                    name, variable.data_type,
-                    v_new=False,
-                    v_dropped=True,
-                    c_new=False,
-                    c_dropped=False,
-                    v_label=False,
-                    c_label=False)
-            )
+    master_variables.extend(
+        MasterVariableInfo(
+            name, variable.data_type,
+            v_new=False,
+            v_dropped=True,
+            c_new=False,
+            c_dropped=False,
+            v_label=False,
+            c_label=False)
+        for name, variable in old_wave_variables.items()
+        if name not in new_wave_variables
+    )
 
     # 3. changed variables
+    for name, new_variable in new_wave_variables.items():
+        old_variable = old_wave_variables.get(name)
+        if old_variable and variable_fingerprint(old_variable) != variable_fingerprint(new_variable):
+            changed_variable = compare_variables(old_variable, new_variable)
+            if changed_variable:
+                master_variables.append(changed_variable)
 
-    for new_variable in new_wave_variables.values():
-        old_variable = old_wave_variables.get(new_variable.name)
-
-        if old_variable:
+    return master_variables
 
-            # 3.1 check variable labels
-            v_label = old_variable.label != new_variable.label
+def create_excel_comparison(old_mdd, new_mdd, xl_output, *, parser='com', processes=None):
+    old_wave_variables, new_wave_variables = read_waves(old_mdd, new_mdd, parser=parser, processes=processes)
 
-            # 3.2 check categories
-            for new_name, new_label in new_variable.categories.items():
-                old_label = old_variable.categories.get(new_name)
-                if old_label and new_label != old_label:
-                    c_label = True
-                    break
-            else:
-                c_label = False
-
-            # 3.3 new categories
-            c_new = bool([c for c in new_variable.categories if c not in old_variable.categories])
-            c_dropped = bool([c for c in old_variable.categories if c not in new_variable.categories])
-
-            if v_label or c_label or c_new or c_dropped:
-                master_variables.append(
-                    MasterVariableInfo(
-                    name=new_variable.name,
-                    data_type=new_variable.data_type,
-                    v_new=False,
-                    v_dropped=False,
-                    c_new=c_new,
-                    c_dropped=c_dropped,
-                    v_label=v_label,
-                    c_label=c_label)
-                )
+    # filling master variables
+    master_variables = compare_waves(old_wave_variables, new_wave_variables)
 
     # export in excel
 
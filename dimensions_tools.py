@@ -1,13 +1,20 @@
+import re
 from shutil import copyfile
-from win32com import client
 from sqlite3 import connect
 from collections import namedtuple
 from os.path import basename
 
+# name at the start of a column definition: [a b], "a ""b""", `a`, a
+SQLITE_COLUMN_NAME = re.compile(r'\s*(\[[^\]]*\]|"(?:[^"]|"")*"|`(?:[^`]|``)*`|\w+)')
+
+SQLiteVariable = namedtuple('SQLiteVariable', 'cid name type notnull dflt_value pk')
+SQLiteLevelPlan = namedtuple('SQLiteLevelPlan', 'table current_variables new_variables')
+
 def copy_mdd_ddf_data(input_path, output_path, only_mdd=False):
-    
+
     copyfile(f'{input_path}.mdd', f'{output_path}.mdd')
     if not only_mdd:
+        from win32com import client
         copyfile(f'{input_path}.ddf', f'{output_path}.ddf')
         mdd = client.Dispatch('MDM.Document')
         mdd.Open(f'{output_path}.mdd')
@@ -29,7 +36,9 @@ class BlockTransferer:
         self.block_name = block_name
 
     def update_mdd(self):
-        
+
+        from win32com import client
+
         mdd = client.Dispatch('MDM.Document')
         mdd.Open(self.mdd_path)
 
@@ -55,46 +64,160 @@ class BlockTransferer:
         mdd.Save()
         mdd.Close()
 
-    def update_ddf(self):
+    def update_ddf(self, system_variables=None, in_place=True):
 
         # uses mdd to read the list of system variables
-        mdd = client.Dispatch('MDM.Document')
-        mdd.Open(self.mdd_path)
-        system_variables = [v.FullName for v in mdd.Variables if v.IsSystemVariable]
-        mdd.Close()
-        
-        # sets up sqlite database
-        sqlite_conn = connect(self.ddf_path)
+        if system_variables is None:
+            from win32com import client
+            mdd = client.Dispatch('MDM.Document')
+            mdd.Open(self.mdd_path)
+            system_variables = [v.FullName for v in mdd.Variables if v.IsSystemVariable]
+            mdd.Close()
+        system_variables = set(system_variables)
+
+        # only L1 holds top level fields. columns of child levels are named
+        # relative to their loop (f4 in table of f4l), which is moved into
+        # the block by prefixing its DSCTableName in Levels table
+        plan = self._plan_level('L1', system_variables)
+
+        # sets up sqlite database in autocommit mode, so that
+        # the whole update runs in one explicit transaction.
+        # ddf is a copy of the original data (see copy_mdd_ddf_data),
+        # so journal and syncing to disk are traded for speed
+        sqlite_conn = connect(self.ddf_path, isolation_level=None)
         sqlite_cursor = sqlite_conn.cursor()
+        sqlite_cursor.execute('PRAGMA journal_mode = TRUNCATE')
+        sqlite_cursor.execute('PRAGMA synchronous = OFF')
+        sqlite_cursor.execute('BEGIN')
+
+        try:
+            # update Levels table
+            sqlite_cursor.execute(f"""
+                UPDATE Levels
+                SET DSCTableName = '{self.block_name}.' || DSCTableName
+                WHERE ParentName = 'L1'""")
+
+            # renames columns of L1 table
+            if in_place:
+                self._rename_columns(sqlite_cursor, *plan)
+            else:
+                self._rebuild_table(sqlite_cursor, plan.table, plan.new_variables)
+
+            # commits transaction
+            sqlite_cursor.execute('COMMIT')
+        except Exception:
+            sqlite_cursor.execute('ROLLBACK')
+            raise
+        finally:
+            sqlite_conn.close()
+
+    def _plan_level(self, table, system_variables):
+
+        # read columns from level table
+        sqlite_conn = connect(self.ddf_path)
+        current_variables = [SQLiteVariable(*row) for row in sqlite_conn.execute(f'pragma table_info([{table}])')]
+        sqlite_conn.close()
 
-        # update Levels table
-        sqlite_cursor.execute(f"""
-            UPDATE Levels
-            SET DSCTableName = '{self.block_name}.' || DSCTableName
-            WHERE ParentName = 'L1'""")
-
-        # read columns from L1 table
-        SQLiteVariable = namedtuple('SQLiteVariable', 'cid name type notnull dflt_value pk')
-        current_variables = [SQLiteVariable(*row) for row in sqlite_cursor.execute('pragma table_info(L1)')]
-
-        # builds list of renamed variables
+        # builds list of renamed variables, system variables and
+        # structural columns (:P0, LevelId) keep their names
+        kept_variables = set(system_variables) | {'LevelId'}
         new_variables = [
-            SQLiteVariable(
-                v.cid,
-                v.name if (v.name.split(':')[0] in system_variables
-                    or v.name[0] == ':') else f'{self.block_name}.{v.name}',
-                v.type,
-                v.notnull,
-                v.dflt_value,
-                v.pk)
+            v._replace(name=v.name if (v.name.split(':')[0] in kept_variables
+                or v.name[0] == ':') else f'{self.block_name}.{v.name}')
             for v in current_variables
         ]
-
-        #renames old L1 table
-        sqlite_cursor.execute('ALTER TABLE L1 RENAME TO temp_L1')   
-
-        # creates new L1 table
-        create_table_statement = '''CREATE TABLE L1 (
+        return SQLiteLevelPlan(table, current_variables, new_variables)
+
+    @classmethod
+    def _rename_columns(cls, sqlite_cursor, table, current_variables, new_variables):
+
+        # renames columns in place by one edit of the table's CREATE statement
+        # in sqlite_master, rows are not touched. ALTER TABLE RENAME COLUMN
+        # would rewrite and reparse the schema for every column.
+        # tables, whose statement can't be mapped onto their columns
+        # or may name columns elsewhere (table constraints, CHECK,
+        # REFERENCES, generated columns), are rebuilt
+        sql, = sqlite_cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        new_sql = cls._renamed_table_sql(sql, current_variables, new_variables)
+        if new_sql is None:
+            cls._rebuild_table(sqlite_cursor, table, new_variables)
+            return
+
+        schema_version, = sqlite_cursor.execute('PRAGMA schema_version').fetchone()
+        sqlite_cursor.execute('PRAGMA writable_schema = ON')
+        sqlite_cursor.execute(
+            "UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = ?", (new_sql, table))
+        sqlite_cursor.execute(f'PRAGMA schema_version = {schema_version + 1}')
+        sqlite_cursor.execute('PRAGMA writable_schema = OFF')
+
+        # schema is reloaded, its columns must be the renamed ones
+        names = [row[1] for row in sqlite_cursor.execute(f'pragma table_info([{table}])')]
+        if names != [v.name for v in new_variables]:
+            raise ValueError(f'Renaming columns of table "{table}" failed')
+
+    @staticmethod
+    def _renamed_table_sql(sql, current_variables, new_variables):
+
+        # splits CREATE TABLE statement at top level commas of its
+        # definition list, quoted names and nested brackets are skipped
+        definitions = []
+        depth, quote, start = 0, None, None
+        for i, char in enumerate(sql):
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in '\'"`':
+                quote = char
+            elif char == '[':
+                quote = ']'
+            elif char == '(':
+                depth += 1
+                if depth == 1:
+                    head, start = sql[:i + 1], i + 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    definitions.append(sql[start:i])
+                    tail = sql[i:]
+                    break
+            elif char == ',' and depth == 1:
+                definitions.append(sql[start:i])
+                start = i + 1
+        else:
+            return None
+        if len(definitions) != len(current_variables):
+            return None
+
+        # replaces names of renamed columns, None for definitions,
+        # which don't start with the column or contain expressions
+        new_definitions = []
+        for definition, old, new in zip(definitions, current_variables, new_variables):
+            match = SQLITE_COLUMN_NAME.match(definition)
+            if match is None:
+                return None
+            name = match.group(1)
+            if name[0] in '["`':
+                name = name[1:-1].replace(name[0] * 2, name[0]) if name[0] != '[' else name[1:-1]
+            if name != old.name or '(' in definition[match.end(1):]:
+                return None
+            if new.name == old.name:
+                new_definitions.append(definition)
+                continue
+            quoted_name = '"' + new.name.replace('"', '""') + '"'
+            new_definitions.append(f'{definition[:match.start(1)]}{quoted_name}{definition[match.end(1):]}')
+        return head + ','.join(new_definitions) + tail
+
+    @staticmethod
+    def _rebuild_table(sqlite_cursor, table, new_variables):
+
+        # copy path, which rewrites all rows
+
+        # renames old table
+        sqlite_cursor.execute(f'ALTER TABLE [{table}] RENAME TO [temp_{table}]')
+
+        # creates new table
+        create_table_statement = f'''CREATE TABLE [{table}] (
             ''' + ', '.join(
                     [f'[{v.name}] {v.type} {"not" if v.notnull else ""} null {"unique" if v.pk else ""}'
                     for v in new_variables]
@@ -102,22 +225,20 @@ class BlockTransferer:
         sqlite_cursor.execute(create_table_statement)
 
         # transfers data
-        sqlite_cursor.execute('''
-            INSERT INTO L1 
+        sqlite_cursor.execute(f'''
+            INSERT INTO [{table}]
             SELECT *
-            FROM temp_L1
+            FROM [temp_{table}]
         ''')
 
         # deletes old table
-        sqlite_cursor.execute('DROP TABLE temp_L1')
-
-        # commits transaction
-        sqlite_conn.commit()
-        sqlite_conn.close()
+        sqlite_cursor.execute(f'DROP TABLE [temp_{table}]')
 
 
 def remove_helper_fields(mdd_path):
 
+    from win32com import client
+
     mdd = client.Dispatch('MDM.Document')
     mdd.Open(mdd_path)
 
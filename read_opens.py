@@ -6,14 +6,18 @@ from settings import *
 
 def main():
 	# create master verbaco mdd by merging previous waves
+	# (latest wave first, earlier waves win over later ones)
 	# master_verbaco = MDDFile(f'{JOB_ROOT}Data\\Coding\\Raw\\codeplan_1536064682893_2018-09-04.mdd')
-	# slave_verbaco = MDDFile(f'{JOB_ROOT}Data\\Coding\\Raw\\codeplan_1533204901432_2018-08-02.mdd')
-	# merged_verbaco = MDDFileMerger(master_verbaco, slave_verbaco).merge()
+	# slave_verbacos = [MDDFile(f'{JOB_ROOT}Data\\Coding\\Raw\\codeplan_1533204901432_2018-08-02.mdd')]
+	# merged_verbaco = MDDFileMerger(master_verbaco, *slave_verbacos).merge()
 	# merged_verbaco.save_as(MDD_CODEPLAN)
 
+	# parsed codeplans are reused from cache, if files didn't change
+	cache = CodeplanCache(CACHE_DIR)
+
 	# merges final verbaco mdd with excel
-	verbaco_mdd = MDDFile(MDD_CODEPLAN)
-	xl_codeplans = XLFile(EXCEL_CODEPLAN)
+	verbaco_mdd = cache.load(MDDFile, MDD_CODEPLAN)
+	xl_codeplans = cache.load(XLFile, EXCEL_CODEPLAN, sheets=[m.xl_name for m in ADAPTER if m.xl_name])
 	mdd_xl_merger = MDDXLFileMerger(verbaco_mdd, xl_codeplans, ADAPTER, verbose=True)
 	adjusted_verbaco_mdd = mdd_xl_merger.merge_all()
 	adjusted_verbaco_mdd.save_as(ADJUSTED_MDD_CODEPLAN)
@@ -28,7 +32,7 @@ def main():
 
 	# update master file verbaco mdd
 	copy_mdd_ddf(INPUT_PATH, OUTPUT_PATH)
-	update_master_with_mdd_codeplan_with_adapter(f'{OUTPUT_PATH}.mdd', ADJUSTED_MDD_CODEPLAN, ADAPTER)
+	update_master_with_mdd_codeplan_with_adapter(f'{OUTPUT_PATH}.mdd', ADJUSTED_MDD_CODEPLAN, ADAPTER, cache=cache)
 
 	# executes cfiles
 	execute_opens(MROLEDB_CONNECTION_STRING, DB_CFILE)
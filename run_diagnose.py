@@ -5,4 +5,6 @@ OLD_MDD = f'test\\diagnose\\KTVONLINE_1810.mdd'
 NEW_MDD = f'test\\diagnose\\KTVONLINE_1811.mdd'
 EXCEL_COMPARISON_FILE = f'test\\diagnose\\wave_comparison.xlsx'
 
-create_excel_comparison(OLD_MDD, NEW_MDD, EXCEL_COMPARISON_FILE)
\ No newline at end of file
+# waves are read in worker processes, which import this module
+if __name__ == '__main__':
+    create_excel_comparison(OLD_MDD, NEW_MDD, EXCEL_COMPARISON_FILE)
\ No newline at end of file
@@ -20,6 +20,7 @@ ADJUSTED_MDD_CODEPLAN = f'{JOB_ROOT}Data\\Coding\\verbaco_codeplan_adjusted_{ROU
 VARIABLE_MAP = f'{JOB_ROOT}Data\\Coding\\variable_map_{ROUND_LABEL}.txt'
 CATEGORY_MAP = f'{JOB_ROOT}Data\\Coding\\category_map_{ROUND_LABEL}.txt'
 ADJUSTED_VERBACO_CFILE = f'{JOB_ROOT}Data\\Coding\\verbaco_cfile_adjusted_{ROUND_LABEL}.txt'
+CACHE_DIR = f'{JOB_ROOT}Data\\Coding\\Cache'
 
 # output
 OUTPUT_PATH = f'{JOB_ROOT}Data\\KTV_Online_FINAL_{ROUND_LABEL}_withOpens'
@@ -0,0 +1,43 @@
+from codeplans import CodeplanNode
+
+AXIS = ("{mean 'Mean' expression('q1 * {CB_1}'), CB_1 'it''s {x}' [Decimals=2, Factor=1], "
+    "net1 'Net' net({CB_2 'b', net2 'Inner' net({CB_3 'c'})})}")
+
+def signature(node):
+    return (node.name, node.label, node.function, node.properties, node.level,
+        [signature(c) for c in node.children])
+
+def test_labels_inside_function_arguments_are_not_taken():
+    mean = CodeplanNode.from_axis(AXIS).children[0]
+    assert (mean.name, mean.label, mean.function) == ('mean', 'Mean', "expression('q1 * {CB_1}')")
+    assert mean.children == []
+
+def test_braces_in_labels_and_commas_in_properties_are_kept():
+    code = CodeplanNode.from_axis(AXIS).children[1]
+    assert (code.name, code.label, code.properties) == ('CB_1', "it's {x}", '[Decimals=2, Factor=1]')
+    assert code.children == []
+    assert code.axis == "CB_1 'it''s {x}' [Decimals=2, Factor=1]"
+
+def test_parses_nested_nets():
+    root = CodeplanNode.from_axis(AXIS)
+    assert signature(root.children[2]) == ('net1', 'Net', 'net()', '', 1, [
+        ('CB_2', 'b', '', '', 2, []),
+        ('net2', 'Inner', 'net()', '', 2, [('CB_3', 'c', '', '', 3, [])])])
+    net2 = root.children[2].children[1]
+    assert net2.children[0].parent is net2
+    assert root.axis == AXIS
+
+def test_tom_axis_round_trip():
+    tom_axis = CodeplanNode.from_axis(AXIS).get_tom_axis('Total')
+    tom = CodeplanNode.from_axis(tom_axis)
+    assert [c.name or c.function for c in tom.children] == ['base()', 'mean', 'CB_1', 'net1', 'sum']
+    assert tom.children[-1].function == 'total()'
+    assert signature(tom.children[3]) == signature(CodeplanNode.from_axis(AXIS).children[2])
+    assert tom.get_tom_axis('Total') == tom_axis
+
+
+if __name__ == '__main__':
+    test_labels_inside_function_arguments_are_not_taken()
+    test_braces_in_labels_and_commas_in_properties_are_kept()
+    test_parses_nested_nets()
+    test_tom_axis_round_trip()
@@ -0,0 +1,115 @@
+import os
+from sqlite3 import connect
+from tempfile import TemporaryDirectory
+
+from dimensions_tools import BlockTransferer
+
+SYSTEM_VARIABLES = ['Respondent.Serial', 'DataCollection.Status']
+
+def create_ddf(path):
+    connection = connect(path)
+    connection.executescript('''
+        CREATE TABLE Levels (TableName TEXT, ParentName TEXT, DSCTableName TEXT);
+        INSERT INTO Levels VALUES ('L1', '', 'HDATA'), ('L2', 'L1', 'f4l'), ('L3', 'L2', 'grid'), ('L4', 'L1', 'f5l');
+        CREATE TABLE L1 ([:P0] INTEGER not null unique, [Respondent.Serial:L] INTEGER,
+            [DataCollection.Status:S] TEXT, [q1:C1] TEXT, [q2.Coding:L] INTEGER);
+        INSERT INTO L1 VALUES (1, 101, '1;', '2;', 5), (2, 102, '1;', NULL, 7);
+        CREATE TABLE L2 ([:P0] INTEGER, [:P1] INTEGER, [LevelId:C1] TEXT, [f4:C1] TEXT);
+        INSERT INTO L2 VALUES (1, 1, '1;', '3;'), (2, 1, '2;', NULL);
+        CREATE TABLE L3 ([:P0] INTEGER, [:P1] INTEGER, [:P2] INTEGER, [slice:L] INTEGER);
+        INSERT INTO L3 VALUES (1, 1, 1, 10);
+        CREATE TABLE L4 ([:P0] INTEGER, [:P1] INTEGER);''')
+    connection.commit()
+    connection.close()
+
+def read_ddf(path, table='L1'):
+    connection = connect(path)
+    columns = [row[1] for row in connection.execute(f'pragma table_info({table})')]
+    rows = connection.execute(f'SELECT * FROM {table} ORDER BY [:P0]').fetchall()
+    levels = connection.execute('SELECT * FROM Levels ORDER BY TableName').fetchall()
+    connection.close()
+    return columns, rows, levels
+
+def test_renames_columns_in_place_and_by_copy():
+    with TemporaryDirectory() as directory:
+        results = []
+        for in_place in (True, False):
+            path = os.path.join(directory, f'{in_place}.ddf')
+            create_ddf(path)
+            BlockTransferer('test.mdd', path, 'Block').update_ddf(SYSTEM_VARIABLES, in_place=in_place)
+            results.append(read_ddf(path))
+            connection = connect(path)
+            assert connection.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+            connection.close()
+
+        columns, rows, levels = results[0]
+        assert columns == [':P0', 'Respondent.Serial:L', 'DataCollection.Status:S',
+            'Block.q1:C1', 'Block.q2.Coding:L']
+        assert rows == [(1, 101, '1;', '2;', 5), (2, 102, '1;', None, 7)]
+        assert levels == [('L1', '', 'HDATA'), ('L2', 'L1', 'Block.f4l'), ('L3', 'L2', 'grid'), ('L4', 'L1', 'Block.f5l')]
+        assert results[0] == results[1]
+
+def test_renames_quoted_columns_and_tables_with_constraints_in_place():
+    # tables with constraints, which name columns, are rebuilt instead
+    for constraint in ('', ' CHECK ([q2.Coding:L] > 0)', ', UNIQUE ([:P0], [q1:C1])'):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.ddf')
+            create_ddf(path)
+            connection = connect(path)
+            connection.executescript(f'''
+                ALTER TABLE L1 RENAME TO old_L1;
+                CREATE TABLE L1 ([:P0] INTEGER, "Respondent.Serial:L" INTEGER, [DataCollection.Status:S] TEXT,
+                    `q1:C1` TEXT DEFAULT ',', "q2.Coding:L" INTEGER{constraint});
+                INSERT INTO L1 SELECT * FROM old_L1;
+                DROP TABLE old_L1;''')
+            connection.close()
+            BlockTransferer('test.mdd', path, 'Block').update_ddf(SYSTEM_VARIABLES, in_place=True)
+
+            columns, rows, _ = read_ddf(path)
+            assert columns == [':P0', 'Respondent.Serial:L', 'DataCollection.Status:S',
+                'Block.q1:C1', 'Block.q2.Coding:L'], constraint
+            assert rows == [(1, 101, '1;', '2;', 5), (2, 102, '1;', None, 7)]
+
+def test_keeps_columns_of_child_level_tables():
+    with TemporaryDirectory() as directory:
+        results = []
+        for in_place in (True, False):
+            path = os.path.join(directory, f'{in_place}.ddf')
+            create_ddf(path)
+            BlockTransferer('test.mdd', path, 'Block').update_ddf(SYSTEM_VARIABLES, in_place=in_place)
+            results.append([read_ddf(path, table)[:2] for table in ('L2', 'L3', 'L4')])
+
+        # child columns are relative to their loop, which is moved
+        # into the block by DSCTableName of L1 children
+        assert results[0] == [
+            ([':P0', ':P1', 'LevelId:C1', 'f4:C1'], [(1, 1, '1;', '3;'), (2, 1, '2;', None)]),
+            ([':P0', ':P1', ':P2', 'slice:L'], [(1, 1, 1, 10)]),
+            ([':P0', ':P1'], [])]
+        assert results[0] == results[1]
+
+def test_rolls_back_on_error():
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'test.ddf')
+        create_ddf(path)
+        connection = connect(path)
+        connection.execute('CREATE TABLE [temp_L1] (x)')
+        connection.commit()
+        connection.close()
+
+        try:
+            BlockTransferer('test.mdd', path, 'Block').update_ddf(SYSTEM_VARIABLES, in_place=False)
+        except Exception:
+            pass
+        else:
+            assert False, 'existing temp_L1 table should raise'
+
+        columns, _, levels = read_ddf(path)
+        assert 'q1:C1' in columns
+        assert levels[1] == ('L2', 'L1', 'f4l')
+
+
+if __name__ == '__main__':
+    test_renames_columns_in_place_and_by_copy()
+    test_renames_quoted_columns_and_tables_with_constraints_in_place()
+    test_keeps_columns_of_child_level_tables()
+    test_rolls_back_on_error()
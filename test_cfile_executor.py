@@ -0,0 +1,99 @@
+import os
+import re
+import sqlite3
+from tempfile import TemporaryDirectory
+
+from codeplans import CFileExecutor, coalesce_cfile
+from conftest import write_cfile
+
+# sqlite stands in for the vdata table of the mrOleDB provider
+
+def create_vdata(directory, respondents=5):
+    connection = sqlite3.connect(os.path.join(directory, 'vdata.sqlite'))
+    connection.execute('CREATE TABLE vdata (serial INTEGER PRIMARY KEY, q1 TEXT, hits INTEGER DEFAULT 0)')
+    connection.executemany('INSERT INTO vdata (serial) VALUES (?)', [(i,) for i in range(1, respondents + 1)])
+    connection.commit()
+    return connection
+
+class CategoricalConnection:
+
+    # stores categorical values {a,b} of cfile statements as text
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql_line):
+        return self.connection.execute(re.sub(r"\{[^{}]*\}", lambda m: f"'{m.group()}'", sql_line))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        pass
+
+def test_executes_all_statements_in_batches():
+    with TemporaryDirectory() as directory:
+        connection = create_vdata(directory)
+        cfile = write_cfile(directory, [
+            f"UPDATE vdata SET q1 = '{{{i}}}', hits = hits + 1 WHERE serial = {i}" for i in range(1, 6)])
+        executor = CFileExecutor(connection, cfile, batch_size=2, verbose=False)
+        executor.execute()
+        assert executor.rows_executed == 5
+        assert not os.path.exists(executor.checkpoint_path)
+        assert connection.execute('SELECT q1 FROM vdata WHERE serial = 4').fetchone() == ('{4}',)
+        connection.close()
+
+def test_resumes_after_last_committed_batch():
+    with TemporaryDirectory() as directory:
+        connection = create_vdata(directory)
+        lines = ['UPDATE vdata SET hits = hits + 1 WHERE serial = 1'] * 7
+        lines[4] = 'UPDATE vdata SET q2 = 1 WHERE serial = 1'
+        cfile = write_cfile(directory, lines)
+
+        executor = CFileExecutor(connection, cfile, batch_size=3, verbose=False)
+        try:
+            executor.execute()
+        except ValueError as e:
+            assert 'Row 5' in str(e)
+        else:
+            assert False, 'missing column q2 should fail'
+        assert executor.checkpoint[1] == 3
+        assert connection.execute('SELECT hits FROM vdata WHERE serial = 1').fetchone() == (3,)
+
+        # rerun starts with row 4, committed rows are not executed twice
+        connection.execute('ALTER TABLE vdata ADD COLUMN q2 INTEGER')
+        executor = CFileExecutor(connection, cfile, batch_size=3, verbose=False)
+        executor.execute()
+        assert executor.rows_executed == 4
+        assert connection.execute('SELECT hits FROM vdata WHERE serial = 1').fetchone() == (6,)
+        connection.close()
+
+def test_coalesced_cfile_keeps_last_assignment():
+    with TemporaryDirectory() as directory:
+        cfile = write_cfile(directory, [
+            'UPDATE vdata SET y = {1} WHERE serial = 1',
+            'UPDATE vdata SET x = {2}, z = {2} WHERE serial IN (1, 2)',
+            'UPDATE vdata SET x = {3} WHERE serial = 2',
+            'UPDATE vdata SET x = {4}, z = {4} WHERE serial = 1'])
+        coalesced = os.path.join(directory, 'coalesced.txt')
+        coalesce_cfile(cfile, coalesced)
+
+        results = []
+        for path in (cfile, coalesced):
+            connection = sqlite3.connect(':memory:')
+            connection.execute('CREATE TABLE vdata (serial INTEGER PRIMARY KEY, x TEXT, y TEXT, z TEXT)')
+            connection.executemany('INSERT INTO vdata (serial) VALUES (?)', [(1,), (2,)])
+            CFileExecutor(CategoricalConnection(connection), path, verbose=False).execute()
+            results.append(connection.execute('SELECT * FROM vdata ORDER BY serial').fetchall())
+            connection.close()
+        assert results[0] == [(1, '{4}', '{1}', '{4}'), (2, '{3}', None, '{2}')]
+        assert results[1] == results[0]
+
+if __name__ == '__main__':
+    test_executes_all_statements_in_batches()
+    test_resumes_after_last_committed_batch()
+    test_coalesced_cfile_keeps_last_assignment()
+    print('OK')
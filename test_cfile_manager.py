@@ -0,0 +1,98 @@
+import os
+from tempfile import TemporaryDirectory
+
+from codeplans import CFileManager, CFileSources
+from conftest import write_lines
+
+def read_file(path):
+    with open(path, mode='r', encoding='utf-8') as f:
+        return f.read()
+
+def create_manager(directory, cfile_lines, cfile_source=CFileSources.Verbaco):
+    cfile = write_lines(directory, 'cfile.txt', cfile_lines)
+    variable_map = write_lines(directory, 'variable_map.txt', ['f4l[{axa}].f4.Coding,f4l_f4_axa_o_c'])
+    category_map = write_lines(directory, 'category_map.txt', [
+        'f4l[{axa}].f4.Coding,CB_7,CB_99',
+        'q1.Coding,CB_3,CB_99'])
+    return CFileManager(cfile, variable_map, category_map, cfile_source=cfile_source)
+
+def test_rewrites_variables_and_codes():
+    with TemporaryDirectory() as directory:
+        manager = create_manager(directory, [
+            'UPDATE vdata SET f4l[{axa}].f4.Coding={CB_1,CB_7} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q1.Coding={CB_3,CB_99} WHERE Respondent.Serial = 1'])
+        output = os.path.join(directory, 'output.txt')
+        manager.save_cfile(output)
+        assert read_file(output).splitlines() == [
+            'UPDATE vdata SET f4l_f4_axa_o_c={CB_1,CB_99} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q1.Coding={CB_99} WHERE Respondent.Serial = 1']
+
+def test_reports_invalid_lines_without_rewriting_them():
+    with TemporaryDirectory() as directory:
+        lines = [
+            'UPDATE vdata SET q1.Coding = {CB_3}, f4l[{axa}].f4.Coding = {CB_7} WHERE Label = \'a, b WHERE c\'',
+            'UPDATE vdata SET q1.Coding={CB_3} Respondent.Serial = 1',
+            'UPDATE vdata SET q1.Coding={CB_3} WHERE',
+            'UPDATE vdata SET q1.Coding={CB_3} WHERE Respondent.Serial = 3']
+        manager = create_manager(directory, lines, CFileSources.Ascribe)
+        output = os.path.join(directory, 'output.txt')
+        try:
+            manager.save_cfile(output)
+        except ValueError as e:
+            assert 'line 2' in str(e) and 'line 3' in str(e)
+        else:
+            assert False, 'invalid lines should raise ValueError'
+        assert read_file(output).splitlines() == [
+            'UPDATE vdata SET q1.Coding = {CB_99}, f4l_f4_axa_o_c = {CB_99} WHERE Label = \'a, b WHERE c\'',
+            lines[1],
+            lines[2],
+            'UPDATE vdata SET q1.Coding = {CB_99} WHERE Respondent.Serial = 3']
+
+        manager.save_cfile(output, processes=2, chunk_size=10, strict=False)
+        assert [e.split(':')[0] for e in manager.errors] == [
+            'Invalid statement in line 2', 'Invalid statement in line 3']
+
+def test_coalesces_statements_with_same_criteria():
+    with TemporaryDirectory() as directory:
+        manager = create_manager(directory, [
+            'UPDATE vdata SET q1.Coding={CB_1} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q2.Coding={CB_2} WHERE Respondent.Serial = 2',
+            'UPDATE vdata SET q2.Coding={CB_4} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q1.Coding={CB_3} WHERE Respondent.Serial = 1'])
+        output = os.path.join(directory, 'output.txt')
+        manager.save_cfile(output, coalesce=True)
+        assert read_file(output).splitlines() == [
+            'UPDATE vdata SET q1.Coding = {CB_99}, q2.Coding = {CB_4} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q2.Coding = {CB_2} WHERE Respondent.Serial = 2']
+
+def test_keeps_last_assignment_for_overlapping_criteria():
+    with TemporaryDirectory() as directory:
+        manager = create_manager(directory, [
+            'UPDATE vdata SET q2.Coding={CB_1} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q2.Coding={CB_2} WHERE Respondent.Serial IN (1, 2)',
+            'UPDATE vdata SET q2.Coding={CB_4} WHERE Respondent.Serial = 1'])
+        output = os.path.join(directory, 'output.txt')
+        manager.save_cfile(output, coalesce=True)
+        assert read_file(output).splitlines() == [
+            'UPDATE vdata SET q2.Coding = {CB_1} WHERE Respondent.Serial = 1',
+            'UPDATE vdata SET q2.Coding = {CB_2} WHERE Respondent.Serial IN (1, 2)',
+            'UPDATE vdata SET q2.Coding = {CB_4} WHERE Respondent.Serial = 1']
+
+def test_parallel_rewrite_keeps_order():
+    with TemporaryDirectory() as directory:
+        manager = create_manager(directory, [
+            f'UPDATE vdata SET f4l[{{axa}}].f4.Coding={{CB_{i % 10}}} WHERE Respondent.Serial = {i}'
+            for i in range(1000)])
+        sequential = os.path.join(directory, 'sequential.txt')
+        parallel = os.path.join(directory, 'parallel.txt')
+        manager.save_cfile(sequential)
+        manager.save_cfile(parallel, processes=2, chunk_size=1000)
+        assert read_file(sequential) == read_file(parallel)
+
+if __name__ == '__main__':
+    test_rewrites_variables_and_codes()
+    test_reports_invalid_lines_without_rewriting_them()
+    test_coalesces_statements_with_same_criteria()
+    test_keeps_last_assignment_for_overlapping_criteria()
+    test_parallel_rewrite_keeps_order()
+    print('OK')
@@ -0,0 +1,45 @@
+import os
+from tempfile import TemporaryDirectory
+
+from codeplans import CodeplanCache, XLFile
+from conftest import write_workbook
+
+def test_warm_load_returns_cached_model():
+    with TemporaryDirectory() as directory:
+        path = write_workbook(directory, {'Q1': [['*', 'Net'], [1, 'a'], [2, 'b'], ['#', None]]})
+        cache = CodeplanCache(os.path.join(directory, 'cache'))
+        cold = cache.load(XLFile, path)
+        warm = cache.load(XLFile, path)
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert warm is not cold
+        assert warm['Q1'].axis == cold['Q1'].axis
+        assert warm['Q1'].tree.find('CB_2').parent.function == 'net()'
+
+        # other content or options are other entries
+        write_workbook(directory, {'Q1': [[1, 'a']]})
+        assert cache.load(XLFile, path)['Q1'].tree.find('CB_2') is None
+        cache.load(XLFile, path, sheets=['Q2'])
+        assert (cache.hits, cache.misses) == (1, 3)
+
+def test_evicts_least_recently_used_entries():
+    with TemporaryDirectory() as directory:
+        cache = CodeplanCache(os.path.join(directory, 'cache'))
+        paths = []
+        for i in range(3):
+            paths.append(write_workbook(
+                directory, {'Q1': [[code, 'label'] for code in range(1, i + 2)]}, f'codeplans{i}.xlsx'))
+            cache.load(XLFile, paths[-1])
+        entries = sorted(os.scandir(cache.directory), key=lambda e: e.stat().st_mtime)
+        os.utime(entries[0].path, (0, 0))
+        os.utime(entries[1].path, (1, 1))
+
+        cache.max_size = sum(e.stat().st_size for e in entries) - 1
+        cache.evict()
+        assert len(os.listdir(cache.directory)) == 2
+        cache.load(XLFile, paths[1])
+        assert (cache.hits, cache.misses) == (1, 3)
+
+
+if __name__ == '__main__':
+    test_warm_load_returns_cached_model()
+    test_evicts_least_recently_used_entries()
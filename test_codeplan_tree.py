@@ -0,0 +1,34 @@
+from codeplans import CodeplanNode
+
+AXIS = "{net1 'Net' net({CB_1 'a', net2 'Inner' net({CB_2 'b'})}), CB_3 'c'}"
+
+def test_changing_children_resets_caches_of_all_ancestors():
+    root = CodeplanNode.from_axis(AXIS)
+    net2 = root.find('net2')
+
+    # fills cached axis, flat children and index of the whole tree
+    assert [n.name for n in root.flat_children] == ['net1', 'CB_1', 'net2', 'CB_2', 'CB_3']
+    assert root.find('CB_4') is None
+    assert root.axis == AXIS
+
+    net2.children.append(CodeplanNode('CB_4', 'd', parent=net2, level=3))
+    assert [n.name for n in root.flat_children] == ['net1', 'CB_1', 'net2', 'CB_2', 'CB_4', 'CB_3']
+    assert root.find('CB_4').parent is net2
+    assert root.find_all(function='net()') == [root.find('net1'), net2]
+    assert root.find('net1').axis == "net1 'Net' net({CB_1 'a',net2 'Inner' net({CB_2 'b',CB_4 'd'})})"
+    assert "CB_4 'd'" in root.axis
+
+    del net2.children[0]
+    assert root.find('CB_2') is None
+    assert [n.name for n in root.find('net1').flat_children] == ['CB_1', 'net2', 'CB_4']
+    assert "CB_2" not in root.axis
+
+def test_index_lists_duplicate_names_in_deep_first_order():
+    root = CodeplanNode.from_axis("{net1 'Net' net({CB_1 'a'}), CB_1 'again'}")
+    assert [n.label for n in root.find_all(name='CB_1')] == ['a', 'again']
+    assert root.find('CB_1').label == 'a'
+
+
+if __name__ == '__main__':
+    test_changing_children_resets_caches_of_all_ancestors()
+    test_index_lists_duplicate_names_in_deep_first_order()
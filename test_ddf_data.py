@@ -0,0 +1,83 @@
+import os
+import sqlite3
+from tempfile import TemporaryDirectory
+
+from codeplans import DDFData, execute_opens_on_ddf, read_category_map
+from conftest import write_cfile, write_text
+
+MDD = '''<?xml version="1.0" encoding="utf-8"?>
+<xml><mdm:metadata xmlns:mdm="http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04"><definition/>
+<categorymap><categoryid name="CB_1" value="1"/><categoryid name="CB_7" value="2"/><categoryid name="CB_99" value="3"/></categorymap>
+</mdm:metadata></xml>
+'''
+
+def create_files(directory, respondents=5):
+    mdd_path = write_text(directory, 'data.mdd', MDD)
+    ddf_path = os.path.join(directory, 'data.ddf')
+    connection = sqlite3.connect(ddf_path)
+    connection.execute('CREATE TABLE L1 ([:P0] INTEGER, [Respondent.Serial:L] INTEGER, [q1_o_c:C1] TEXT, [q2_o_c:C1] TEXT)')
+    connection.executemany('INSERT INTO L1 VALUES (?, ?, NULL, NULL)', [(r, r + 100) for r in range(respondents)])
+    connection.commit()
+    connection.close()
+    return mdd_path, ddf_path
+
+def test_executes_cfile_on_l1_columns():
+    with TemporaryDirectory() as directory:
+        mdd_path, ddf_path = create_files(directory)
+        cfile = write_cfile(directory, [
+            'UPDATE vdata SET q1_o_c={CB_1,CB_7} WHERE Respondent.Serial = 100',
+            'UPDATE vdata SET q1_o_c={cb_99} WHERE Respondent.Serial = 101',
+            '',
+            'UPDATE vdata SET Q2_O_C = {CB_7}, q1_o_c = {} WHERE Respondent.Serial = 102',
+            'UPDATE vdata SET q1_o_c={CB_1} WHERE Respondent.Serial = 100'])
+        execute_opens_on_ddf(mdd_path, ddf_path, cfile, batch_size=1)
+
+        connection = sqlite3.connect(ddf_path)
+        assert connection.execute('SELECT [q1_o_c:C1], [q2_o_c:C1] FROM L1 ORDER BY [:P0]').fetchall() == [
+            ('1;', None), ('3;', None), ('', '2;'), (None, None), (None, None)]
+        connection.close()
+
+        ddf = DDFData(ddf_path, read_category_map(mdd_path))
+        assert ddf.read('q1_o_c') == {100: ['CB_1'], 101: ['CB_99'], 102: [], 103: None, 104: None}
+        ddf.close()
+
+def test_reads_categorical_values_as_stored_in_ddf():
+    with TemporaryDirectory() as directory:
+        mdd_path, ddf_path = create_files(directory, respondents=3)
+        connection = sqlite3.connect(ddf_path)
+        connection.executemany('UPDATE L1 SET [q1_o_c:C1] = ? WHERE [:P0] = ?', [('1;2;3;', 0), ('2;', 1)])
+        connection.commit()
+        connection.close()
+
+        ddf = DDFData(ddf_path, read_category_map(mdd_path))
+        assert ddf.read('q1_o_c') == {100: ['CB_1', 'CB_7', 'CB_99'], 101: ['CB_7'], 102: None}
+        ddf.execute_cfile(write_cfile(directory, ['UPDATE vdata SET q1_o_c={CB_7,CB_1} WHERE Respondent.Serial = 102']))
+        assert ddf.connection.execute('SELECT [q1_o_c:C1] FROM L1 WHERE [:P0] = 2').fetchone() == ('2;1;',)
+        ddf.close()
+
+def test_rolls_back_unsupported_statements():
+    with TemporaryDirectory() as directory:
+        mdd_path, ddf_path = create_files(directory)
+        ddf = DDFData(ddf_path, read_category_map(mdd_path), batch_size=1)
+        for line, error in (
+                ('UPDATE vdata SET q3_o_c={CB_1} WHERE Respondent.Serial = 101', 'Variable "q3_o_c"'),
+                ('UPDATE vdata SET q1_o_c={CB_2} WHERE Respondent.Serial = 101', "Category 'CB_2'"),
+                ('UPDATE vdata SET q1_o_c={CB_1} WHERE Respondent.Serial > 101', 'only')):
+            cfile = write_cfile(directory, [
+                'UPDATE vdata SET q1_o_c={CB_1} WHERE Respondent.Serial = 100',
+                'UPDATE vdata SET q2_o_c={CB_1} WHERE Respondent.Serial = 100',
+                line])
+            try:
+                ddf.execute_cfile(cfile)
+            except ValueError as e:
+                assert str(e).startswith(f'Row 3 of {cfile} failed: {error}')
+            else:
+                assert False, f'"{line}" should raise ValueError'
+            assert ddf.read('q1_o_c')[100] is None
+        ddf.close()
+
+
+if __name__ == '__main__':
+    test_executes_cfile_on_l1_columns()
+    test_reads_categorical_values_as_stored_in_ddf()
+    test_rolls_back_unsupported_statements()
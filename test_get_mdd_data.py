@@ -0,0 +1,75 @@
+from tempfile import TemporaryDirectory
+
+from conftest import write_text
+from diagnose import RawVariableInfo, compare_waves, get_mdd_data, read_waves
+
+MDD = '''<?xml version="1.0" encoding="utf-8"?>
+<xml><mdm:metadata xmlns:mdm="http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04"><definition>
+<variable id="d1" name="q1" type="3"><labels context="LABEL"><text context="QUESTION">Brand</text></labels>
+<categories global-name-space="-1" ref_name="brands"/></variable>
+<variable id="d2" name="q2" type="3"><labels context="LABEL"><text context="QUESTION">Rating</text></labels>
+<categories><category id="c1" name="good"><labels><text>Good</text></labels></category>
+<categories name="sub"><category id="c2" name="bad"><labels><text>Bad</text></labels></category></categories>
+</categories></variable>
+<variable id="d3" name="serial" type="1"><labels context="LABEL"><text context="QUESTION">Serial</text></labels></variable>
+<variable id="d4" name="Coding" type="3"><labels context="LABEL"><text context="QUESTION">{LABEL}</text></labels>
+<categories ref_name="brands"/></variable>
+<variable id="d5" name="note" type="2"/>
+<categories id="t1" name="brands">
+<category id="t1_1" name="a"><labels><text>A</text></labels></category>
+<category id="t1_2" name="b"><labels><text>B</text></labels></category>
+</categories>
+</definition><design><fields name="@fields">
+<variable id="f1" name="q1" ref="d1"><helperfields name="@helperfields"><variable id="f2" name="Coding" ref="d4"/></helperfields></variable>
+<class id="f3" name="block"><fields name="@fields"><variable id="f4" name="serial" ref="d3"/></fields></class>
+<loop id="f5" name="loop"><categories ref_name="brands"/>
+<class name="@class"><fields name="@fields">
+<variable id="f6" name="q2" ref="d2"/>
+<grid id="f7" name="grid"><categories><category name="x"><labels><text>X</text></labels></category></categories>
+<class name="@class"><fields name="@fields"><variable id="f8" name="note" ref="d5"/></fields></class></grid>
+</fields></class></loop>
+</fields></design></mdm:metadata></xml>
+'''
+
+def test_reads_variables_from_xml():
+    with TemporaryDirectory() as directory:
+        variables = get_mdd_data(write_text(directory, 'wave.mdd', MDD), parser='xml')
+
+    rating = {'good': 'Good', 'bad': 'Bad'}
+    assert list(variables.values()) == [
+        RawVariableInfo('q1', 'Brand', 'mtCategorical', {'a': 'A', 'b': 'B'}),
+        RawVariableInfo('q1.Coding', '{LABEL}', 'mtCategorical', {'a': 'A', 'b': 'B'}),
+        RawVariableInfo('block.serial', 'Serial', 'mtLong', {}),
+        RawVariableInfo('loop[{a}].q2', 'Rating', 'mtCategorical', rating),
+        RawVariableInfo('loop[{a}].grid[{x}].note', '', 'mtText', {}),
+        RawVariableInfo('loop[{b}].q2', 'Rating', 'mtCategorical', rating),
+        RawVariableInfo('loop[{b}].grid[{x}].note', '', 'mtText', {})]
+
+def test_raises_for_fields_not_supported_by_xml_parser():
+    numeric_loop = '<loop id="f9" name="numeric"><ranges><range lowerbound="1" upperbound="3"/></ranges></loop>'
+    compound = '<compound id="f9" name="compound"><fields name="@fields"/></compound>'
+    for field, error in ((numeric_loop, 'Loop "numeric"'), (compound, 'Field "compound"')):
+        with TemporaryDirectory() as directory:
+            mdd_path = write_text(directory, 'wave.mdd', MDD.replace('</fields></design>', f'{field}</fields></design>'))
+            try:
+                get_mdd_data(mdd_path, parser='xml')
+            except ValueError as e:
+                assert str(e).startswith(error)
+            else:
+                assert False, f'{field} should raise ValueError'
+
+def test_reads_waves_concurrently():
+    with TemporaryDirectory() as directory:
+        old_mdd = write_text(directory, 'old.mdd', MDD)
+        new_mdd = write_text(directory, 'new.mdd', MDD.replace('<text>Good</text>', '<text>Very good</text>'))
+        old_wave, new_wave = read_waves(old_mdd, new_mdd, parser='xml', processes=2)
+
+    assert old_wave['loop[{a}].q2'].categories['good'] == 'Good'
+    assert [(v.name, v.c_label) for v in compare_waves(old_wave, new_wave)] == [
+        ('loop[{a}].q2', True), ('loop[{b}].q2', True)]
+
+
+if __name__ == '__main__':
+    test_reads_variables_from_xml()
+    test_raises_for_fields_not_supported_by_xml_parser()
+    test_reads_waves_concurrently()
@@ -0,0 +1,65 @@
+from collections import namedtuple
+
+from codeplans import IndexedList
+from conftest import build_mdd_file
+
+Item = namedtuple('Item', 'name value')
+
+def assert_index_matches_scan(items):
+    # lookup returns the 1st item with the key, as a linear scan would
+    for key in {i.name for i in items} | {'missing'}:
+        assert items.get(key) is next((i for i in items if i.name == key), None), key
+
+def test_index_follows_all_changes():
+    items = IndexedList([Item('a', 1), Item('b', 1)])
+    assert_index_matches_scan(items)
+
+    items.append(Item('c', 1))
+    items.extend([Item('d', 1), Item('a', 2)])
+    assert_index_matches_scan(items)
+    assert items.get('a').value == 1
+
+    items.insert(0, Item('a', 3))
+    assert_index_matches_scan(items)
+    assert items.get('a').value == 3
+
+    del items[0]
+    assert_index_matches_scan(items)
+    assert items.get('a').value == 1
+
+    items[0] = Item('e', 1)
+    assert_index_matches_scan(items)
+    assert items.get('a').value == 2
+
+    items.sort(key=lambda i: i.name, reverse=True)
+    assert_index_matches_scan(items)
+    items.append(Item('b', 2))
+    items.sort(key=lambda i: -i.value)
+    assert_index_matches_scan(items)
+    assert items.get('b').value == 2
+
+    items[1:3] = [Item('f', 1)]
+    items.remove(items.get('f'))
+    items.pop()
+    assert_index_matches_scan(items)
+    items.reverse()
+    assert_index_matches_scan(items)
+    items.clear()
+    assert items.get('a') is None
+
+def test_unknown_names_raise_index_error():
+    mdd_file = build_mdd_file([('head_1', [('CB_1', 'a')], "{CB_1 'a'}")], [])
+    assert mdd_file['head_1'] is mdd_file.types[0]
+    assert mdd_file['head_1']['CB_1'].label == 'a'
+    for lookup in (lambda: mdd_file['head_2'], lambda: mdd_file['head_1']['CB_2']):
+        try:
+            lookup()
+        except IndexError as e:
+            assert 'not found' in str(e)
+        else:
+            assert False, 'unknown name should raise IndexError'
+
+
+if __name__ == '__main__':
+    test_index_follows_all_changes()
+    test_unknown_names_raise_index_error()
@@ -0,0 +1,55 @@
+import json
+
+from codeplans import MasterState, MasterUpdatePlan, PlanElement, PlanField, PlanLabel
+from conftest import build_mdd_file
+from settings import CodeplanMap
+
+def create_codeplan_file():
+    return build_mdd_file([
+        ('head_1', [('CB_1', 'a'), ('CB_2', 'b new'), ('CB_10', 'c')], "{CB_1 'a', CB_2 'b new', CB_10 'c'}"),
+        ('head_2', [('CB_1', 'x')], "{CB_1 'x'}"),
+        ('head_3', [('CB_1', 'y')], "{CB_1 'y'}")], [
+        ('v1', 'q1', 'head_1', "{CB_1 'a', CB_2 'b new', CB_10 'c'}"),
+        ('v2', 'f4l[{axa}].f4', 'head_1', "{CB_1 'a', CB_2 'b new', CB_10 'c'}"),
+        ('v3', 'f4l[{axb}].f4', 'head_2', "{CB_1 'x'}")])
+
+def test_plans_changes_from_master_state():
+    master_state = MasterState(
+        types={'CP_1': {'CB_1': 'a', 'CB_2': 'b'}},
+        fields={'Q1.CODING'})
+    adapter = [
+        CodeplanMap('head_1', 'xl 1', 'cp_1', 'CB_99'),
+        CodeplanMap('head_2', 'xl 2', 'cp_2', 'CB_99')]
+
+    plan = MasterUpdatePlan(master_state, create_codeplan_file(), adapter, total_label='Total')
+
+    assert plan.warnings == ["head_3 doesn't exist in adapter"]
+    assert plan.types_to_create == {'cp_2': [PlanElement('CB_1', 'x')]}
+    assert plan.elements_to_add == {'cp_1': [PlanElement('CB_10', 'c')]}
+    assert plan.labels_to_change == {'cp_1': [PlanLabel('CB_2', 'b', 'b new')]}
+    assert plan.helper_fields_to_create == []
+    assert plan.fields_to_create == [
+        PlanField('', 'f4l_f4_axa_o_c', 'cp_1', "{CB_1 'a', CB_2 'b new', CB_10 'c'}"),
+        PlanField('', 'f4l_f4_axb_o_c', 'cp_2', "{CB_1 'x'}")]
+    assert list(plan.axis_per_type) == ['cp_1', 'cp_2']
+    assert master_state.types['CP_1'] == {'CB_1': 'a', 'CB_2': 'b'}
+
+    exported = json.loads(plan.to_json())
+    assert exported['labels_to_change'] == {'cp_1': [{'code': 'CB_2', 'old_label': 'b', 'new_label': 'b new'}]}
+    assert exported['axis_per_type'] == plan.axis_per_type
+
+def test_plans_helper_fields_once_per_field():
+    codeplan_file = create_codeplan_file()
+    codeplan_file.variables[2].type_name = 'head_1'
+    adapter = [CodeplanMap('head_1', 'xl 1', 'cp_1', 'CB_99')]
+
+    plan = MasterUpdatePlan(MasterState(types={}, fields=set()), codeplan_file, adapter)
+
+    assert [(f.parent, f.name, f.type_name) for f in plan.helper_fields_to_create] == [
+        ('q1', 'Coding', 'cp_1'), ('f4l.f4', 'Coding', 'cp_1')]
+    assert plan.fields_to_create == []
+
+
+if __name__ == '__main__':
+    test_plans_changes_from_master_state()
+    test_plans_helper_fields_once_per_field()
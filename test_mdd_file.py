@@ -0,0 +1,83 @@
+from tempfile import TemporaryDirectory
+
+from codeplans import MDDFile, MDDFileMerger, MDDVariable, parse_variable_label
+from conftest import build_mdd_file, write_text
+
+LISTS_FIRST_MDD = '''<?xml version="1.0" encoding="utf-8"?>
+<xml><mdm:metadata xmlns:mdm="http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04"><definition>
+<categories id="t1" name="head_1" global-name-space="-1">
+<category id="t1_1" name="CB_1"><labels context="LABEL"><text context="QUESTION">A</text></labels></category>
+</categories>
+<variable id="v1" name="head_1" type="3"><labels context="LABEL"><text context="QUESTION">q1</text></labels>
+<categories global-name-space="-1" ref_name="head_1"/><axis expression="{CB_1 'A'}"/></variable>
+</definition></mdm:metadata></xml>
+'''
+
+def create_mdd_file(variables):
+    return build_mdd_file(
+        [(name, [('CB_1', 'a')], '{CB_1}') for name in sorted({type_name for _, _, type_name in variables})],
+        [(name, label, type_name, '{CB_1}') for name, label, type_name in variables])
+
+def test_caches_fields_and_variable_map_until_variables_change():
+    mdd_file = create_mdd_file([
+        ('v1', 'q1', 'head_1'),
+        ('v2', 'f4l[{axa}].f4', 'head_1'),
+        ('v3', 'f4l[{axb}].f4', 'head_1')])
+
+    variable_map = mdd_file.variable_map
+    assert variable_map == {}
+    assert mdd_file.variable_map is variable_map
+    assert [v.name for v in mdd_file.field('f4l.f4').variables] == ['v2', 'v3']
+    assert mdd_file.field('missing') is None
+
+    slave = create_mdd_file([('v4', 'f4l[{axc}].f4', 'head_2')])
+    MDDFileMerger(mdd_file, slave).merge()
+
+    assert mdd_file.field('f4l.f4').types == {'head_1', 'head_2'}
+    assert mdd_file.variable_map == {
+        'f4l[{axa}].f4.Coding': 'f4l_f4_axa_o_c',
+        'f4l[{axb}].f4.Coding': 'f4l_f4_axb_o_c',
+        'f4l[{axc}].f4.Coding': 'f4l_f4_axc_o_c'}
+
+    del mdd_file.variables[1:]
+    assert [f.name for f in mdd_file.fields] == ['q1']
+    assert mdd_file.variable_map == {}
+
+def test_parses_variable_labels_with_both_index_forms():
+    assert parse_variable_label('f4l[{axa}].f4') == ('f4l.f4', ['axa'], 'f4l_f4_axa_o_c')
+    assert parse_variable_label('q7loop[{_12}].q7[_5].slice') == (
+        'q7loop.q7.slice', ['_12', '_5'], 'q7loop_q7_slice__12__5_o_c')
+    assert parse_variable_label('q1') == ('q1', [], 'q1__o_c')
+
+    v1 = MDDVariable('v1', 'f4l[{axa}].f4', 'head_1', None)
+    v2 = MDDVariable('v2', 'f4l[{axb}].f4', 'head_1', None)
+    assert (v1.field_name, v1.iterations, v1.compliant_name) == ('f4l.f4', ['axa'], 'f4l_f4_axa_o_c')
+    assert v1.field_name is v2.field_name
+
+def test_reads_lists_declared_before_variables_with_both_parsers():
+    with TemporaryDirectory() as directory:
+        path = write_text(directory, 'codeplan.mdd', LISTS_FIRST_MDD)
+        for parser in ('xml', 'stream'):
+            mdd_file = MDDFile(path, parser=parser)
+            assert [(t.name, t.axis, t.errors) for t in mdd_file.types] == [('head_1', "{CB_1 'A'}", [])], parser
+            assert [v.name for v in mdd_file.variables] == ['head_1']
+
+def test_stream_yields_types_before_their_variables():
+    unused_list = ('<categories id="t2" name="head_2" global-name-space="-1">'
+        '<category id="t2_1" name="CB_1"><labels><text>A</text></labels></category></categories>\n')
+    with TemporaryDirectory() as directory:
+        mdd_file = build_mdd_file([], [], write_text(directory, 'codeplan.mdd',
+            LISTS_FIRST_MDD.replace('</definition>', unused_list + '</definition>')))
+        items = [(item, getattr(item, 'axis', None)) for item in mdd_file._iter_mdd_from_stream()]
+
+    (head_1, axis_when_yielded), (variable, _), (head_2, _) = items
+    assert (head_1.name, axis_when_yielded, variable.name) == ('head_1', None, 'head_1')
+    assert (head_1.axis, head_1.errors) == ("{CB_1 'A'}", [])
+    assert (head_2.axis, head_2.errors) == (None, ['No variable uses type "head_2", axis expression is unknown'])
+
+
+if __name__ == '__main__':
+    test_caches_fields_and_variable_map_until_variables_change()
+    test_parses_variable_labels_with_both_index_forms()
+    test_reads_lists_declared_before_variables_with_both_parsers()
+    test_stream_yields_types_before_their_variables()
@@ -0,0 +1,39 @@
+from codeplans import MDDFileMerger, MergeReportEntry
+from conftest import build_mdd_file
+
+def create_mdd_file(path, types, variables):
+
+    # types as {name: axis}, variables as {name: type name},
+    # variables get the axis of their type
+    return build_mdd_file(
+        [(name, [('CB_1', 'a')], axis) for name, axis in types.items()],
+        [(name, f'{name}_label', type_name, types[type_name]) for name, type_name in variables.items()],
+        path)
+
+def test_merges_waves_in_one_pass():
+    master = create_mdd_file('2018-10', {'t1': '{m1}'}, {'q1': 't1'})
+    wave_1 = create_mdd_file('2018-09', {'t1': '{w1}', 't2': '{w1}'}, {'q1': 't1', 'q2': 't1', 'q3': 't2'})
+    wave_2 = create_mdd_file('2018-08', {'t2': '{w2}', 't3': '{w2}'}, {'q3': 't2', 'q4': 't2', 'q5': 't3'})
+
+    merger = MDDFileMerger(master, wave_1, wave_2)
+    merged = merger.merge()
+
+    assert merged is master
+    assert [(t.name, t.axis, t.mdd_file.path) for t in merged.types] == [
+        ('t1', '{m1}', '2018-10'), ('t2', '{w1}', '2018-10'), ('t3', '{w2}', '2018-10')]
+    assert [(v.name, v.axis) for v in merged.variables] == [
+        ('q1', '{m1}'), ('q2', '{m1}'), ('q3', '{w1}'), ('q4', '{w1}'), ('q5', '{w2}')]
+    assert merger.entries == [
+        MergeReportEntry('type', 't2', 1),
+        MergeReportEntry('variable', 'q2', 1),
+        MergeReportEntry('axis', 'q2', 1),
+        MergeReportEntry('variable', 'q3', 1),
+        MergeReportEntry('type', 't3', 2),
+        MergeReportEntry('variable', 'q4', 2),
+        MergeReportEntry('axis', 'q4', 2),
+        MergeReportEntry('variable', 'q5', 2)]
+    assert merger.report.startswith('New types:\nMDDCodeplan(name=\'t2\')')
+
+
+if __name__ == '__main__':
+    test_merges_waves_in_one_pass()
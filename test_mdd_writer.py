@@ -0,0 +1,42 @@
+import os
+from tempfile import TemporaryDirectory
+from xml.etree import ElementTree
+
+from codeplans import MDDFile
+from conftest import build_mdd_file
+
+def create_mdd_file():
+    return build_mdd_file([
+        ('head_1', [('CB_1', 'Brand <a> & "b"'), ('CB_2', 'Münchener')],
+            "{CB_1 'Brand <a> & \"b\"', CB_2 'Münchener'}"),
+        ('head_2', [('CB_2', 'x'), ('CB_3', 'y')], "{net1 'Net' net({CB_2 'x', CB_3 'y'})}")], [
+        ('v1', 'f4l[{axa}].f4', 'head_1', None),
+        ('v2', 'f4l[{axb}].f4', 'head_2', None)])
+
+def test_round_trips_through_xml_reader():
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'codeplan.mdd')
+        mdd_file = create_mdd_file()
+        mdd_file.save_as(path)
+
+        for parser in ('xml', 'stream'):
+            saved = MDDFile(path, parser=parser)
+            assert [(t.name, t.axis, [(e.code, e.label) for e in t.elements]) for t in saved.types] == \
+                [(t.name, t.axis, [(e.code, e.label) for e in t.elements]) for t in mdd_file.types]
+            assert [(v.name, v.label, v.type_name, v.axis) for v in saved.variables] == [
+                ('v1', 'f4l[{axa}].f4', 'head_1', mdd_file['head_1'].axis),
+                ('v2', 'f4l[{axb}].f4', 'head_2', mdd_file['head_2'].axis)]
+
+        category_map = ElementTree.parse(path).getroot()[0].find('categorymap')
+        assert [(c.get('name'), c.get('value')) for c in category_map] == [
+            ('CB_1', '1'), ('CB_2', '2'), ('CB_3', '3')]
+
+        with open(path, mode='rb') as f:
+            content = f.read()
+        mdd_file.save_as(path)
+        with open(path, mode='rb') as f:
+            assert f.read() == content
+
+
+if __name__ == '__main__':
+    test_round_trips_through_xml_reader()
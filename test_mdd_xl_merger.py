@@ -0,0 +1,111 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from openpyxl import load_workbook
+
+from codeplans import DiffRecord, MDDFile, MDDXLFileMerger, XLFile
+from conftest import write_text, write_workbook
+from settings import CodeplanMap
+
+MDD = '''<?xml version="1.0" encoding="utf-8"?>
+<xml><mdm:metadata xmlns:mdm="http://www.spss.com/mr/dm/metadatamodel/Arc 3/2000-02-04"><definition>
+<variable id="v1" name="head_1" type="3"><labels context="LABEL"><text context="QUESTION">q1</text></labels>
+<categories global-name-space="-1" ref_name="head_1"/><axis expression="{CB_1 'a', CB_2 'b', CB_3 'c'}"/></variable>
+<variable id="v2" name="head_2" type="3"><labels context="LABEL"><text context="QUESTION">q2</text></labels>
+<categories global-name-space="-1" ref_name="head_2"/><axis expression="{CB_1 'a'}"/></variable>
+<categories id="t1" name="head_1" global-name-space="-1">
+<category id="t1_1" name="CB_1"><labels context="LABEL"><text context="QUESTION">a</text></labels></category>
+<category id="t1_2" name="CB_2"><labels context="LABEL"><text context="QUESTION">b</text></labels></category>
+<category id="t1_3" name="CB_3"><labels context="LABEL"><text context="QUESTION">c</text></labels></category>
+</categories>
+<categories id="t2" name="head_2" global-name-space="-1">
+<category id="t2_1" name="CB_1"><labels context="LABEL"><text context="QUESTION">a</text></labels></category>
+</categories>
+</definition></mdm:metadata></xml>
+'''
+
+def create_files(directory, mdd=MDD):
+    mdd_path = write_text(directory, 'codeplan.mdd', mdd)
+    xl_path = write_workbook(directory, {
+        'CP 1': [['*', 'Net'], [1, 'a'], [2, 'b new'], ['#', None]],
+        'CP 2': [[1, 'a'], [2, 'missing in mdd']]})
+    return MDDFile(mdd_path), XLFile(xl_path)
+
+def test_merge_applies_mergeable_codeplans():
+    with TemporaryDirectory() as directory:
+        mdd_file, xl_file = create_files(directory)
+        adapter = [
+            CodeplanMap('head_1', 'CP 1', 'cp_1', 'CB_99'),
+            CodeplanMap('head_2', 'CP 2', 'cp_2', 'CB_99')]
+        merger = MDDXLFileMerger(mdd_file, xl_file, adapter)
+        try:
+            merger.merge_all()
+        except ValueError as e:
+            assert '1 codeplan(s) not merged' in str(e)
+            assert 'XL elements missing in MDD: CB_2' in str(e)
+        else:
+            assert False, 'codeplan "head_2" should raise ValueError'
+
+        assert mdd_file['head_1'].axis == xl_file['CP 1'].axis
+        assert mdd_file['head_1'].tree.find('CB_2').parent.function == 'net()'
+        assert [e.code for e in mdd_file['head_1'].elements] == ['CB_1', 'CB_2']
+        assert merger.category_map == [('q1.Coding', 'CB_3', 'CB_99')]
+        assert mdd_file['head_2'].axis == "{CB_1 'a'}"
+
+def test_reports_diff_as_text_json_and_excel():
+    with TemporaryDirectory() as directory:
+        mdd_file, xl_file = create_files(directory)
+        adapter = [
+            CodeplanMap('head_1', 'CP 1', 'cp_1', 'CB_99'),
+            CodeplanMap('head_2', 'CP 2', 'cp_2', 'CB_99')]
+        merger = MDDXLFileMerger(mdd_file, xl_file, adapter)
+
+        assert merger.codeplan_mergers[0].diff == [
+            DiffRecord('relabelled', 'CB_2', 'b', 'b new'),
+            DiffRecord('extra', 'CB_3', 'c', None)]
+        assert merger.codeplan_mergers[1].diff == [
+            DiffRecord('missing', 'CB_2', None, 'missing in mdd')]
+        assert merger.report == (
+            'head_1 / CP 1:\n'
+            'MDD elements missing in Excel: CB_3\n'
+            'Label differences for CB_2: "b (MDD)" -> "b new" (XL)\n'
+            'head_2 / CP 2:\n'
+            'XL elements missing in MDD: CB_2\n')
+
+        records = json.loads(merger.report_json())
+        assert [(r['mdd_name'], r['kind'], r['code']) for r in records] == [
+            ('head_1', 'relabelled', 'CB_2'), ('head_1', 'extra', 'CB_3'), ('head_2', 'missing', 'CB_2')]
+
+        path = os.path.join(directory, 'report.xlsx')
+        merger.save_report_xl(path)
+        workbook = load_workbook(path, read_only=True)
+        rows = list(workbook['Report'].iter_rows(values_only=True))
+        workbook.close()
+        assert rows[0] == ('mdd_name', 'xl_name', 'kind', 'code', 'mdd_label', 'xl_label', 'error')
+        assert rows[1][:6] == ('head_1', 'CP 1', 'relabelled', 'CB_2', 'b', 'b new')
+        assert len(rows) == 4
+
+def test_reports_types_without_variables():
+    # head_2 is not used by any variable, so its axis is unknown
+    start = MDD.index('<variable id="v2"')
+    mdd = MDD[:start] + MDD[MDD.index('</variable>', start) + len('</variable>\n'):]
+    with TemporaryDirectory() as directory:
+        mdd_file, xl_file = create_files(directory, mdd)
+        stream_file = MDDFile(mdd_file.path, parser='stream')
+        adapter = [CodeplanMap('head_2', 'CP 2', 'cp_2', 'CB_99')]
+        merger = MDDXLFileMerger(mdd_file, xl_file, adapter)
+
+    error = 'No variable uses type "head_2", axis expression is unknown'
+    for head_2 in (mdd_file['head_2'], stream_file['head_2']):
+        assert head_2.axis is None
+        assert head_2.errors == [error]
+        assert head_2.tree.children == []
+    assert not merger.codeplan_mergers[0].mergeable
+    assert merger.report.startswith(f'head_2 / CP 2:\nErrors in MDD Codeplan "head_2": {error}\n')
+
+
+if __name__ == '__main__':
+    test_merge_applies_mergeable_codeplans()
+    test_reports_diff_as_text_json_and_excel()
+    test_reports_types_without_variables()
@@ -0,0 +1,33 @@
+from diagnose import MasterVariableInfo, RawVariableInfo, compare_waves
+
+def variable(name, label='q', categories=None, data_type='mtCategorical'):
+    return RawVariableInfo(name, label, data_type, categories or {})
+
+def test_compares_waves_by_fingerprint():
+    old_wave = {v.name: v for v in [
+        variable('same', categories={'a': 'A', 'b': 'B'}),
+        variable('reordered', categories={'a': 'A', 'b': 'B'}),
+        variable('relabelled', label='old'),
+        variable('categories', categories={'a': 'A', 'b': 'B', 'c': ''}),
+        variable('dropped_category', categories={'a': 'A', 'b': 'B'}),
+        variable('empty_old_label', categories={'a': ''}),
+        variable('dropped', data_type='mtText')]}
+    new_wave = {v.name: v for v in [
+        variable('new', data_type='mtLong'),
+        variable('same', categories={'a': 'A', 'b': 'B'}),
+        variable('reordered', categories={'b': 'B', 'a': 'A'}),
+        variable('relabelled', label='new'),
+        variable('categories', categories={'a': 'A', 'b': 'B new', 'c': 'C', 'd': 'D'}),
+        variable('dropped_category', categories={'a': 'A'}),
+        variable('empty_old_label', categories={'a': 'A'})]}
+
+    assert compare_waves(old_wave, new_wave) == [
+        MasterVariableInfo('new', 'mtLong', True, False, False, False, False, False),
+        MasterVariableInfo('dropped', 'mtText', False, True, False, False, False, False),
+        MasterVariableInfo('relabelled', 'mtCategorical', False, False, False, False, True, False),
+        MasterVariableInfo('categories', 'mtCategorical', False, False, True, False, False, True),
+        MasterVariableInfo('dropped_category', 'mtCategorical', False, False, False, True, False, False)]
+
+
+if __name__ == '__main__':
+    test_compares_waves_by_fingerprint()
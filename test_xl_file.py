@@ -0,0 +1,58 @@
+from tempfile import TemporaryDirectory
+
+from codeplans import CodeplanElements, XLFile, XLCodeplanRowTypes
+from conftest import write_workbook
+
+def test_reads_trimmed_rows_with_row_types():
+    with TemporaryDirectory() as directory:
+        path = write_workbook(directory, {'Q1': [
+            ['Code', 'Label', 'Comment'],
+            ['*', 'Positive', 'not read'],
+            [1, ' Good ', 'not read'],
+            ['2', 'Very good'],
+            ['1, 2', 'Good or very good'],
+            [None, None],
+            ['#', None],
+            [3.4, 'Other'],
+            ['comment', 'not a code'],
+            [None, None]]})
+        xl_codeplan = XLFile(path)['Q1']
+        assert [(row.code, row.label, row.index) for row in xl_codeplan.rows[:3]] == [
+            ('*', 'Positive', 2), ('1', 'Good', 3), ('2', 'Very good', 4)]
+        assert [row.row_type for row in xl_codeplan.rows] == [
+            XLCodeplanRowTypes.NetStart,
+            XLCodeplanRowTypes.Regular,
+            XLCodeplanRowTypes.Regular,
+            XLCodeplanRowTypes.Combine,
+            XLCodeplanRowTypes.Invalid,
+            XLCodeplanRowTypes.NetEnd,
+            XLCodeplanRowTypes.Combine]
+        assert xl_codeplan.rows[3].combine_codes == ['1', '2']
+        assert xl_codeplan.rows[6].combine_codes == ['3', '4']
+        assert xl_codeplan.errors == ['Invalid code "" in row 6']
+
+def test_reads_only_requested_sheets():
+    with TemporaryDirectory() as directory:
+        path = write_workbook(directory, {
+            'Q1': [[1, 'a']], 'Q2': [[1, 'b']], 'Q3': [[1, 'c']]})
+        xl_file = XLFile(path, sheets=['Q3', 'Q1', 'missing'])
+        assert [cp.name for cp in xl_file.codeplans] == ['Q1', 'Q3']
+        assert 'Q2' not in xl_file
+
+def test_builds_sorted_elements_once():
+    with TemporaryDirectory() as directory:
+        path = write_workbook(directory, {'Q1': [
+            [10, 'ten'], [2, 'two'], ['2, 10', 'two or ten'], [1, 'one']]})
+        xl_codeplan = XLFile(path)['Q1']
+        elements = xl_codeplan.elements
+        assert isinstance(elements, CodeplanElements)
+        assert elements.codes == ['CB_1', 'CB_2', 'CB_10']
+        assert [e.double for e in elements] == [False, True, True]
+        assert xl_codeplan.elements is elements
+        assert xl_codeplan['CB_10'].label == 'ten'
+
+
+if __name__ == '__main__':
+    test_reads_trimmed_rows_with_row_types()
+    test_reads_only_requested_sheets()
+    test_builds_sorted_elements_once()